@@ -0,0 +1,166 @@
+import time
+import logging
+import threading
+import subprocess
+
+from audioutils import rms
+
+# Try importing the in-memory playback dependencies safely
+try:
+    import alsaaudio
+    import miniaudio
+    ALSA_PLAYBACK_AVAILABLE = True
+except ImportError:
+    ALSA_PLAYBACK_AVAILABLE = False
+
+
+class MPG123Player:
+    """
+    Fallback player: pipes the mp3 data to an mpg123 process (must be installed),
+    so no temp file is needed, but every utterance still forks a process.
+    """
+
+    def __init__(self):
+        self.log = logging.getLogger("bot_log")
+        self.process = None
+        self.lock = threading.Lock()
+        self.stopped = False
+
+    def play(self, audio):
+        """Play mp3 audio given as bytes or as a file path. Blocks until playback ends."""
+        # ensure mpg123 is installed on the system: sudo apt-get install -y mpg123
+        with self.lock:
+            if self.stopped:
+                return
+            try:
+                if isinstance(audio, bytes):
+                    self.process = subprocess.Popen(['mpg123', '-q', '-'], stdin=subprocess.PIPE)
+                else:
+                    self.process = subprocess.Popen(['mpg123', '-q', audio])
+            except FileNotFoundError:
+                self.log.error("mpg123 not found. Please install mpg123 or change playback method.")
+                return
+            process = self.process
+        try:
+            if isinstance(audio, bytes):
+                process.communicate(audio)
+            else:
+                process.wait()
+        except BrokenPipeError:
+            pass
+        finally:
+            self.process = None
+
+    def playback_state(self):
+        """(playing, RMS level of the played audio); mpg123 can not tell the level."""
+        return self.process is not None, None
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            if self.process is not None:
+                try:
+                    self.process.terminate()
+                except Exception:
+                    pass
+
+    def reset(self):
+        self.stopped = False
+
+    def close(self):
+        self.stop()
+
+
+class AlsaPlayer:
+    """
+    Decodes mp3 audio in memory and streams the frames into a single ALSA PCM handle
+    that stays open between utterances.
+    """
+
+    # gTTS produces 24 kHz mono mp3, everything is decoded to this format
+    SAMPLE_RATE = 24000
+    CHANNELS = 1
+    PERIOD_SIZE = 1024
+    SAMPLE_WIDTH = 2
+
+    def __init__(self, device_name="default"):
+        self.log = logging.getLogger("bot_log")
+        self.device_name = device_name
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.playing = False
+        self.current_level = 0
+        self.pcm = alsaaudio.PCM(type=alsaaudio.PCM_PLAYBACK, mode=alsaaudio.PCM_NORMAL, device=device_name,
+                                 rate=self.SAMPLE_RATE, channels=self.CHANNELS,
+                                 format=alsaaudio.PCM_FORMAT_S16_LE, periodsize=self.PERIOD_SIZE)
+        self.log.info(f"ALSA playback opened on {device_name}")
+
+    def decode(self, audio):
+        if isinstance(audio, bytes):
+            decoded = miniaudio.decode(audio, output_format=miniaudio.SampleFormat.SIGNED16,
+                                       nchannels=self.CHANNELS, sample_rate=self.SAMPLE_RATE)
+        else:
+            decoded = miniaudio.decode_file(audio, output_format=miniaudio.SampleFormat.SIGNED16,
+                                            nchannels=self.CHANNELS, sample_rate=self.SAMPLE_RATE)
+        return decoded.samples.tobytes()
+
+    def play(self, audio):
+        """Play mp3 audio given as bytes or as a file path. Blocks until playback ends."""
+        pcm_data = self.decode(audio)
+        period_bytes = self.PERIOD_SIZE * self.CHANNELS * self.SAMPLE_WIDTH
+        play_start = time.time()
+        self.playing = True
+        try:
+            for offset in range(0, len(pcm_data), period_bytes):
+                if self.stopped:
+                    return
+                period = pcm_data[offset:offset + period_bytes]
+                self.current_level = rms(period)
+                with self.lock:
+                    self.pcm.write(period)
+            # write() returns as soon as the data fits into the ALSA buffer, wait for the buffered part
+            play_end = play_start + len(pcm_data) / (self.SAMPLE_RATE * self.CHANNELS * self.SAMPLE_WIDTH)
+            while not self.stopped:
+                remaining = play_end - time.time()
+                if remaining <= 0:
+                    break
+                time.sleep(min(remaining, 0.05))
+        finally:
+            self.playing = False
+            self.current_level = 0
+
+    def playback_state(self):
+        """(playing, RMS level of the last period written to the device)"""
+        return self.playing, self.current_level
+
+    def stop(self):
+        self.stopped = True
+        with self.lock:
+            try:
+                # drop the frames that are already buffered in the device
+                self.pcm.drop()
+            except Exception:
+                pass
+
+    def reset(self):
+        self.stopped = False
+
+    def close(self):
+        self.stop()
+        self.pcm.close()
+
+
+def create_player(output_device_name="default"):
+    """
+    Returns the in-memory ALSA player when its dependencies are installed and the
+    device can be opened, mpg123 otherwise.
+    """
+    log = logging.getLogger("bot_log")
+    if ALSA_PLAYBACK_AVAILABLE:
+        try:
+            return AlsaPlayer(output_device_name)
+        except Exception as e:
+            log.warning(f"ALSA playback on {output_device_name} not available: {e}. Falling back to mpg123.")
+    else:
+        log.info("alsaaudio / miniaudio not installed, using mpg123 for playback")
+    return MPG123Player()
@@ -0,0 +1,73 @@
+import math
+import array
+import warnings
+
+# audioop is deprecated and was removed in Python 3.13, the same operations fall back to plain Python
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+    AUDIOOP_AVAILABLE = True
+except ImportError:
+    AUDIOOP_AVAILABLE = False
+
+# All functions work on little-endian signed PCM, like audioop on the Pi.
+
+
+def rms(fragment):
+    """Root mean square level of 16 bit mono (or interleaved) samples."""
+    if AUDIOOP_AVAILABLE:
+        return audioop.rms(fragment, 2)
+    samples = array.array("h", fragment[:len(fragment) // 2 * 2])
+    if not samples:
+        return 0
+    return int(math.sqrt(sum(sample * sample for sample in samples) / len(samples)))
+
+
+def to_16bit(fragment, sample_width):
+    """Samples of sample_width bytes converted to 16 bit, keeping their two most significant bytes."""
+    if sample_width == 2:
+        return fragment
+    if AUDIOOP_AVAILABLE:
+        return audioop.lin2lin(fragment, sample_width, 2)
+    sample_count = len(fragment) // sample_width
+    converted = bytearray(sample_count * 2)
+    if sample_width == 1:
+        converted[1::2] = fragment[:sample_count]
+    else:
+        converted[0::2] = fragment[sample_width - 2:sample_count * sample_width:sample_width]
+        converted[1::2] = fragment[sample_width - 1:sample_count * sample_width:sample_width]
+    return bytes(converted)
+
+
+def to_mono(fragment):
+    """16 bit stereo to mono, the average of the two channels."""
+    if AUDIOOP_AVAILABLE:
+        return audioop.tomono(fragment, 2, 0.5, 0.5)
+    samples = array.array("h", fragment[:len(fragment) // 4 * 4])
+    return array.array("h", [(left + right) // 2 for left, right in zip(samples[0::2], samples[1::2])]).tobytes()
+
+
+def resample(fragment, from_rate, to_rate, state=None):
+    """
+    16 bit mono from from_rate to to_rate. Returns (fragment, state); pass the state with
+    the next fragment of the same stream, so there are no clicks between the fragments.
+    """
+    if from_rate == to_rate:
+        return fragment, state
+    if AUDIOOP_AVAILABLE:
+        return audioop.ratecv(fragment, 2, 1, from_rate, to_rate, state)
+    samples = array.array("h", fragment[:len(fragment) // 2 * 2])
+    if not samples:
+        return b"", state
+    # linear interpolation; index 0 is the last sample of the previous fragment
+    position, previous = state if state is not None else (0.0, samples[0])
+    extended = [previous] + samples.tolist()
+    step = from_rate / to_rate
+    resampled = array.array("h")
+    while position < len(samples):
+        index = int(position)
+        fraction = position - index
+        resampled.append(int(extended[index] * (1 - fraction) + extended[index + 1] * fraction))
+        position += step
+    return resampled.tobytes(), (position - len(samples), samples[-1])
@@ -2,19 +2,18 @@ import os
 import time
 import logging
 import argparse
-import RPi.GPIO as GPIO
 import textwrap
 import re
 import sys
+import asyncio
+import threading
+import yaml
 from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
 
 # New imports for Google STT + gTTS TTS
 import speech_recognition as sr
-from gtts import gTTS
-import tempfile
-import subprocess
 
 # Translations
 trans_hu = {"listening" : "FÜLEL", "thinking" : "GONDOL", "speaking" : "BESZÉL", "silent":"CSENDBEN", "lang": "Hungarian"}
@@ -45,18 +44,25 @@ from botconfig import BotConfig
 bot_config = BotConfig()
 
 from gptchatservice import GPTChatService
+from semanticcache import create_response_cache
 
-HEADLESS = True  # <-- set True when running without LCD display
+from sttservice import create_stt_backend
+from speechlistener import SpeechListener
+from wakeword import create_wake_word_spotter
+stt_backend = create_stt_backend(bot_config.stt_backend, min_confidence=bot_config.stt_min_confidence)
 
-if not HEADLESS:
-    from lcdservice import LCDServiceColor
-    lcd_service = LCDServiceColor()
-else:
-    class DummyLCD:
-        def draw_face(self, *a, **kw): pass
-        def draw_large_icon(self, *a, **kw): pass
-        def clear_screen(self): pass
-    lcd_service = DummyLCD()
+from ttscache import TTSCache
+from ttsservice import TTSService
+tts_cache = TTSCache(max_size_bytes=bot_config.tts_cache_size_mb * 1024 * 1024) if bot_config.tts_cache_size_mb > 0 else None
+tts_service = TTSService(tts_cache=tts_cache)
+
+# Button, mixer, display, microphone and speaker: the Pi devices or simulated ones (BOT_HARDWARE, HEADLESS env)
+from hardware import Hardware, DisplayIcons
+hardware = Hardware()
+
+# LCD rendering runs on its own thread, the conversation only posts state changes
+from displayservice import DisplayService
+lcd_service = DisplayService(hardware.display)
 
 
 # Audio HW settings
@@ -72,14 +78,14 @@ speech_lang = "hu"
 speech_voice = "hu-HU-NoemiNeural"
 ui_lang = "hu"
 
-# Global variable for stopping execution
-done = False 
-listening = True
-thinking = False
-speaking = False
+# The conversation state (idle/listening/thinking/speaking) is owned by the orchestrator's event loop
+from orchestrator import ConversationOrchestrator, BotState
+from turntrace import TurnTracer
+turn_tracer = TurnTracer()
+orchestrator = ConversationOrchestrator(stt_backend, tts_service, stream_response=bot_config.stream_response,
+                                        barge_in=bot_config.barge_in, auto_mute=bot_config.auto_mute_mic, tracer=turn_tracer)
 
 # Statistics
-total_tts_duration = 0
 total_stt_chars = 0
 program_start_time = 0
 
@@ -92,108 +98,101 @@ def check_single_char_dot(string):
     else:
         return False
 
-# Centralized processing of recognized text (used by Google callback)
-def process_recognized_text(stt_text):
-    try:
-        global thinking
-        global speaking
-        global total_stt_chars
+# Centralized processing of recognized text, runs on the orchestrator loop
+def prepare_question(stt_text):
+    """Returns the question for the AI, None if the recognized text is to be ignored."""
+    global total_stt_chars
 
-        if stt_text is None:
-            return
+    if stt_text is None or stt_text == "" or check_single_char_dot(stt_text): 
+        return None
 
-        # ignore if currently speaking or thinking
-        if (speaking == True or thinking == True):
-            return
+    recognized_text_log = f"Recognized speech: {stt_text}"
+    print(recognized_text_log, flush=True)
+    log.info(recognized_text_log)
 
-        if stt_text == "" or check_single_char_dot(stt_text): 
-            return
+    total_stt_chars += len(stt_text)
 
-        recognized_text_log = f"Recognized speech: {stt_text}"
-        print(recognized_text_log, flush=True)
-        log.info(recognized_text_log)
+    if (bot_config.exp_lang_autoswitch == True):
+        lang_switcher = check_lang_switch_phrases(stt_text)
+        if (lang_switcher != None):
+            change_language(lang_switcher)
+            print(f"Language switched to {lang_switcher['language']}")
+            log.info(f"Language switched to {lang_switcher['language']}")
+            stt_text = f" From now on, you will have to respond in {lang_switcher['language']}! So please respond in {lang_switcher['language']}. Acknowledge this by saying that you will speak now in {lang_switcher['language']}"
 
-        total_stt_chars += len(stt_text)
+    return stt_text
 
-        if (mute_mic_during_tts): utils.mute_mic(device_name=input_device_name)
-        
+def state_changed(state, text):
+    """Display, microphone and listener follow the orchestrator state. Runs on the orchestrator loop."""
+    if (state == BotState.LISTENING):
+        print("Speak!")
         if (bot_config.change_face == True):
-            change_mood_thinking(stt_text)
-           
-        thinking = True
-        start = time.time()
-
-        if (bot_config.exp_lang_autoswitch == True):
-            lang_switcher = check_lang_switch_phrases(stt_text)
-            if (lang_switcher != None):
-                change_language(lang_switcher)
-                print(f"Language switched to {lang_switcher['language']}")
-                log.info(f"Language switched to {lang_switcher['language']}")
-                stt_text = f" From now on, you will have to respond in {lang_switcher['language']}! So please respond in {lang_switcher['language']}. Acknowledge this by saying that you will speak now in {lang_switcher['language']}"
-
-        response_text = gpt_service.ask(stt_text)
-        openai_call_duration = f'OpenAI API call ended: {time.time() - start} ms'
-        print(openai_call_duration, flush=True)
-        log.debug(openai_call_duration)
-        thinking = False
-        
+            lcd_service.draw_face(face=DisplayIcons.FACE_LISTEN, icon=DisplayIcons.ICON_MIC, additional_text=translation[ui_lang]['listening'])
+        if (mute_mic_during_tts): hardware.mixer.unmute_mic(device_name=input_device_name)
+        # start background listener if not started
+        if background_listener is None and recognizer is not None and microphone is not None:
+            set_speech_recognizer_events()
+    elif (state == BotState.IDLE):
         if (bot_config.change_face == True):
-            change_mood_talking(response_text)
-            time.sleep(0.5) 
-        
-        start = time.time()
-        speak_text(response_text)
-
-        if (listening == False):
-            return
-        
-        print("Speak!")
-        if (bot_config.auto_mute_mic == True): 
-            toggle_mute(False)
-        else:
-            toggle_mute(True)
-            
-    except Exception as e:
-        log.error(e)
-        if hasattr(e, 'message'):
-            print(e.message)
-            log.error(e.message)
-        else:
-            print(e)          
-        return "" 
-
-# Google SpeechRecognition callback
-def google_stt_callback(recognizer_obj, audio):
-    """Callback used by listen_in_background. Runs in a separate thread."""
-    try:
-        # Use Google Web Speech API (online) — good for accuracy and lighter on Pi
-        text = recognizer_obj.recognize_google(audio, language=speech_lang)
-        # pass to main processing function
-        process_recognized_text(text)
-    except sr.UnknownValueError:
-        # speech was unintelligible
-        return
-    except sr.RequestError as e:
-        # API was unreachable or unresponsive
-        log.error(f"Could not request results from Google Speech Recognition service; {e}")
-        return
-    except Exception as e:
-        log.error(f"Google STT callback error: {e}")
+            lcd_service.draw_face(face=DisplayIcons.FACE_SILENT, icon=DisplayIcons.ICON_MIC_OFF, additional_text=translation[ui_lang]['silent'])  
+        if (mute_mic_during_tts): hardware.mixer.mute_mic(device_name=input_device_name)
+        # stop background listening
+        unset_speech_recognizer_events()
+    elif (state == BotState.THINKING):
+        # with barge-in the microphone has to hear the user while the bot is talking
+        if (mute_mic_during_tts and bot_config.barge_in == False): hardware.mixer.mute_mic(device_name=input_device_name)
+        if (bot_config.change_face == True):
+            change_mood_thinking(text)
+    elif (state == BotState.SPEAKING):
+        if (bot_config.change_face == True):
+            change_mood_talking(text)
+
+# Speech recognition callback
+def stt_callback(audio, stream_result=None, timing=None):
+    """Callback used by the speech listener for every phrase, recognized on the orchestrator loop."""
+    global last_partial_text
+    last_partial_text = ""
+    orchestrator.post_event("phrase", audio, stream_result, timing)
+
+def wake_word_heard():
+    print(f"Wake word heard: {bot_config.keyword}", flush=True)
+    if (bot_config.change_face == True):
+        lcd_service.draw_face(face=DisplayIcons.FACE_LISTEN, icon=DisplayIcons.ICON_MIC, additional_text=translation[ui_lang]['listening'], top_small_text=bot_config.keyword)
+
+def speech_started():
+    """The user started speaking: with barge-in the answer is stopped right away, before the phrase is recognized."""
+    orchestrator.post_event("speech_start")
+
+def listener_failed(error):
+    """The speech listener stopped after repeated microphone errors."""
+    print(f"Microphone error, listening stopped: {error}", flush=True)
+    orchestrator.post_event("listener_error", error)
+
+last_partial_text = ""
+
+def show_partial_text(partial_text):
+    """Partial transcript from a streaming STT backend, while the user is still speaking."""
+    global last_partial_text
+    if partial_text == last_partial_text or orchestrator.state != BotState.LISTENING:
         return
+    last_partial_text = partial_text
+    log.debug(f"Partial speech: {partial_text}")
+    if (bot_config.change_face == True and bot_config.show_recognized == True):
+        lcd_service.draw_face(face=DisplayIcons.FACE_LISTEN, icon=DisplayIcons.ICON_MIC, additional_text=translation[ui_lang]['listening'], top_small_text=textwrap.fill(partial_text, width=70))
 
 def change_mood_thinking(top_text):
     wrapper = textwrap.TextWrapper(width=70)
     text_wrapped = wrapper.fill(text=top_text)
     if (bot_config.show_recognized == False): 
         text_wrapped = ''
-    lcd_service.draw_face(face=LCDServiceColor.FACE_THINK, icon=LCDServiceColor.ICON_LOAD, additional_text=translation[ui_lang]['thinking'], top_small_text=text_wrapped)
+    lcd_service.draw_face(face=DisplayIcons.FACE_THINK, icon=DisplayIcons.ICON_LOAD, additional_text=translation[ui_lang]['thinking'], top_small_text=text_wrapped, animate=True)
 
 def change_mood_talking(top_text):
     wrapper = textwrap.TextWrapper(width=70)
     text_wrapped = wrapper.fill(text=top_text)
     if (bot_config.show_gpt_response == False):
         text_wrapped = ''    
-    lcd_service.draw_face(face=LCDServiceColor.FACE_TALK, icon=LCDServiceColor.ICON_SPEAKER, additional_text=translation[ui_lang]['speaking'], top_small_text=text_wrapped)
+    lcd_service.draw_face(face=DisplayIcons.FACE_TALK, icon=DisplayIcons.ICON_SPEAKER, additional_text=translation[ui_lang]['speaking'], top_small_text=text_wrapped)
 
 def escape( str_xml: str ):
     str_xml = str_xml.replace("&", "&amp;")
@@ -203,60 +202,10 @@ def escape( str_xml: str ):
     str_xml = str_xml.replace("'", "&apos;")
     return str_xml       
 
-def speak_text(text):
-    """
-    Use gTTS to synthesize speech, save to a temporary mp3, play with mpg123 (must be installed),
-    and delete the temp file after playing.
-    """
-    global speaking
-    global total_tts_duration
-
-    if text is None or text.strip() == "":
-        return
-
-    speaking = True
-    try:
-        # Map speech_lang (like 'hu' or 'en') to gTTS language codes
-        # speech_lang is e.g. 'hu' or 'en' or 'de' from voice config
-        gtts_lang = speech_lang if len(speech_lang) == 2 else speech_lang[0:2]
-
-        # gTTS may not support every language variant; fallback if needed
-        try:
-            tts = gTTS(text=text, lang=gtts_lang)
-        except Exception as e:
-            log.warning(f"gTTS init failed for lang {gtts_lang}: {e}. Falling back to 'en'.")
-            tts = gTTS(text=text, lang='en')
-
-        tmpf = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-        tmpf_name = tmpf.name
-        tmpf.close()
-        tts.save(tmpf_name)
-
-        # play using mpg123 (quiet)
-        # ensure mpg123 is installed on the system: sudo apt-get install -y mpg123
-        play_start = time.time()
-        try:
-            subprocess.run(['mpg123', '-q', tmpf_name], check=True)
-        except FileNotFoundError:
-            log.error("mpg123 not found. Please install mpg123 or change playback method.")
-            # try with aplay (works for wav only), so warn if mpg123 missing
-        play_end = time.time()
-
-        # Update total_tts_duration with playback time
-        duration = play_end - play_start
-        total_tts_duration += duration
-
-        print(f"AI response (played ~{duration:.2f}s): {text}")
-    except Exception as e:
-        log.error(f"TTS error: {e}")
-    finally:
-        speaking = False
-        # cleanup temp file
-        try:
-            if os.path.exists(tmpf_name):
-                os.remove(tmpf_name)
-        except:
-            pass
+def get_gtts_lang():
+    # Map speech_lang (like 'hu' or 'en') to gTTS language codes
+    # speech_lang is e.g. 'hu' or 'en' or 'de' from voice config
+    return speech_lang if len(speech_lang) == 2 else speech_lang[0:2]
 
 # Unregister / stop background listening
 def unset_speech_recognizer_events():
@@ -270,7 +219,7 @@ def unset_speech_recognizer_events():
 
 # Register speech recognizer events / start background listener
 def set_speech_recognizer_events():
-    global recognizer, microphone, background_listener, listening
+    global recognizer, microphone, background_listener
 
     if recognizer is None or microphone is None:
         return
@@ -278,8 +227,16 @@ def set_speech_recognizer_events():
     # Start background listening; this returns a function to stop listening
     # use phrase_time_limit if needed, otherwise continuous streaming to callback
     try:
-        background_listener = recognizer.listen_in_background(microphone, google_stt_callback, phrase_time_limit=None)
-        listening = True
+        wake_word_spotter = None
+        if (bot_config.wake_word_enabled == True):
+            wake_word_spotter = create_wake_word_spotter(bot_config.keyword, speech_lang, stt_backend, bot_config.wake_word_timeout)
+        speech_listener = SpeechListener(recognizer, microphone, stt_callback, stt_backend=stt_backend, language=speech_lang, on_partial=show_partial_text,
+                                         wake_word_spotter=wake_word_spotter, on_wake=wake_word_heard,
+                                         vad_aggressiveness=bot_config.vad_aggressiveness, trailing_silence=bot_config.vad_trailing_silence,
+                                         max_utterance=bot_config.vad_max_utterance,
+                                         on_speech_start=speech_started, playback_state=tts_service.playback_state,
+                                         on_error=listener_failed)
+        background_listener = speech_listener.start()
     except Exception as e:
         log.error(f"Failed to start background listener: {e}")
         background_listener = None
@@ -290,19 +247,13 @@ def run_ai():
 
     global program_start_time
 
-    # Start continuous speech recognition
-    if (mute_mic_during_tts): utils.unmute_mic(device_name=input_device_name)
-
     program_start_time = time.time()
-  
-    if (bot_config.auto_mute_mic == True): 
-        toggle_mute(False)
-    else:
-        print("Speak!")
-        lcd_service.draw_face(face=LCDServiceColor.FACE_LISTEN, icon=LCDServiceColor.ICON_MIC, additional_text=translation[ui_lang]['listening'])
 
-    while not done:
-        time.sleep(.5)
+    # The conversation runs on the orchestrator event loop until the program is stopped
+    orchestrator.on_state_change = state_changed
+    orchestrator.prepare_question = prepare_question
+    orchestrator.language = get_gtts_lang()
+    asyncio.run(orchestrator.run(start_muted=bot_config.auto_mute_mic))
 
 def init_logging():
     global log
@@ -313,14 +264,19 @@ def check_internet():
         
     if (utils.has_internet() == True):
         return
+
+    if (stt_backend.streaming == True):
+        # speech recognition works offline, don't block the startup
+        log.warning("No internet connection, starting with offline speech recognition")
+        return
         
     time.sleep(1)
 
     while not utils.has_internet():
-        lcd_service.draw_large_icon(LCDServiceColor.ICON_ERROR, "Waiting for internet connect...")
+        lcd_service.draw_large_icon(DisplayIcons.ICON_ERROR, "Waiting for internet connect...")
         time.sleep(1)
     
-    lcd_service.draw_large_icon(LCDServiceColor.ICON_WIFI, "Internet connection found!")
+    lcd_service.draw_large_icon(DisplayIcons.ICON_WIFI, "Internet connection found!")
     time.sleep(1)
     lcd_service.clear_screen()    
 
@@ -352,12 +308,13 @@ def change_voice(voice_name):
     # first 5 chars like 'hu-HU' -> take 'hu' for gTTS and Google (language code)
     speech_lang = speech_voice[0:2].lower()
     ui_lang = speech_voice[0:2]
+    orchestrator.language = get_gtts_lang()
 
     # (re)create recognizer and microphone with updated language if necessary
     recognizer = sr.Recognizer()
     # microphone may optionally specify device index; use default Microphone
     try:
-        microphone = sr.Microphone()  # you could pass device_index if needed
+        microphone = hardware.create_microphone()  # you could pass device_index if needed
     except Exception as e:
         log.error(f"Failed to initialize microphone: {e}")
         microphone = None
@@ -385,9 +342,10 @@ def init_speech_google(voice_name):
     recognizer = sr.Recognizer()
     try:
         # adjust for ambient noise
-        microphone = sr.Microphone()
-        with microphone as source:
-            recognizer.adjust_for_ambient_noise(source, duration=1.0)
+        microphone = hardware.create_microphone()
+        if isinstance(microphone, sr.AudioSource):
+            with microphone as source:
+                recognizer.adjust_for_ambient_noise(source, duration=1.0)
     except Exception as e:
         log.error(f"Microphone initialization failed: {e}")
         microphone = None
@@ -395,66 +353,68 @@ def init_speech_google(voice_name):
     # Start background listening
     set_speech_recognizer_events()
 
+def prewarm_tts_cache():
+    """
+    Synthesize the frequently spoken phrases (tts_phrases.yaml) for the current language
+    into the TTS cache in the background, so they are played without a network round trip.
+    """
+    phrases_path = str(Path(__file__).resolve().parent.joinpath('', 'tts_phrases.yaml'))
+    if tts_cache is None or not os.path.isfile(phrases_path):
+        return
+    with open(phrases_path, "r") as stream:
+        try:
+            phrases = yaml.safe_load(stream) or {}
+        except yaml.YAMLError as exc:
+            log.error(exc)
+            return
+    lang = get_gtts_lang()
+    threading.Thread(target=tts_service.prewarm, args=(phrases.get(lang, []), lang), daemon=True).start()
+
 def init_gpio():
-    GPIO.setmode(GPIO.BCM) # Use physical pin numbering
-    GPIO.setup(15, GPIO.IN, pull_up_down=GPIO.PUD_DOWN) # Set pin 15 as input
-    GPIO.add_event_detect(15,GPIO.RISING,callback=button_pushed, bouncetime=500) # Setup event on pin 15 rising edge
+    # rising edge on pin 15 (or SimulatedButton.press()) toggles mute
+    hardware.button.start(button_pushed)
     
 
 def button_pushed(channel):
-
-    global thinking
-    if (thinking == True):
-        return
-    
-    global listening
-    listening = not listening
-    toggle_mute(listening)
-
-def toggle_mute(listening_local):
-    """
-    Start/stop recognition according to listening_local. Also handle mic mute and TTS stop.
-    """
-    global recognizer, microphone, background_listener, listening
-
-    if (listening_local == True):
-        listening = True
-        if (bot_config.change_face == True):
-            lcd_service.draw_face(face=LCDServiceColor.FACE_LISTEN, icon=LCDServiceColor.ICON_MIC, additional_text=translation[ui_lang]['listening'])
-        if (mute_mic_during_tts): utils.unmute_mic(device_name=input_device_name)
-        # start background listener if not started
-        if background_listener is None and recognizer is not None and microphone is not None:
-            set_speech_recognizer_events()
-    if (listening_local == False):
-        listening = False
-        if (bot_config.change_face == True):
-            lcd_service.draw_face(face=LCDServiceColor.FACE_SILENT, icon=LCDServiceColor.ICON_MIC_OFF, additional_text=translation[ui_lang]['silent'])  
-        if (mute_mic_during_tts): utils.mute_mic(device_name=input_device_name)
-        # stop background listening
-        unset_speech_recognizer_events()
+    # mute / unmute, a muted bot stops talking right away
+    orchestrator.post_event("button")
 
 def init_ai():
     global gpt_service
-    gpt_service = GPTChatService(translation[ui_lang]['lang'])
+    response_cache = create_response_cache(bot_config.response_cache_hours, bot_config.response_cache_similarity)
+    gpt_service = GPTChatService(translation[ui_lang]['lang'], response_cache=response_cache)
+    orchestrator.gpt_service = gpt_service
     print(translation[ui_lang]['lang'])
 
 def end_program(write_stats = True):
 
     lcd_service.clear_screen()
-    GPIO.cleanup()     
+    lcd_service.stop()
+    hardware.button.cleanup()
+    tts_service.shutdown()
+    if orchestrator.gpt_service is not None and orchestrator.gpt_service.response_cache is not None:
+        # the answers cached since the last save
+        orchestrator.gpt_service.response_cache.close()
 
     if (write_stats):
         global gpt_service
         global program_start_time
         global total_stt_chars
-        global total_tts_duration
 
         program_end_time = time.time()
         program_run_duration = program_end_time - program_start_time
         print(f'STATS: program duration: {program_run_duration} seconds')
-        print(f'STATS: total TTS duration: {total_tts_duration} sec')
+        print(f'STATS: total TTS duration: {tts_service.total_tts_duration} sec')
+        print(f'STATS: TTS pipeline: {tts_service.get_stats()}')
+        print(f'STATS: TTS cache: {tts_service.get_cache_stats()}')
         print(f'STATS: total STT characters: {total_stt_chars} chars')    
-        print(f'STATS: total OpenAI API tokens: {gpt_service.get_stats()}')        
+        print(f'STATS: total OpenAI API tokens: {gpt_service.get_stats()}')
+        print(f'STATS: tool result cache: {gpt_service.openai_tools.get_cache_stats()}')
+        print(f'STATS: response cache: {gpt_service.response_cache.get_stats() if gpt_service.response_cache is not None else "disabled"}')
+        print(f'STATS: tool HTTP requests: {gpt_service.openai_tools.http_client.get_stats()}')
+        print(f'STATS: display: {lcd_service.get_stats()}')
+        print(f'STATS: conversation: {orchestrator.get_stats()}')
+        print(f'STATS: turn latency: {turn_tracer.get_stats()}')        
     
 
 
@@ -462,9 +422,12 @@ def main():
     try:
         init_gpio()
         init_logging()
+        # one playback device handle for the whole run
+        tts_service.set_player(hardware.create_speaker(output_device_name))
         check_internet()
         # Initialize Google STT + gTTS stack
         init_speech_google(bot_config.voice_name)        
+        prewarm_tts_cache()
         init_ai()        
         run_ai() 
     except KeyboardInterrupt:
@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import logging
+import argparse
+import threading
+import speech_recognition as sr
+from dotenv import load_dotenv
+
+# Try importing the WebSocket client safely, it is only needed in client mode
+try:
+    from websockets.sync.client import connect
+    from websockets.exceptions import ConnectionClosed
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+load_dotenv()
+
+from botconfig import BotConfig
+bot_config = BotConfig()
+
+from hardware import Hardware, DisplayIcons
+from displayservice import DisplayService
+from speechlistener import SpeechListener
+
+BOT_SERVER_URL = os.getenv('BOT_SERVER_URL', 'ws://localhost:8765')
+BOT_DEVICE_ID = os.getenv('BOT_DEVICE_ID', socket.gethostname())
+# Shared secret of the server, sent in the hello message
+BOT_SERVER_TOKEN = os.getenv('BOT_SERVER_TOKEN', '')
+# Seconds to wait before connecting again after the server went away
+RECONNECT_DELAY = 3
+
+STATE_FACES = {
+    "listening": (DisplayIcons.FACE_LISTEN, DisplayIcons.ICON_MIC),
+    "idle": (DisplayIcons.FACE_SILENT, DisplayIcons.ICON_MIC_OFF),
+    "thinking": (DisplayIcons.FACE_THINK, DisplayIcons.ICON_LOAD),
+    "speaking": (DisplayIcons.FACE_TALK, DisplayIcons.ICON_SPEAKER),
+}
+
+
+class BotClient:
+    """
+    Thin device for botserver.py: captures the phrases with the speech listener, sends
+    them to the server and plays the mp3 chunks of the answer. Recognition, the model,
+    the tools and the synthesis all run on the server.
+    """
+
+    def __init__(self, server_url=BOT_SERVER_URL, device_id=BOT_DEVICE_ID, language="hu",
+                 output_device_name="default", barge_in=None, token=BOT_SERVER_TOKEN):
+        self.log = logging.getLogger("bot_log")
+        self.server_url = server_url
+        self.device_id = device_id
+        self.token = token
+        self.language = language
+        self.barge_in = bot_config.barge_in if barge_in is None else barge_in
+
+        self.hardware = Hardware()
+        self.display = DisplayService(self.hardware.display)
+        self.player = self.hardware.create_speaker(output_device_name)
+        self.microphone = self.hardware.create_microphone()
+        self.recognizer = sr.Recognizer()
+
+        self.connection = None
+        self.send_lock = threading.Lock()
+        self.playback_queue = queue.Queue()
+        # bumped on "stop", audio of an older generation is dropped
+        self.generation = 0
+        # generation of the audio played last, the player is reset when a newer one starts
+        self.playing_generation = 0
+        self.next_chunk = None
+        self.running = True
+
+        # Statistics
+        self.total_phrases = 0
+        self.total_played_chunks = 0
+        self.total_reconnects = 0
+
+    def send(self, message):
+        connection = self.connection
+        if connection is None:
+            return
+        try:
+            with self.send_lock:
+                connection.send(message if isinstance(message, bytes) else json.dumps(message))
+        except (ConnectionClosed, OSError):
+            # the receive loop reconnects
+            pass
+
+    def on_phrase(self, audio_data, stream_result=None, timing=None):
+        self.total_phrases += 1
+        self.send(audio_data.get_raw_data(convert_width=2))
+
+    def on_speech_start(self):
+        self.send({"type": "speech_start"})
+
+    def on_listener_error(self, error):
+        print(f"Microphone error, listening stopped: {error}", flush=True)
+        self.display.draw_large_icon(DisplayIcons.ICON_ERROR, "Microphone error")
+
+    def button_pushed(self, channel):
+        self.send({"type": "button"})
+
+    def run(self):
+        self.hardware.button.start(self.button_pushed)
+        threading.Thread(target=self.playback_loop, name="client_playback", daemon=True).start()
+        listener = SpeechListener(self.recognizer, self.microphone, self.on_phrase, language=self.language,
+                                  vad_aggressiveness=bot_config.vad_aggressiveness, trailing_silence=bot_config.vad_trailing_silence,
+                                  max_utterance=bot_config.vad_max_utterance,
+                                  on_speech_start=self.on_speech_start, playback_state=self.player.playback_state,
+                                  on_error=self.on_listener_error)
+        listener.start()
+        try:
+            while self.running:
+                try:
+                    self.receive_loop()
+                except (ConnectionClosed, OSError) as e:
+                    self.log.warning(f"Bot server connection lost: {e}")
+                self.connection = None
+                self.stop_playback()
+                if self.running:
+                    self.display.draw_large_icon(DisplayIcons.ICON_ERROR, "Waiting for the server...")
+                    time.sleep(RECONNECT_DELAY)
+                    self.total_reconnects += 1
+        finally:
+            listener.stop(wait_for_stop=False)
+
+    def receive_loop(self):
+        with connect(self.server_url) as connection:
+            connection.send(json.dumps({"type": "hello", "device_id": self.device_id, "token": self.token, "language": self.language,
+                                        "sample_rate": self.microphone.SAMPLE_RATE, "barge_in": self.barge_in}))
+            self.connection = connection
+            print(f"Connected to {self.server_url} as {self.device_id}", flush=True)
+            self.log.info(f"Connected to {self.server_url} as {self.device_id}")
+            for message in connection:
+                if isinstance(message, bytes):
+                    self.playback_queue.put((self.generation, self.next_chunk, message))
+                    continue
+                self.handle_message(json.loads(message))
+
+    def handle_message(self, message):
+        message_type = message.get("type")
+        if message_type == "audio":
+            self.next_chunk = message["chunk"]
+        elif message_type == "stop":
+            self.stop_playback()
+        elif message_type == "state":
+            self.show_state(message["state"], message.get("text", ""))
+        elif message_type == "error":
+            print(f"Bot server error: {message.get('message')}", flush=True)
+            self.log.error(f"Bot server error: {message.get('message')}")
+
+    def show_state(self, state, text):
+        if state == "listening":
+            print("Speak!")
+        if state in STATE_FACES and bot_config.change_face == True:
+            face, icon = STATE_FACES[state]
+            self.display.draw_face(face=face, icon=icon, animate=(state == "thinking"))
+
+    def stop_playback(self):
+        # the player stays stopped until the audio of the next generation (playback_loop)
+        self.generation += 1
+        self.player.stop()
+
+    def playback_loop(self):
+        while self.running:
+            generation, chunk, audio = self.playback_queue.get()
+            if generation != self.generation:
+                continue
+            if generation != self.playing_generation:
+                self.player.reset()
+                self.playing_generation = generation
+            self.player.play(audio)
+            self.total_played_chunks += 1
+            if generation == self.generation:
+                self.send({"type": "played", "chunk": chunk})
+
+    def stop(self):
+        self.running = False
+        connection = self.connection
+        if connection is not None:
+            connection.close()
+
+    def get_stats(self):
+        return f"{self.total_phrases} phrases sent, {self.total_played_chunks} chunks played, {self.total_reconnects} reconnects"
+
+
+def init_logging():
+    global log
+    log = logging.getLogger("bot_log")
+    logging.basicConfig(filename='gpt_service.log', level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thin voice client of botserver.py")
+    parser.add_argument("--server", default=BOT_SERVER_URL, help="e.g. ws://bot-server:8765")
+    parser.add_argument("--device-id", default=BOT_DEVICE_ID)
+    parser.add_argument("-o", "--audio_output", default="default", help='Audio output device')
+    args = parser.parse_args()
+
+    if not WEBSOCKETS_AVAILABLE:
+        print("⚠️  websockets not installed — pip install websockets", file=sys.stderr)
+        return 1
+
+    init_logging()
+    client = BotClient(server_url=args.server, device_id=args.device_id,
+                       language=bot_config.voice_name[0:2].lower(), output_device_name=args.audio_output)
+    try:
+        client.run()
+    except KeyboardInterrupt:
+        client.stop()
+    finally:
+        client.display.stop()
+        client.hardware.button.cleanup()
+        client.player.close()
+        print(f'STATS: client: {client.get_stats()}')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,16 @@
 import yaml
 from pathlib import Path
-import alsaaudio
-import sys
 import os
 
+from hardware import create_mixer
 
-class BotConfig:
 
-    OUTPUT_DEVICE_INDEX = 1
+class BotConfig:
 
-    def _init_(self):
-        self.conf_path = str(Path(_file_).resolve().parent.joinpath('', 'bot_config.yaml'))
+    def __init__(self):
+        # ALSA on the Pi, in-memory when simulated (BOT_HARDWARE)
+        self.mixer = create_mixer()
+        self.conf_path = str(Path(__file__).resolve().parent.joinpath('', 'bot_config.yaml'))
         self.load_config()
 
     def load_config(self):
@@ -35,6 +35,19 @@ class BotConfig:
         self._auto_mute_mic = self.bot_config_yaml['general']['auto_mute_mic']
         self._exp_lang_autoswitch = self.bot_config_yaml['general']['exp_lang_autoswitch']
         self._keyword = self.bot_config_yaml['voice']['keyword']
+        self._stream_response = self.bot_config_yaml['general'].get('stream_response', True)
+        self._barge_in = self.bot_config_yaml['general'].get('barge_in', False)
+        self._summarize_history = self.bot_config_yaml['ai_personality'].get('summarize_history', False)
+        self._response_cache_hours = float(self.bot_config_yaml['ai_personality'].get('response_cache_hours', 0))
+        self._response_cache_similarity = float(self.bot_config_yaml['ai_personality'].get('response_cache_similarity', 0.85))
+        self._stt_backend = self.bot_config_yaml['voice'].get('stt_backend', 'google')
+        self._stt_min_confidence = float(self.bot_config_yaml['voice'].get('stt_min_confidence', 0.6))
+        self._wake_word_enabled = self.bot_config_yaml['voice'].get('wake_word_enabled', False)
+        self._wake_word_timeout = int(self.bot_config_yaml['voice'].get('wake_word_timeout', 10))
+        self._vad_aggressiveness = int(self.bot_config_yaml['voice'].get('vad_aggressiveness', 2))
+        self._vad_trailing_silence = float(self.bot_config_yaml['voice'].get('vad_trailing_silence', 0.5))
+        self._vad_max_utterance = float(self.bot_config_yaml['voice'].get('vad_max_utterance', 15))
+        self._tts_cache_size_mb = int(self.bot_config_yaml['voice'].get('tts_cache_size_mb', 50))
 
     def save_config(self):
         self.bot_config_yaml['ai_personality']['gpt_model'] = self._gpt_model
@@ -53,6 +66,19 @@ class BotConfig:
         self.bot_config_yaml['general']['auto_mute_mic'] = self._auto_mute_mic
         self.bot_config_yaml['general']['exp_lang_autoswitch'] = self._exp_lang_autoswitch
         self.bot_config_yaml['voice']['keyword'] = self._keyword
+        self.bot_config_yaml['general']['stream_response'] = self._stream_response
+        self.bot_config_yaml['general']['barge_in'] = self._barge_in
+        self.bot_config_yaml['voice']['tts_cache_size_mb'] = self._tts_cache_size_mb
+        self.bot_config_yaml['voice']['stt_backend'] = self._stt_backend
+        self.bot_config_yaml['voice']['vad_aggressiveness'] = self._vad_aggressiveness
+        self.bot_config_yaml['voice']['vad_trailing_silence'] = self._vad_trailing_silence
+        self.bot_config_yaml['voice']['vad_max_utterance'] = self._vad_max_utterance
+        self.bot_config_yaml['voice']['wake_word_enabled'] = self._wake_word_enabled
+        self.bot_config_yaml['voice']['wake_word_timeout'] = self._wake_word_timeout
+        self.bot_config_yaml['voice']['stt_min_confidence'] = self._stt_min_confidence
+        self.bot_config_yaml['ai_personality']['summarize_history'] = self._summarize_history
+        self.bot_config_yaml['ai_personality']['response_cache_hours'] = self._response_cache_hours
+        self.bot_config_yaml['ai_personality']['response_cache_similarity'] = self._response_cache_similarity
 
         with open(self.conf_path, 'w') as stream:
             try:
@@ -60,36 +86,14 @@ class BotConfig:
             except yaml.YAMLError as exc:
                 print(exc)
 
-    def get_mixer(self, device_index):
-        try:
-            # Use 'Master' since your Pi supports it
-            mixer = alsaaudio.Mixer(control='Master', cardindex=device_index)
-            print("✅ Using 'Master' mixer for audio output")
-            return mixer
-        except alsaaudio.ALSAAudioError:
-            print("⚠ No such mixer found. Audio may not work.", file=sys.stderr)
-            return None
-
     def change_speaker_volume(self, volume):
-        mixer = self.get_mixer(self.OUTPUT_DEVICE_INDEX)
-        if mixer:
-            mixer.setvolume(volume)
-        else:
-            print("⚠ Cannot set volume, mixer not found")
+        self.mixer.set_speaker_volume(volume)
 
     def store_volume(self):
-        os.system("alsactl store")
+        self.mixer.store()
 
     def get_speaker_volume(self):
-        mixer = self.get_mixer(self.OUTPUT_DEVICE_INDEX)
-        if mixer is None:
-            print("⚠ No mixer found, using default volume 70")
-            return [70]
-        try:
-            return mixer.getvolume()
-        except Exception as e:
-            print(f"⚠ Mixer error: {e}, using default volume 70")
-            return [70]
+        return self.mixer.get_speaker_volume()
 
     # ====== Property Methods ======
 
@@ -213,6 +217,110 @@ class BotConfig:
     def show_recognized(self, show_recognized):
         self._show_recognized = show_recognized
 
+    @property
+    def stream_response(self):
+        return self._stream_response
+
+    @stream_response.setter
+    def stream_response(self, stream_response):
+        self._stream_response = stream_response
+
+    @property
+    def barge_in(self):
+        return self._barge_in
+
+    @barge_in.setter
+    def barge_in(self, barge_in):
+        self._barge_in = barge_in
+
+    @property
+    def tts_cache_size_mb(self):
+        return self._tts_cache_size_mb
+
+    @tts_cache_size_mb.setter
+    def tts_cache_size_mb(self, tts_cache_size_mb):
+        self._tts_cache_size_mb = int(tts_cache_size_mb)
+
+    @property
+    def summarize_history(self):
+        return self._summarize_history
+
+    @summarize_history.setter
+    def summarize_history(self, summarize_history):
+        self._summarize_history = summarize_history
+
+    @property
+    def response_cache_hours(self):
+        return self._response_cache_hours
+
+    @response_cache_hours.setter
+    def response_cache_hours(self, response_cache_hours):
+        self._response_cache_hours = float(response_cache_hours)
+
+    @property
+    def response_cache_similarity(self):
+        return self._response_cache_similarity
+
+    @response_cache_similarity.setter
+    def response_cache_similarity(self, response_cache_similarity):
+        self._response_cache_similarity = float(response_cache_similarity)
+
+    @property
+    def stt_backend(self):
+        return self._stt_backend
+
+    @stt_backend.setter
+    def stt_backend(self, stt_backend):
+        self._stt_backend = stt_backend
+
+    @property
+    def stt_min_confidence(self):
+        return self._stt_min_confidence
+
+    @stt_min_confidence.setter
+    def stt_min_confidence(self, stt_min_confidence):
+        self._stt_min_confidence = float(stt_min_confidence)
+
+    @property
+    def wake_word_enabled(self):
+        return self._wake_word_enabled
+
+    @wake_word_enabled.setter
+    def wake_word_enabled(self, wake_word_enabled):
+        self._wake_word_enabled = wake_word_enabled
+
+    @property
+    def wake_word_timeout(self):
+        return self._wake_word_timeout
+
+    @wake_word_timeout.setter
+    def wake_word_timeout(self, wake_word_timeout):
+        self._wake_word_timeout = int(wake_word_timeout)
+
+    @property
+    def vad_aggressiveness(self):
+        return self._vad_aggressiveness
+
+    @vad_aggressiveness.setter
+    def vad_aggressiveness(self, vad_aggressiveness):
+        self._vad_aggressiveness = int(vad_aggressiveness)
+
+    @property
+    def vad_trailing_silence(self):
+        return self._vad_trailing_silence
+
+    @vad_trailing_silence.setter
+    def vad_trailing_silence(self, vad_trailing_silence):
+        self._vad_trailing_silence = float(vad_trailing_silence)
+
+    @property
+    def vad_max_utterance(self):
+        return self._vad_max_utterance
+
+    @vad_max_utterance.setter
+    def vad_max_utterance(self, vad_max_utterance):
+        self._vad_max_utterance = float(vad_max_utterance)
+
     def get_logs(self):
         log_file_path = str(Path(_file_).resolve().parent.joinpath('', 'bot_log.txt'))
         data = ''
@@ -0,0 +1,443 @@
+import os
+import sys
+import json
+import time
+import hmac
+import asyncio
+import ipaddress
+import logging
+import argparse
+import threading
+import concurrent.futures
+from collections import OrderedDict
+import speech_recognition as sr
+from dotenv import load_dotenv
+
+# Try importing the WebSocket server safely, it is only needed in server mode
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
+load_dotenv()
+
+from botconfig import BotConfig
+bot_config = BotConfig()
+
+from tools import AITools
+from ttlcache import TTLCache
+from httpclient import HTTPClient
+from ttscache import TTSCache
+from ttsservice import TTSService
+from semanticcache import create_response_cache
+from sttservice import create_stt_backend
+from gptchatservice import GPTChatService, create_openai_clients
+from orchestrator import ConversationOrchestrator, BotState
+from turntrace import TurnTracer
+
+# Only local devices by default; set e.g. 0.0.0.0 together with BOT_SERVER_TOKEN to serve the network
+BOT_SERVER_HOST = os.getenv('BOT_SERVER_HOST', '127.0.0.1')
+BOT_SERVER_PORT = int(os.getenv('BOT_SERVER_PORT', 8765))
+# Shared secret the devices send in their hello message, required unless the host is a loopback address
+BOT_SERVER_TOKEN = os.getenv('BOT_SERVER_TOKEN', '')
+# Conversations kept in memory; when full, the longest idle disconnected one is dropped
+BOT_SERVER_MAX_SESSIONS = int(os.getenv('BOT_SERVER_MAX_SESSIONS', 100))
+# Seconds after which the conversation of a disconnected device is dropped
+SESSION_IDLE_TIMEOUT = 30 * 60
+# Seconds a new connection has to send its hello message
+HELLO_TIMEOUT = 10
+# Largest message accepted from a device: a 15s phrase at 16 kHz is ~480 kB
+MAX_MESSAGE_BYTES = 2 * 1024 * 1024
+
+LANGUAGE_NAMES = {"hu": "Hungarian", "en": "English", "de": "German"}
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # a host name or "" (all interfaces)
+        return False
+
+
+class SharedServices:
+    """
+    Everything the sessions share: the OpenAI clients (and their connection pools),
+    the tool HTTP client, tool result cache and tool pool, the response cache,
+    the speech recognizer, the TTS phrase cache and synthesis pool, and the turn tracer.
+    """
+
+    def __init__(self):
+        self.http_client = HTTPClient(pool_maxsize=16)
+        self.tool_cache = TTLCache(max_size=1024)
+        self.openai_tools = AITools(http_client=self.http_client, tool_cache=self.tool_cache)
+        self.openai_clients = create_openai_clients()
+        # answers are keyed by personality and language, so every device can reuse them
+        self.response_cache = create_response_cache(bot_config.response_cache_hours, bot_config.response_cache_similarity)
+        self.tool_pool = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="ai_tool")
+        self.stt_backend = create_stt_backend(bot_config.stt_backend, min_confidence=bot_config.stt_min_confidence)
+        self.tts_cache = TTSCache(max_size_bytes=bot_config.tts_cache_size_mb * 1024 * 1024) if bot_config.tts_cache_size_mb > 0 else None
+        # gTTS waits on the network most of the time, so more workers than cores
+        self.synth_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(4, 2 * (os.cpu_count() or 1)), thread_name_prefix="tts_synth")
+        self.tracer = TurnTracer()
+
+    def shutdown(self):
+        if self.response_cache is not None:
+            self.response_cache.close()
+        self.tool_pool.shutdown(wait=False, cancel_futures=True)
+        self.synth_pool.shutdown(wait=False, cancel_futures=True)
+        self.http_client.close()
+
+
+class WebSocketPlayer:
+    """
+    Playback backend of a session: sends each mp3 chunk to the device and blocks until
+    the device reports it played, so the conversation state follows the real speaker.
+    """
+
+    # seconds to wait for the "played" message on top of the length of the audio
+    PLAYED_TIMEOUT = 10
+    # gTTS mp3 is ~32 kbit/s
+    BYTES_PER_SECOND = 4000
+
+    def __init__(self, send):
+        self.log = logging.getLogger("bot_log")
+        self.send = send
+        self.condition = threading.Condition()
+        self.sent_chunks = 0
+        self.played_chunks = 0
+        self.stopped = False
+        self.playing = False
+
+        # Statistics
+        self.total_sent_bytes = 0
+
+    def play(self, audio):
+        if isinstance(audio, str):
+            # phrase cache hit
+            with open(audio, 'rb') as audio_file:
+                audio = audio_file.read()
+        with self.condition:
+            if self.stopped:
+                return
+            self.sent_chunks += 1
+            chunk = self.sent_chunks
+        self.playing = True
+        try:
+            self.send({"type": "audio", "chunk": chunk})
+            self.send(audio)
+            self.total_sent_bytes += len(audio)
+            with self.condition:
+                played = self.condition.wait_for(lambda: self.played_chunks >= chunk or self.stopped,
+                                                 timeout=len(audio) / self.BYTES_PER_SECOND + self.PLAYED_TIMEOUT)
+            if not played:
+                self.log.warning(f"Audio chunk {chunk} was not reported played")
+        finally:
+            self.playing = False
+
+    def played(self, chunk):
+        with self.condition:
+            self.played_chunks = max(self.played_chunks, chunk)
+            self.condition.notify_all()
+
+    def playback_state(self):
+        return self.playing, None
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        # the device drops the audio it has not played yet
+        self.send({"type": "stop"})
+
+    def reset(self):
+        with self.condition:
+            self.stopped = False
+
+    def close(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+
+class BotSession:
+    """
+    The conversation of one device: its own chat history (GPTChatService), TTS pipeline
+    and orchestrator, on top of the shared services. Messages to the device go through
+    the outbox, so the session outlives reconnects of the device.
+    """
+
+    def __init__(self, device_id, services, language="hu", sample_rate=16000, barge_in=False):
+        self.log = logging.getLogger("bot_log")
+        self.device_id = device_id
+        self.sample_rate = sample_rate
+        self.loop = asyncio.get_running_loop()
+        self.outbox = asyncio.Queue()
+        self.connection = None
+        self.sender = None
+        self.last_active = time.time()
+
+        self.player = WebSocketPlayer(self.send)
+        self.tts_service = TTSService(tts_cache=services.tts_cache, player=self.player, synth_pool=services.synth_pool)
+        self.gpt_service = GPTChatService(LANGUAGE_NAMES.get(language, "English"), openai_tools=services.openai_tools,
+                                          clients=services.openai_clients, tool_pool=services.tool_pool,
+                                          response_cache=services.response_cache)
+        self.orchestrator = ConversationOrchestrator(services.stt_backend, self.tts_service, self.gpt_service, language=language,
+                                                     stream_response=bot_config.stream_response, barge_in=barge_in, tracer=services.tracer)
+        self.orchestrator.on_state_change = self.state_changed
+        self.orchestrator.prepare_question = self.prepare_question
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self.orchestrator.run())
+        # let the orchestrator start its loop, events posted before that are dropped
+        await asyncio.sleep(0)
+
+    def send(self, message):
+        """Thread safe: queue a message (dict as JSON, bytes as audio) for the device."""
+        self.loop.call_soon_threadsafe(self.outbox.put_nowait, message)
+
+    def state_changed(self, state, text):
+        self.send({"type": "state", "state": state.value, "text": text})
+
+    def prepare_question(self, stt_text):
+        if stt_text is None or stt_text.strip() == "":
+            return None
+        self.log.info(f"[{self.device_id}] Recognized speech: {stt_text}")
+        return stt_text
+
+    def attach(self, connection):
+        """Send the outbox to a new connection of the device, replacing the previous one."""
+        old_connection = self.connection
+        if self.sender is not None:
+            self.sender.cancel()
+        # the turn was cancelled on detach, the new connection gets what was queued since, e.g. the state
+        self.connection = connection
+        self.sender = asyncio.create_task(self.send_loop(connection))
+        self.last_active = time.time()
+        return old_connection
+
+    async def detach(self, connection):
+        if self.connection is not connection:
+            # already replaced by a newer connection
+            return
+        self.connection = None
+        self.sender.cancel()
+        self.sender = None
+        self.last_active = time.time()
+        # nobody would hear the answer
+        await self.orchestrator.cancel_turn()
+        if self.orchestrator.state != BotState.IDLE:
+            self.orchestrator.set_state(BotState.LISTENING)
+
+    async def send_loop(self, connection):
+        while True:
+            message = await self.outbox.get()
+            try:
+                await connection.send(message if isinstance(message, bytes) else json.dumps(message, ensure_ascii=False))
+            except websockets.ConnectionClosed:
+                return
+
+    def handle_message(self, message):
+        self.last_active = time.time()
+        if isinstance(message, bytes):
+            # one phrase, endpointed on the device: 16 bit mono PCM at the sample rate of the hello message
+            self.orchestrator.post_event("phrase", sr.AudioData(message, self.sample_rate, 2))
+            return
+        request = json.loads(message)
+        if not isinstance(request, dict):
+            raise ValueError("JSON object expected")
+        message_type = request.get("type")
+        if message_type == "text":
+            text = request.get("text", "")
+            if not isinstance(text, str):
+                raise ValueError("text must be a string")
+            self.orchestrator.post_event("text", text)
+        elif message_type == "played":
+            self.player.played(int(request.get("chunk", 0)))
+        elif message_type in ("speech_start", "button"):
+            self.orchestrator.post_event(message_type)
+        else:
+            self.send({"type": "error", "message": f"unknown message type {message_type}"})
+
+    async def close(self):
+        self.orchestrator.stop()
+        if self.task is not None:
+            await self.task
+        if self.sender is not None:
+            self.sender.cancel()
+        self.tts_service.shutdown()
+
+    def get_stats(self):
+        return (f"{self.device_id}: {self.orchestrator.get_stats()}, {self.gpt_service.get_stats()} tokens, "
+                f"{self.player.total_sent_bytes / 1024:.0f} kB audio sent")
+
+
+class BotServer:
+    """
+    Serves many devices from one process over WebSocket. A device connects, sends
+    {"type": "hello", "device_id": ..., "token": ..., "language": "hu", "sample_rate": 16000, "barge_in": false}
+    and then its phrases (binary PCM messages) or typed questions ({"type": "text"}).
+    The server answers with state messages and the mp3 chunks of the answer, each one
+    announced by {"type": "audio", "chunk": n}, which the device acknowledges with
+    {"type": "played", "chunk": n}. {"type": "stop"} tells the device to drop the audio
+    still queued, e.g. on barge-in ({"type": "speech_start"}) or mute ({"type": "button"}).
+    Each device keeps its conversation across reconnects until it is idle for SESSION_IDLE_TIMEOUT.
+    The token of the hello message must match the token of the server if it has one.
+    """
+
+    def __init__(self, services, host=BOT_SERVER_HOST, port=BOT_SERVER_PORT, max_sessions=BOT_SERVER_MAX_SESSIONS,
+                 idle_timeout=SESSION_IDLE_TIMEOUT, token=BOT_SERVER_TOKEN):
+        self.log = logging.getLogger("bot_log")
+        self.services = services
+        self.host = host
+        self.port = port
+        self.token = token
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        # device ID -> session, least recently connected first
+        self.sessions = OrderedDict()
+
+        # Statistics
+        self.total_connections = 0
+        self.total_sessions = 0
+        self.rejected_connections = 0
+
+    async def serve(self):
+        async with websockets.serve(self.handle_connection, self.host, self.port, max_size=MAX_MESSAGE_BYTES):
+            print(f"Bot server listening on ws://{self.host}:{self.port}", flush=True)
+            self.log.info(f"Bot server listening on ws://{self.host}:{self.port}")
+            try:
+                while True:
+                    await asyncio.sleep(60)
+                    await self.drop_idle_sessions()
+            finally:
+                for session in list(self.sessions.values()):
+                    await session.close()
+
+    async def handle_connection(self, connection):
+        self.total_connections += 1
+        try:
+            hello = json.loads(await asyncio.wait_for(connection.recv(), HELLO_TIMEOUT))
+        except (asyncio.TimeoutError, ValueError, TypeError, websockets.ConnectionClosed):
+            self.rejected_connections += 1
+            return
+        device_id = hello.get("device_id") if isinstance(hello, dict) and hello.get("type") == "hello" else None
+        if not isinstance(device_id, str) or device_id == "" or not isinstance(hello.get("sample_rate", 16000), int):
+            self.rejected_connections += 1
+            await connection.send(json.dumps({"type": "error", "message": "hello with a device_id and an integer sample_rate expected"}))
+            return
+        if self.token and not hmac.compare_digest(str(hello.get("token", "")).encode("utf-8"), self.token.encode("utf-8")):
+            self.rejected_connections += 1
+            self.log.warning(f"Device {device_id} rejected: invalid token")
+            await connection.send(json.dumps({"type": "error", "message": "invalid token"}))
+            return
+
+        session = await self.get_session(device_id, hello)
+        if session is None:
+            self.rejected_connections += 1
+            await connection.send(json.dumps({"type": "error", "message": "server full"}))
+            return
+
+        old_connection = session.attach(connection)
+        if old_connection is not None:
+            self.log.info(f"Device {device_id} reconnected, closing its previous connection")
+            await old_connection.close()
+        self.log.info(f"Device {device_id} connected ({len(self.sessions)} sessions)")
+        try:
+            async for message in connection:
+                try:
+                    session.handle_message(message)
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    session.send({"type": "error", "message": f"invalid message: {e}"})
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            await session.detach(connection)
+            self.log.info(f"Device {device_id} disconnected")
+
+    async def get_session(self, device_id, hello):
+        session = self.sessions.get(device_id)
+        if session is not None:
+            self.sessions.move_to_end(device_id)
+            return session
+        if len(self.sessions) >= self.max_sessions and not await self.drop_session(self.oldest_disconnected()):
+            return None
+        session = BotSession(device_id, self.services, language=hello.get("language", "hu"),
+                             sample_rate=int(hello.get("sample_rate", 16000)), barge_in=bool(hello.get("barge_in", bot_config.barge_in)))
+        await session.start()
+        self.sessions[device_id] = session
+        self.total_sessions += 1
+        return session
+
+    def oldest_disconnected(self):
+        for device_id, session in self.sessions.items():
+            if session.connection is None:
+                return device_id
+        return None
+
+    async def drop_session(self, device_id):
+        if device_id is None:
+            return False
+        session = self.sessions.pop(device_id)
+        await session.close()
+        self.log.info(f"Session dropped: {session.get_stats()}")
+        return True
+
+    async def drop_idle_sessions(self):
+        now = time.time()
+        for device_id, session in list(self.sessions.items()):
+            if session.connection is None and now - session.last_active > self.idle_timeout:
+                await self.drop_session(device_id)
+
+    def get_stats(self):
+        return (f"{self.total_connections} connections ({self.rejected_connections} rejected), "
+                f"{self.total_sessions} sessions, {len(self.sessions)} active")
+
+
+def init_logging():
+    global log
+    log = logging.getLogger("bot_log")
+    logging.basicConfig(filename='gpt_service.log', level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the conversations of many devices (botclient.py) over WebSocket")
+    parser.add_argument("--host", default=BOT_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=BOT_SERVER_PORT)
+    parser.add_argument("--max-sessions", type=int, default=BOT_SERVER_MAX_SESSIONS)
+    args = parser.parse_args()
+
+    if not WEBSOCKETS_AVAILABLE:
+        print("⚠️  websockets not installed — pip install websockets", file=sys.stderr)
+        return 1
+
+    if not BOT_SERVER_TOKEN and not is_loopback(args.host):
+        print(f"⚠️  Set BOT_SERVER_TOKEN to serve {args.host}, anyone reaching the port could use the OpenAI account", file=sys.stderr)
+        return 1
+
+    init_logging()
+    services = SharedServices()
+    server = BotServer(services, host=args.host, port=args.port, max_sessions=args.max_sessions)
+    start_time = time.time()
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f'STATS: server duration: {time.time() - start_time} seconds')
+        print(f'STATS: sessions: {server.get_stats()}')
+        print(f'STATS: tool result cache: {services.openai_tools.get_cache_stats()}')
+        print(f'STATS: tool HTTP requests: {services.http_client.get_stats()}')
+        print(f'STATS: response cache: {services.response_cache.get_stats() if services.response_cache is not None else "disabled"}')
+        print(f'STATS: TTS cache: {services.tts_cache.get_stats() if services.tts_cache is not None else "disabled"}')
+        print(f'STATS: turn latency: {services.tracer.get_stats()}')
+        services.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
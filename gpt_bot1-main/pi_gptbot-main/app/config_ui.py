@@ -79,6 +79,10 @@ def build_config_ui():
                     ui.input(label='Max tokens').bind_value(bot_config, 'max_tokens')        
                     ui.input(label='Temperature').bind_value(bot_config, 'temperature') 
                 ui.input(label='Max conversation tokens').bind_value(bot_config, 'max_conversation_tokens')    
+                ui.switch('Summarize old conversation instead of forgetting it').bind_value(bot_config, 'summarize_history')
+                with ui.row():
+                    ui.input(label='Reuse answers to repeated questions (hours, 0 = off)').bind_value(bot_config, 'response_cache_hours')
+                    ui.input(label='Min. similarity of the questions (0 = exact match)').bind_value(bot_config, 'response_cache_similarity')
                 ui.select(prompt_preset_names, label='Prompt presets', on_change=lambda e: change_prompt_from_preset(e.value)).style('width: 400px')                                   
                 ui.textarea(label='Initial prompt').bind_value(bot_config, 'initial_prompt').style('width: 100%')
                 ui.button('Save', on_click=lambda: save_ui_config())             
@@ -107,7 +111,19 @@ def build_config_ui():
                 ui.switch('Auto mute mic. after response').bind_value(bot_config, 'auto_mute_mic') 
                 ui.switch('Change face after response').bind_value(bot_config, 'change_face')
                 ui.switch('Experimental language auto switch').bind_value(bot_config, 'exp_lang_autoswitch')                  
-                ui.input(label='Keyword').bind_value(bot_config, 'keyword')     
+                ui.switch('Stream response (speak while the AI is still answering)').bind_value(bot_config, 'stream_response')
+                ui.switch('Barge-in (interrupt the bot by speaking)').bind_value(bot_config, 'barge_in')
+                with ui.row():
+                    ui.input(label='Keyword').bind_value(bot_config, 'keyword')     
+                    ui.switch('Only listen after the keyword').bind_value(bot_config, 'wake_word_enabled')
+                    ui.input(label='Stay awake (sec.)').bind_value(bot_config, 'wake_word_timeout')
+                with ui.row():
+                    ui.select(["google", "vosk", "hybrid"], label='Speech recognition').style('width: 200px').bind_value(bot_config, 'stt_backend')
+                    ui.input(label='Hybrid min. local confidence').bind_value(bot_config, 'stt_min_confidence')
+                with ui.row():
+                    ui.select([0, 1, 2, 3], label='Voice detection aggressiveness').style('width: 200px').bind_value(bot_config, 'vad_aggressiveness')
+                    ui.input(label='End of speech silence (sec.)').bind_value(bot_config, 'vad_trailing_silence')
+                    ui.input(label='Max. phrase length (sec.)').bind_value(bot_config, 'vad_max_utterance')
 
                 ui.button('Save', on_click=lambda: save_ui_config())            
         with ui.tab_panel('system'):
@@ -0,0 +1,120 @@
+import json
+import threading
+
+
+class ConversationWindow:
+    """
+    Chat history with a running token count. Every message is counted once, when it
+    is added, and the oldest turns are dropped to keep the prompt under a token budget.
+    The initial (system) prompt is always kept, and a turn (a user message with the
+    assistant messages, tool calls and tool results that follow it) is only dropped as a whole,
+    so tool calls never lose their results.
+    """
+
+    # Per message overhead of the chat format (role, separators)
+    TOKENS_PER_MESSAGE = 4
+
+    def __init__(self, initial_messages, tokenizer_encoding, max_tokens):
+        self.tokenizer_encoding = tokenizer_encoding
+        self.max_tokens = max_tokens
+        self.initial_messages = [self.to_dict(message) for message in initial_messages]
+        # the history is also compacted from a background thread
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.messages = list(self.initial_messages)
+            self.token_counts = [self.count_tokens(message) for message in self.messages]
+            self.total_tokens = sum(self.token_counts)
+
+    def get_messages(self):
+        """Snapshot of the history to send with a request."""
+        with self.lock:
+            return list(self.messages)
+
+    def to_dict(self, message):
+        # responses of the openai client are pydantic models
+        if hasattr(message, 'model_dump'):
+            return message.model_dump(exclude_none=True)
+        return message
+
+    def count_tokens(self, message):
+        num_tokens = self.TOKENS_PER_MESSAGE
+        content = message.get('content')
+        if isinstance(content, str):
+            num_tokens += len(self.tokenizer_encoding.encode(content))
+        for tool_call in message.get('tool_calls') or []:
+            num_tokens += len(self.tokenizer_encoding.encode(tool_call['function']['name']))
+            num_tokens += len(self.tokenizer_encoding.encode(tool_call['function']['arguments']))
+        if message.get('name'):
+            num_tokens += len(self.tokenizer_encoding.encode(message['name']))
+        return num_tokens
+
+    def append(self, message):
+        message = self.to_dict(message)
+        token_count = self.count_tokens(message)
+        with self.lock:
+            self.messages.append(message)
+            self.token_counts.append(token_count)
+            self.total_tokens += token_count
+
+    def is_empty(self):
+        """True before the first question (and after a reset)."""
+        with self.lock:
+            return len(self.messages) == len(self.initial_messages)
+
+    def turn_starts(self):
+        """Indexes of the user messages that start the turns after the initial prompt."""
+        start = len(self.initial_messages)
+        return [index for index in range(start + 1, len(self.messages)) if self.messages[index]['role'] == 'user']
+
+    def first_turn_end(self):
+        """Index after the oldest turn, or None if only the current turn is left."""
+        turn_starts = self.turn_starts()
+        return turn_starts[0] if turn_starts else None
+
+    def trim(self, reserved_tokens=0):
+        """
+        Drop the oldest turns until the history plus reserved_tokens (room for the answer)
+        fits into the budget. Returns the number of dropped messages.
+        """
+        start = len(self.initial_messages)
+        dropped = 0
+        with self.lock:
+            while self.total_tokens + reserved_tokens > self.max_tokens:
+                end = self.first_turn_end()
+                if end is None:
+                    break
+                self.total_tokens -= sum(self.token_counts[start:end])
+                dropped += end - start
+                del self.messages[start:end]
+                del self.token_counts[start:end]
+        return dropped
+
+    def oldest_turns(self, keep_turns=2):
+        """The messages of all but the newest keep_turns turns (empty if there are not enough turns)."""
+        start = len(self.initial_messages)
+        with self.lock:
+            turn_starts = self.turn_starts()
+            if len(turn_starts) < keep_turns:
+                return []
+            return self.messages[start:turn_starts[-keep_turns]]
+
+    def replace_with_summary(self, summarized_messages, summary_message):
+        """
+        Replace the summarized messages with one summary message right after the initial prompt.
+        Messages that were trimmed in the meantime are simply not there anymore.
+        """
+        summarized_ids = set(id(message) for message in summarized_messages)
+        start = len(self.initial_messages)
+        with self.lock:
+            kept = [(message, token_count) for message, token_count in zip(self.messages[start:], self.token_counts[start:])
+                    if id(message) not in summarized_ids]
+            summary_tokens = self.count_tokens(summary_message)
+            self.messages[start:] = [summary_message] + [message for message, _ in kept]
+            self.token_counts[start:] = [summary_tokens] + [token_count for _, token_count in kept]
+            self.total_tokens = sum(self.token_counts)
+
+    def payload_size(self):
+        return len(json.dumps(self.get_messages(), ensure_ascii=False))
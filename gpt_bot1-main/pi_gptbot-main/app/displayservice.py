@@ -0,0 +1,116 @@
+import time
+import logging
+import threading
+
+
+class DisplayService:
+    """
+    Runs the LCD rendering on its own thread, so the conversation loop only posts
+    state changes. Only the latest posted state is drawn ("latest state wins"),
+    and a state equal to the one already on the screen is not redrawn.
+    A face posted with animate=True gets its icon turned as a spinner until the next state.
+    """
+
+    # Seconds between two spinner frames
+    SPINNER_INTERVAL = 0.15
+
+    def __init__(self, lcd):
+        self.log = logging.getLogger("bot_log")
+        self.lcd = lcd
+        self.condition = threading.Condition()
+        self.pending_state = None
+        self.current_state = None
+        self.rendering = False
+        self.stopped = False
+
+        # Statistics
+        self.total_frames = 0
+        self.skipped_frames = 0
+        self.total_render_duration = 0
+
+        self.thread = threading.Thread(target=self.render_loop, name="display", daemon=True)
+        self.thread.start()
+
+    def post(self, method_name, *args, animate=False, **kwargs):
+        state = (method_name, args, tuple(sorted(kwargs.items())), animate)
+        with self.condition:
+            if self.pending_state is not None:
+                # the previous state was never shown, the new one replaces it
+                self.skipped_frames += 1
+            self.pending_state = state
+            self.condition.notify()
+
+    def draw_face(self, *args, **kwargs):
+        self.post('draw_face', *args, **kwargs)
+
+    def draw_large_icon(self, *args, **kwargs):
+        self.post('draw_large_icon', *args, **kwargs)
+
+    def clear_screen(self):
+        self.post('clear_screen')
+
+    def render_loop(self):
+        spinner_step = 0
+        while True:
+            with self.condition:
+                animation_tick = False
+                while self.pending_state is None and not self.stopped:
+                    if self.current_state is not None and self.current_state[3]:
+                        if not self.condition.wait(self.SPINNER_INTERVAL):
+                            animation_tick = True
+                            break
+                    else:
+                        self.condition.wait()
+                if animation_tick:
+                    state = self.current_state
+                    spinner_step = (spinner_step + 1) % getattr(self.lcd, 'SPINNER_STEPS', 8)
+                else:
+                    if self.pending_state is None:
+                        return
+                    state = self.pending_state
+                    self.pending_state = None
+                    if state == self.current_state:
+                        self.skipped_frames += 1
+                        continue
+                    spinner_step = 0
+                self.rendering = True
+
+            method_name, args, kwargs, animate = state
+            kwargs = dict(kwargs)
+            if animate:
+                kwargs['spinner_step'] = spinner_step
+            start = time.time()
+            try:
+                getattr(self.lcd, method_name)(*args, **kwargs)
+            except Exception as e:
+                self.log.error(f"Display error in {method_name}: {e}")
+            render_duration = time.time() - start
+
+            with self.condition:
+                self.current_state = state
+                self.rendering = False
+                self.total_frames += 1
+                self.total_render_duration += render_duration
+                self.condition.notify_all()
+            if not animation_tick:
+                self.log.debug(f"Display {method_name} rendered in {render_duration * 1000:.0f} ms")
+
+    def wait_idle(self, timeout=2):
+        """Block until every posted state is on the screen."""
+        deadline = time.time() + timeout
+        with self.condition:
+            while (self.pending_state is not None or self.rendering) and time.time() < deadline:
+                self.condition.wait(deadline - time.time())
+
+    def stop(self):
+        self.wait_idle()
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join(timeout=2)
+
+    def get_stats(self):
+        if self.total_frames == 0:
+            return "no frames rendered"
+        return (f"{self.total_frames} frames, avg render {self.total_render_duration / self.total_frames * 1000:.0f} ms, "
+                f"{self.skipped_frames} redraws skipped")
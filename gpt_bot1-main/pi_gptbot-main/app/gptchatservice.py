@@ -1,12 +1,15 @@
 import os
 import openai
-from openai import RateLimitError
 import logging
-import backoff
 import time
 import re
 import tiktoken
 import json
+import asyncio
+import contextlib
+import contextvars
+import threading
+import concurrent.futures
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -15,6 +18,51 @@ from botconfig import BotConfig
 bot_config = BotConfig()
 
 from tools import AITools
+from textsplitter import split_sentences, split_text
+from conversationwindow import ConversationWindow
+from turntrace import trace_span, trace_mark
+
+# Seconds to wait for a tool result, the camera tool also waits for the vision model
+DEFAULT_TOOL_TIMEOUT = 10
+TOOL_TIMEOUTS = {"get_whats_visible_on_camera": 30}
+
+# Share of max_conversation_tokens after which the oldest turns are summarized
+SUMMARIZE_THRESHOLD = 0.6
+
+# Tries of a streamed request on a rate limit or connection error, and the first delay in seconds (doubled after each try)
+OPENAI_MAX_TRIES = 2
+OPENAI_RETRY_DELAY = 1
+
+
+def create_openai_clients():
+    """
+    (client, async_client) for the configured API (OPENAI_API_TYPE). Each client keeps
+    its own HTTP connection pool, so conversations sharing them share the connections.
+    """
+    if os.getenv('OPENAI_API_TYPE') == 'azure':
+        client = openai.AzureOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            azure_endpoint = os.getenv('AZURE_OPENAI_ENDPOINT'),
+            api_version = os.getenv('AZURE_OPENAI_VERSION'),                          
+        )                    
+        # streamed responses run on the conversation event loop
+        async_client = openai.AsyncAzureOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            azure_endpoint = os.getenv('AZURE_OPENAI_ENDPOINT'),
+            api_version = os.getenv('AZURE_OPENAI_VERSION'),
+            # retried by create_stream(), which keeps the wait bounded
+            max_retries=0,
+        )
+    else:
+        client = openai.OpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+        )           
+        async_client = openai.AsyncOpenAI(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            # retried by create_stream(), which keeps the wait bounded
+            max_retries=0,
+        )
+    return client, async_client
 
 
 class GPTChatService:
@@ -24,63 +72,99 @@ class GPTChatService:
         logging.basicConfig(filename='gpt_service.log', level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
     
-    def __init__(self, default_language="German"):
+    def __init__(self, default_language="German", openai_tools=None, clients=None, tool_pool=None, response_cache=None):
+        """
+        openai_tools, clients ((client, async_client) of create_openai_clients()) and tool_pool
+        can be shared by several conversations (botserver.py); each gets its own otherwise.
+        With a response_cache, repeated questions are answered without a model call.
+        """
 
         self.init_logging()
 
         self.default_language = default_language        
 
-        self.openai_tools = AITools(default_language=default_language)
+        self.openai_tools = openai_tools if openai_tools is not None else AITools(default_language=default_language)
 
         default_lang_prompt = f" Respond in {self.default_language} by default."
         
         self.initial_prompt = [{"role": "user", "content":bot_config.initial_prompt + default_lang_prompt }]
 
-        self.chat_messages = self.initial_prompt
-                
-        self.log.info(f"Initial ChatGPT prompt:  {self.chat_messages}")
+        self.log.info(f"Initial ChatGPT prompt:  {self.initial_prompt}")
 
         self.tokenizer_encoding = tiktoken.get_encoding("cl100k_base")
 
+        self.conversation = ConversationWindow(self.initial_prompt, self.tokenizer_encoding, bot_config.max_conversation_tokens)
+
         self.tools_list = self.openai_tools.get_tools_list()
+        self.tool_pool = tool_pool if tool_pool is not None else concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="ai_tool")
 
         self.api_type = os.getenv('OPENAI_API_TYPE')
-        if self.api_type == 'azure':
-            self.client = openai.AzureOpenAI(
-                api_key=os.environ.get("OPENAI_API_KEY"),
-                azure_endpoint = os.getenv('AZURE_OPENAI_ENDPOINT'),
-                api_version = os.getenv('AZURE_OPENAI_VERSION'),                          
-            )                    
-        else:
-            self.client = openai.OpenAI(
-                api_key=os.environ.get("OPENAI_API_KEY"),
-            )           
+        self.client, self.async_client = clients if clients is not None else create_openai_clients()
+
+        self.response_cache = response_cache
+        self.summary_thread = None
 
         # Statistics
         self.total_ai_tokens = 0        
         
-    @backoff.on_exception(backoff.expo, RateLimitError, max_time=10, max_tries=2)    
-    def ask(self, question):
-    
-        self.append_text_to_chat_log(question, True)
-                   
-        start = time.time()
+    async def ask_stream(self, question, min_sentence_length=20):
+        """
+        Ask the model, streaming the completion with the async client, and yield the
+        response sentence by sentence. Cancelling the consuming task stops the stream;
+        the part of the response generated so far is kept in the history.
+        """
+
+        cache_question = self.is_cacheable_question(question)
+        if cache_question:
+            with trace_span("response_cache") as span:
+                cached_response = self.get_cached_response(question)
+                span["hit"] = cached_response is not None
+            if cached_response is not None:
+                self.append_cached_response(question, cached_response)
+                for sentence in split_text(cached_response, min_sentence_length):
+                    yield self.adjust_response(sentence)
+                return
+
+        with trace_span("prompt"):
+            self.append_text_to_chat_log(question, True)
+            prompt_tokens = self.check_token_count()
+
+        model = self.get_model()
+        response_text, buffer = '', ''
+        tool_calls = []
 
         try:
-            
-            if self.api_type == 'azure':
-                model = os.getenv('AZURE_OPENAI_DEPLOYMENT')
-            else:
-                model = bot_config.gpt_model
-
-            response = self.client.chat.completions.create( 
-                model=model,            
-                messages=self.chat_messages ,
-                max_tokens=bot_config.max_tokens,
-                temperature=bot_config.temperature,
-                tools=self.tools_list
-            )                
-
+            # aclosing: a cancelled turn closes the HTTP stream right away, not when garbage collected
+            async with contextlib.aclosing(self.stream_completion(model, tools=self.tools_list, tool_calls=tool_calls)) as completion:
+                async for delta in completion:
+                    response_text += delta
+                    buffer += delta
+                    sentences, buffer = split_sentences(buffer, min_sentence_length)
+                    for sentence in sentences:
+                        yield self.adjust_response(sentence)
+
+            if tool_calls:
+                # the tools are blocking calls with their own timeouts, keep them off the event loop
+                tool_messages = await asyncio.to_thread(self.run_tool_calls, tool_calls)
+                # the tool calls and all of their results go to the history together, a turn
+                # cancelled while the tools run leaves no tool calls without results behind
+                self.conversation.append({"role": "assistant", "content": response_text or None, "tool_calls": tool_calls})
+                for tool_message in tool_messages:
+                    self.conversation.append(tool_message)
+                # one follow-up completion for all tool results
+                response_text, buffer = '', ''
+                async with contextlib.aclosing(self.stream_completion(model)) as completion:
+                    async for delta in completion:
+                        response_text += delta
+                        buffer += delta
+                        sentences, buffer = split_sentences(buffer, min_sentence_length)
+                        for sentence in sentences:
+                            yield self.adjust_response(sentence)
+
+        except (asyncio.CancelledError, GeneratorExit):
+            # the turn was cancelled (mute, barge-in) or the consumer stopped listening
+            self.finish_response(prompt_tokens, response_text, interrupted=True)
+            raise
         except Exception as e:
             print(f"OpenAI API returned an Error", flush=True)
             self.log.error(f"OpenAI API returned an Error")
@@ -88,73 +172,218 @@ class GPTChatService:
                 print(e.message, flush=True)
                 self.log.error(e.message)
             else:
-                print(e, flush=True)                         
-            return ""    
-        
-        # print(f'OpenAI API call ended: {time.time() - start} ms')
+                print(e, flush=True)
+            return
+
+        if buffer.strip() != '':
+            yield self.adjust_response(buffer.strip())
+
+        self.finish_response(prompt_tokens, response_text)
+        if cache_question and not tool_calls:
+            # answers using tools (weather, news...) are only valid for a while, they are not cached
+            self.put_cached_response(question, response_text)
+
+    async def ask_complete(self, question):
+        """The whole response of ask_stream() at once, for speaking it only when it is complete."""
+        return " ".join([sentence async for sentence in self.ask_stream(question)])
+
+    def finish_response(self, prompt_tokens, response_text, interrupted=False):
+        if interrupted:
+            self.log.info(f"ChatGPT response interrupted after {len(response_text)} characters")
+            if response_text == '':
+                return
+        self.conversation.append({"role": "assistant", "content": response_text})
+        self.update_stats(prompt_tokens, response_text)
+        self.compact_history()
 
-        response_message = response.choices[0].message
-        self.chat_messages.append(response_message)
+        self.log.info(f"ChatGPT response:  {response_text}")
 
+    def is_cacheable_question(self, question):
+        if self.response_cache is None:
+            return False
+        return self.response_cache.is_cacheable(question, first_turn=self.conversation.is_empty(), language=self.default_language)
 
-        tool_calls = response_message.tool_calls
-        response_text = ''
+    def get_cached_response(self, question):
+        return self.response_cache.get(self.initial_prompt[0]["content"], self.default_language, question)
 
-        if tool_calls:
-            for tool_call in tool_calls:
-                function_args = json.loads(tool_call.function.arguments) 
-                function_call_response = self.openai_tools.call_tool(tool_call.function.name, function_args)           
+    def put_cached_response(self, question, response_text):
+        self.response_cache.put(self.initial_prompt[0]["content"], self.default_language, question, response_text)
 
-                self.chat_messages.append(
-                    {
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "name": tool_call.function.name,
-                        "content": function_call_response,
-                    }
-                ) 
-                function_response = self.client.chat.completions.create(
+    def append_cached_response(self, question, response_text):
+        """The cached answer goes to the history like a real one, so the follow-up questions have the context."""
+        self.append_text_to_chat_log(question, True)
+        self.append_text_to_chat_log(response_text, False)
+        self.check_token_count()
+        self.log.info(f"ChatGPT response (cached):  {response_text}")
+
+    def run_tool_calls(self, tool_calls):
+        """
+        Run all tool calls of an assistant turn in parallel on the tool pool.
+        Returns the tool result messages in the order of tool_calls; a tool that does not
+        finish within its timeout gets an error result and is left running in the background.
+        """
+        start = time.time()
+        # copy_context: the tool spans go to the trace of the current turn
+        futures = [self.tool_pool.submit(contextvars.copy_context().run, self.call_tool, tool_call) for tool_call in tool_calls]
+
+        tool_messages = []
+        for tool_call, future in zip(tool_calls, futures):
+            tool_name = tool_call["function"]["name"]
+            timeout = TOOL_TIMEOUTS.get(tool_name, DEFAULT_TOOL_TIMEOUT)
+            try:
+                # all tools started at the same time, so each gets its timeout measured from the start
+                function_call_response = future.result(timeout=max(0, start + timeout - time.time()))
+            except concurrent.futures.TimeoutError:
+                self.log.warning(f"Tool {tool_name} timed out after {timeout}s")
+                function_call_response = f"Error: {tool_name} did not respond in time"
+            except Exception as e:
+                self.log.error(f"Tool {tool_name} failed: {e}")
+                function_call_response = f"Error: {tool_name} failed"
+            tool_messages.append(
+                {
+                    "tool_call_id": tool_call["id"],
+                    "role": "tool",
+                    "name": tool_name,
+                    "content": function_call_response,
+                }
+            )
+
+        self.log.info(f"{len(tool_calls)} tool calls finished in {time.time() - start:.2f}s")
+        return tool_messages
+
+    def call_tool(self, tool_call):
+        function_args = json.loads(tool_call["function"]["arguments"] or "{}")
+        with trace_span(f"tool.{tool_call['function']['name']}"):
+            return self.openai_tools.call_tool(tool_call["function"]["name"], function_args)
+
+    async def stream_completion(self, model, tools=None, tool_calls=None):
+        """
+        Async generator yielding the content deltas of a streamed chat completion.
+        Tool call deltas are assembled on the side into the tool_calls list (as message dicts).
+        """
+        params = {}
+        if tools:
+            params["tools"] = tools
+
+        with trace_span("llm", with_tools=bool(tools)) as span:
+            request_start = time.time()
+            stream = await self.create_stream(model, params)
+
+            tool_call_parts = {}
+            try:
+                async for chunk in stream:
+                    # Azure sends a first chunk with prompt filter results only
+                    if not chunk.choices:
+                        continue
+                    if "first_token" not in span:
+                        span["first_token"] = round(time.time() - request_start, 4)
+                        trace_mark("llm_first_token")
+                    delta = chunk.choices[0].delta
+                    if delta.tool_calls:
+                        for tool_call_delta in delta.tool_calls:
+                            tool_call = tool_call_parts.setdefault(tool_call_delta.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                            if tool_call_delta.id:
+                                tool_call["id"] = tool_call_delta.id
+                            if tool_call_delta.function:
+                                tool_call["function"]["name"] += tool_call_delta.function.name or ""
+                                tool_call["function"]["arguments"] += tool_call_delta.function.arguments or ""
+                    if delta.content:
+                        yield delta.content
+            finally:
+                # closing the HTTP response stops the generation on the server side too
+                await stream.close()
+            span["tool_calls"] = len(tool_call_parts)
+
+        if tool_calls is not None:
+            tool_calls.extend(tool_call_parts[index] for index in sorted(tool_call_parts))
+
+    async def create_stream(self, model, params):
+        """
+        Start a streamed chat completion. Rate limit and connection errors are retried
+        OPENAI_MAX_TRIES times with a growing delay; nothing has been yielded yet at this point.
+        """
+        for attempt in range(1, OPENAI_MAX_TRIES + 1):
+            try:
+                return await self.async_client.chat.completions.create(
                     model=model,
-                    messages=self.chat_messages,
-                )   
-                
-                response_function_message = function_response.choices[0].message
-
-                self.chat_messages.append(response_function_message)
-                response_text = response_function_message.content
-
-        else:      
-            response_text = response_message.content
-            
-        response_text.isalnum();
-        #self.update_stats(self.chat_messages, response_text)
-        self.check_token_count(self.chat_messages, self.total_ai_tokens)
-        response_text = self.adjust_response(response_text)
-        
-        self.log.info(f"ChatGPT response:  {response_text}")
+                    messages=self.conversation.get_messages(),
+                    max_tokens=bot_config.max_tokens,
+                    temperature=bot_config.temperature,
+                    stream=True,
+                    **params
+                )
+            except (openai.RateLimitError, openai.APIConnectionError) as e:
+                if attempt == OPENAI_MAX_TRIES:
+                    raise
+                delay = OPENAI_RETRY_DELAY * 2 ** (attempt - 1)
+                self.log.warning(f"OpenAI API {e.__class__.__name__}, retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    def get_model(self):
+        if self.api_type == 'azure':
+            return os.getenv('AZURE_OPENAI_DEPLOYMENT')
+        return bot_config.gpt_model
+
+    def check_token_count(self):
+        """
+        Drop the oldest turns so that the history and the answer (max_tokens) fit into
+        max_conversation_tokens. Returns the token count of the prompt to be sent.
+        """
+        dropped = self.conversation.trim(reserved_tokens=bot_config.max_tokens)
+        if dropped > 0:
+            print(f'Chat buffer trimmed, dropped {dropped} old messages to stay under {bot_config.max_conversation_tokens} tokens')
+            self.log.info(f"Chat buffer trimmed, dropped {dropped} old messages to stay under {bot_config.max_conversation_tokens} tokens")
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug(f"Prompt size: {self.conversation.total_tokens} tokens, {self.conversation.payload_size()} bytes")
+        return self.conversation.total_tokens
+
+    def compact_history(self):
+        """
+        When summarize_history is enabled and the history passes the threshold, summarize the oldest
+        turns on a background thread, so the next ask_stream() is not blocked by the summary request.
+        """
+        if not bot_config.summarize_history:
+            return
+        if self.summary_thread is not None and self.summary_thread.is_alive():
+            return
+        if self.conversation.total_tokens < bot_config.max_conversation_tokens * SUMMARIZE_THRESHOLD:
+            return
+        old_messages = self.conversation.oldest_turns(keep_turns=2)
+        if not old_messages:
+            return
+        self.summary_thread = threading.Thread(target=self.summarize_messages, args=(old_messages,), daemon=True)
+        self.summary_thread.start()
+
+    def summarize_messages(self, old_messages):
+        transcript = ''
+        for message in old_messages:
+            if message.get('content'):
+                transcript += f"{message['role']}: {message['content']}\n"
 
-        return response_text    
+        start = time.time()
+        try:
+            response = self.client.chat.completions.create(
+                model=self.get_model(),
+                messages=[{"role": "user", "content":
+                    f"Summarize the following conversation in {self.default_language}, in at most 120 words. "
+                    f"Keep names, facts about the user and anything promised or agreed on.\n\n{transcript}"}],
+                max_tokens=250,
+                temperature=0,
+            )
+        except Exception as e:
+            self.log.error(f"Chat history summary failed: {e}")
+            return
 
-    def check_token_count(self, chat_messages, total_ai_tokens):
-        if total_ai_tokens > bot_config.max_conversation_tokens:
-            self.chat_messages = self.initial_prompt
-            self.total_ai_tokens = 0
-            print(f'Chat buffer cleared, token count reached: {bot_config.max_conversation_tokens}')
-            self.log.info(f"Chat buffer cleared, token count reached: {bot_config.max_conversation_tokens}")
+        summary = response.choices[0].message.content
+        tokens_before = self.conversation.total_tokens
+        self.conversation.replace_with_summary(old_messages, {"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+        self.log.info(f"Chat history summarized in {time.time() - start:.2f}s: {len(old_messages)} messages, {tokens_before} -> {self.conversation.total_tokens} tokens")
 
     def change_language(self, language):
         self.default_language = language            
     
-    def update_stats(self, chat_messages, response):
-
-        start = time.time()
-        
-        self.total_ai_tokens += self.num_tokens_from_string(response)
-        for msg in chat_messages:
-            self.total_ai_tokens += self.num_tokens_from_string(msg['content'])
-        print(f'Current token count: {self.total_ai_tokens}')
-
-        #print(f'Token count ended: {time.time() - start} ms')
+    def update_stats(self, prompt_tokens, response):
+        self.total_ai_tokens += prompt_tokens + self.num_tokens_from_string(response or '')
 
     def get_stats(self):
         return self.total_ai_tokens
@@ -163,7 +392,7 @@ class GPTChatService:
         role = "assistant"
         if (is_user):
             role = "user"
-        self.chat_messages.append({"role": role, "content": text })
+        self.conversation.append({"role": role, "content": text })
         
     def adjust_response(self, response_text):
         adjusted_response_text = response_text
@@ -0,0 +1,384 @@
+import os
+import sys
+import time
+import wave
+import shutil
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+from audioutils import to_16bit, to_mono, resample
+
+load_dotenv()
+
+# pi: the real devices, sim: in-process simulated ones, auto: the real device where its driver is available
+BOT_HARDWARE = os.getenv("BOT_HARDWARE", 'auto').lower()
+HEADLESS = os.getenv("HEADLESS", 'True').lower() in ('true', '1', 't')
+# WAV files the simulated microphone plays in a loop, one every SIM_MIC_INTERVAL seconds
+SIM_MIC_WAV_DIR = os.getenv("SIM_MIC_WAV_DIR")
+SIM_MIC_INTERVAL = float(os.getenv("SIM_MIC_INTERVAL", 10))
+
+BUTTON_PIN = 15
+
+
+class DisplayIcons:
+    """Icons (Font Awesome code points) and faces every display backend understands."""
+
+    ICON_TALK = "\uf599"
+    ICON_SAD_FACE = "\uf119"
+    ICON_WIFI = "\uf1eb"
+    ICON_MIC = "\uf2a2"
+    ICON_MIC_OFF = "\uf2a4"
+    ICON_SPEAKER = "\uf028"
+    ICON_ERROR = "\uf071"
+    ICON_LOAD = "\uf110"
+
+    FACE_TALK = "bunny_talk.png"
+    FACE_THINK = "bunny_think.png"
+    FACE_LISTEN = "bunny_listen.png"
+    FACE_SILENT = "bunny_silent.png"
+
+
+# ====== GPIO button ======
+
+class PiButton:
+    """The mute button on a GPIO pin of the Raspberry Pi."""
+
+    def __init__(self, pin=BUTTON_PIN):
+        import RPi.GPIO as GPIO
+        self.GPIO = GPIO
+        self.pin = pin
+
+    def start(self, callback):
+        self.GPIO.setmode(self.GPIO.BCM)
+        self.GPIO.setup(self.pin, self.GPIO.IN, pull_up_down=self.GPIO.PUD_DOWN)
+        self.GPIO.add_event_detect(self.pin, self.GPIO.RISING, callback=callback, bouncetime=500)
+
+    def cleanup(self):
+        self.GPIO.cleanup()
+
+
+class SimulatedButton:
+    """Button without hardware, press() triggers it like a rising edge on the pin."""
+
+    def __init__(self, pin=BUTTON_PIN):
+        self.pin = pin
+        self.callback = None
+
+    def start(self, callback):
+        self.callback = callback
+
+    def press(self):
+        if self.callback is not None:
+            self.callback(self.pin)
+
+    def cleanup(self):
+        self.callback = None
+
+
+# ====== Mixer ======
+
+class AlsaMixer:
+    """Microphone capture switch and speaker volume on the ALSA mixer."""
+
+    OUTPUT_DEVICE_INDEX = 1
+
+    def __init__(self):
+        import alsaaudio
+        self.alsaaudio = alsaaudio
+
+    def get_mic_mixer(self, device_index, device_name):
+        try:
+            if (device_name != ""):
+                return self.alsaaudio.Mixer(control='Mic', device=device_name)
+            return self.alsaaudio.Mixer(control='Mic', cardindex=device_index)
+        except self.alsaaudio.ALSAAudioError:
+            print("No such mixer", file=sys.stderr)
+            return None
+
+    def mute_mic(self, device_index=0, device_name=""):
+        mixer = self.get_mic_mixer(device_index, device_name)
+        if mixer is not None:
+            mixer.setrec(0)
+
+    def unmute_mic(self, device_index=0, device_name=""):
+        mixer = self.get_mic_mixer(device_index, device_name)
+        if mixer is not None:
+            mixer.setrec(1)
+
+    def get_speaker_mixer(self):
+        try:
+            # Use 'Master' since your Pi supports it
+            mixer = self.alsaaudio.Mixer(control='Master', cardindex=self.OUTPUT_DEVICE_INDEX)
+            print("✅ Using 'Master' mixer for audio output")
+            return mixer
+        except self.alsaaudio.ALSAAudioError:
+            print("⚠ No such mixer found. Audio may not work.", file=sys.stderr)
+            return None
+
+    def get_speaker_volume(self):
+        mixer = self.get_speaker_mixer()
+        if mixer is None:
+            print("⚠ No mixer found, using default volume 70")
+            return [70]
+        try:
+            return mixer.getvolume()
+        except Exception as e:
+            print(f"⚠ Mixer error: {e}, using default volume 70")
+            return [70]
+
+    def set_speaker_volume(self, volume):
+        mixer = self.get_speaker_mixer()
+        if mixer:
+            mixer.setvolume(volume)
+        else:
+            print("⚠ Cannot set volume, mixer not found")
+
+    def store(self):
+        os.system("alsactl store")
+
+
+class SimulatedMixer:
+    """Mixer state kept in memory."""
+
+    def __init__(self, volume=70):
+        self.volume = volume
+        self.mic_muted = False
+
+    def mute_mic(self, device_index=0, device_name=""):
+        self.mic_muted = True
+
+    def unmute_mic(self, device_index=0, device_name=""):
+        self.mic_muted = False
+
+    def get_speaker_volume(self):
+        return [self.volume]
+
+    def set_speaker_volume(self, volume):
+        self.volume = volume
+
+    def store(self):
+        pass
+
+
+# ====== Display ======
+
+class SimulatedDisplay(DisplayIcons):
+    """Display without a screen: remembers the last drawn state, e.g. for tests."""
+
+    SPINNER_STEPS = 8
+
+    def __init__(self):
+        self.log = logging.getLogger("bot_log")
+        self.last_state = None
+
+    def draw_face(self, face, icon=None, additional_text=None, top_small_text=None, spinner_step=None):
+        self.last_state = ('draw_face', face, icon, additional_text, top_small_text)
+        self.log.debug(f"Display: {face} {additional_text or ''}")
+
+    def draw_large_icon(self, icon, additional_text=None):
+        self.last_state = ('draw_large_icon', icon, additional_text)
+        self.log.debug(f"Display: large icon {additional_text or ''}")
+
+    def clear_screen(self):
+        self.last_state = None
+
+
+# ====== Microphone ======
+
+class SimulatedMicrophone:
+    """
+    Microphone stand-in for SpeechListener: silence, plus the audio given to play()
+    or looped from replay_dir, delivered in real time like a real microphone.
+    """
+
+    SAMPLE_WIDTH = 2
+    CHUNK = 1024
+
+    def __init__(self, sample_rate=16000, replay_dir=None, replay_interval=SIM_MIC_INTERVAL, realtime=True):
+        self.log = logging.getLogger("bot_log")
+        self.SAMPLE_RATE = sample_rate
+        self.realtime = realtime
+        self.stream = None
+        self.pending = b""
+        self.lock = threading.Lock()
+        self.closed = False
+        self.next_read_time = None
+        self.replay = self.load_replay(replay_dir) if replay_dir else []
+        self.replay_interval = replay_interval
+        self.replay_index = 0
+        self.next_replay_time = None
+
+    def load_replay(self, replay_dir):
+        replay = []
+        for path in sorted(Path(replay_dir).glob("*.wav")):
+            try:
+                replay.append(self.read_wav(path))
+            except (wave.Error, OSError) as e:
+                self.log.warning(f"Simulated microphone can not read {path}: {e}")
+        self.log.info(f"Simulated microphone replays {len(replay)} WAV files from {replay_dir}")
+        return replay
+
+    def read_wav(self, path):
+        """16 bit mono PCM at the sample rate of the microphone."""
+        with wave.open(str(path), "rb") as wav_file:
+            sample_rate, sample_width, channels = wav_file.getframerate(), wav_file.getsampwidth(), wav_file.getnchannels()
+            pcm = wav_file.readframes(wav_file.getnframes())
+        pcm = to_16bit(pcm, sample_width)
+        if channels == 2:
+            pcm = to_mono(pcm)
+        pcm, _ = resample(pcm, sample_rate, self.SAMPLE_RATE)
+        return pcm
+
+    def __enter__(self):
+        self.stream = self
+        self.closed = False
+        self.next_read_time = time.time()
+        self.next_replay_time = time.time() + self.replay_interval
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+
+    def play(self, pcm):
+        """Queue 16 bit mono PCM at SAMPLE_RATE, as if someone said it into the microphone."""
+        with self.lock:
+            self.pending += pcm
+
+    def close(self):
+        self.closed = True
+
+    def read(self, frame_count):
+        if self.closed:
+            return b""
+        if self.replay and time.time() >= self.next_replay_time:
+            self.play(self.replay[self.replay_index % len(self.replay)])
+            self.replay_index += 1
+            self.next_replay_time = time.time() + self.replay_interval
+        byte_count = frame_count * self.SAMPLE_WIDTH
+        with self.lock:
+            data, self.pending = self.pending[:byte_count], self.pending[byte_count:]
+        data += b"\x00" * (byte_count - len(data))
+        if self.realtime:
+            # a microphone delivers the chunk only when it has been spoken
+            self.next_read_time += frame_count / self.SAMPLE_RATE
+            delay = self.next_read_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.next_read_time = time.time()
+        return data
+
+
+# ====== Speaker ======
+
+class SimulatedPlayer:
+    """Playback stand-in: waits as long as the mp3 would play (gTTS mp3 is ~32 kbit/s)."""
+
+    BYTES_PER_SECOND = 4000
+
+    def __init__(self):
+        self.stop_event = threading.Event()
+        self.playing = False
+
+        # Statistics
+        self.total_played_bytes = 0
+
+    def play(self, audio):
+        audio_size = os.path.getsize(audio) if isinstance(audio, str) else len(audio)
+        self.total_played_bytes += audio_size
+        self.playing = True
+        try:
+            self.stop_event.wait(audio_size / self.BYTES_PER_SECOND)
+        finally:
+            self.playing = False
+
+    def playback_state(self):
+        return self.playing, None
+
+    def stop(self):
+        self.stop_event.set()
+
+    def reset(self):
+        self.stop_event.clear()
+
+    def close(self):
+        self.stop()
+
+
+# ====== Backend selection ======
+
+def module_available(name):
+    try:
+        __import__(name)
+        return True
+    except (ImportError, RuntimeError):
+        # RPi.GPIO raises RuntimeError when it is not running on a Pi
+        return False
+
+
+def use_real(kind, available):
+    if kind == 'pi':
+        return True
+    if kind == 'sim':
+        return False
+    return available
+
+
+def create_button(kind=BOT_HARDWARE):
+    return PiButton() if use_real(kind, module_available('RPi.GPIO')) else SimulatedButton()
+
+
+def create_mixer(kind=BOT_HARDWARE):
+    return AlsaMixer() if use_real(kind, module_available('alsaaudio')) else SimulatedMixer()
+
+
+def create_display(kind=BOT_HARDWARE, headless=HEADLESS):
+    if not headless and use_real(kind, module_available('luma.lcd') and module_available('RPi.GPIO')):
+        from lcdservice import LCDServiceColor
+        return LCDServiceColor()
+    return SimulatedDisplay()
+
+
+def create_microphone(kind=BOT_HARDWARE):
+    if use_real(kind, module_available('pyaudio')):
+        import speech_recognition as sr
+        try:
+            return sr.Microphone()
+        except Exception as e:
+            if kind == 'pi':
+                raise
+            logging.getLogger("bot_log").warning(f"No microphone ({e}), using the simulated one")
+    return SimulatedMicrophone(replay_dir=SIM_MIC_WAV_DIR)
+
+
+def create_speaker(output_device_name="default", kind=BOT_HARDWARE):
+    from audioplayer import create_player, ALSA_PLAYBACK_AVAILABLE
+    if use_real(kind, ALSA_PLAYBACK_AVAILABLE or shutil.which('mpg123') is not None):
+        return create_player(output_device_name)
+    return SimulatedPlayer()
+
+
+class Hardware:
+    """
+    The devices of one bot: button, mixer and display are created once, microphone and
+    speaker by create_microphone() / create_speaker() when they are (re)opened.
+    Every device is the real one or an in-process simulation, see BOT_HARDWARE.
+    """
+
+    def __init__(self, kind=BOT_HARDWARE, headless=HEADLESS):
+        self.kind = kind
+        self.button = create_button(kind)
+        self.mixer = create_mixer(kind)
+        self.display = create_display(kind, headless)
+        logging.getLogger("bot_log").info(f"Hardware ({kind}): {self.describe()}")
+
+    def create_microphone(self):
+        return create_microphone(self.kind)
+
+    def create_speaker(self, output_device_name="default"):
+        return create_speaker(output_device_name, self.kind)
+
+    def describe(self):
+        return ", ".join(type(device).__name__ for device in (self.button, self.mixer, self.display))
@@ -0,0 +1,88 @@
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HTTPClient:
+    """
+    Shared HTTP client for the outbound tool requests: one requests.Session with
+    keep-alive connection pools per host, connect/read timeouts, bounded retries
+    with exponential backoff, and latency metrics per endpoint.
+    The timeouts and retries are small enough that a request, retries included, gives up
+    before the tool timeout of GPTChatService (10 s), see max_duration().
+    """
+
+    # (connect, read) timeout in seconds
+    DEFAULT_TIMEOUT = (2, 2.5)
+    DEFAULT_RETRIES = 1
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff_factor=0.3, pool_maxsize=4):
+        self.log = logging.getLogger("bot_log")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET"],
+            raise_on_status=False,
+            # a Retry-After of a rate limited API could be minutes, longer than any tool may take
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # endpoint -> [request count, error count, total seconds, max seconds]
+        self.metrics = {}
+        self.metrics_lock = threading.Lock()
+
+    def max_duration(self):
+        """Seconds one get() takes at most when every try times out, the backoff between the retries included."""
+        connect_timeout, read_timeout = self.timeout if isinstance(self.timeout, tuple) else (self.timeout, self.timeout)
+        # urllib3 retries the first time right away, then waits backoff_factor * 2^(retry - 1)
+        backoff = sum(self.backoff_factor * 2 ** (retry - 1) for retry in range(2, self.retries + 1))
+        return (self.retries + 1) * (connect_timeout + read_timeout) + backoff
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.time()
+        failed = True
+        try:
+            response = self.session.get(url, **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            self.record(url, time.time() - start, failed)
+
+    def record(self, url, duration, failed):
+        parsed_url = urlparse(url)
+        endpoint = parsed_url.netloc + parsed_url.path
+        with self.metrics_lock:
+            metric = self.metrics.setdefault(endpoint, [0, 0, 0.0, 0.0])
+            metric[0] += 1
+            metric[1] += 1 if failed else 0
+            metric[2] += duration
+            metric[3] = max(metric[3], duration)
+        self.log.info(f"HTTP GET {endpoint}: {duration * 1000:.0f} ms{' (failed)' if failed else ''}")
+
+    def get_stats(self):
+        with self.metrics_lock:
+            if not self.metrics:
+                return "no requests"
+            return ", ".join(f"{endpoint}: {count} requests, {errors} failed, avg {total / count * 1000:.0f} ms, max {max_duration * 1000:.0f} ms"
+                             for endpoint, (count, errors, total, max_duration) in self.metrics.items())
+
+    def close(self):
+        self.session.close()
@@ -3,34 +3,30 @@ import time
 
 import os
 from luma.core import cmdline
-from luma.core.render import canvas
 from luma.core.interface.serial import spi
 from luma.lcd.device import ili9341
 from pathlib import Path
 from PIL import ImageFont
 from PIL import Image, ImageDraw
-from luma.core.framebuffer import full_frame
+from luma.core.framebuffer import full_frame, diff_to_previous
 from luma.core.virtual import terminal
+from collections import OrderedDict
 import RPi.GPIO as GPIO
 from dotenv import load_dotenv
+from hardware import DisplayIcons
 load_dotenv()
 
 DISABLE_LCD = os.getenv("DISABLE_LCD", 'False').lower() in ('true', '1', 't')
+# Push every frame completely instead of only the changed regions
+LCD_FULL_FRAME = os.getenv("LCD_FULL_FRAME", 'False').lower() in ('true', '1', 't')
 
-class LCDServiceColor:
-    ICON_TALK = "\uf599"
-    ICON_SAD_FACE = "\uf119"
-    ICON_WIFI = "\uf1eb"
-    ICON_MIC = "\uf2a2"
-    ICON_MIC_OFF = "\uf2a4"
-    ICON_SPEAKER = "\uf028"
-    ICON_ERROR = "\uf071"    
-    ICON_LOAD = "\uf110"    
-    
-    FACE_TALK = "bunny_talk.png"
-    FACE_THINK = "bunny_think.png"
-    FACE_LISTEN = "bunny_listen.png"
-    FACE_SILENT = "bunny_silent.png"
+class LCDServiceColor(DisplayIcons):
+
+    # Number of composited frames kept in memory
+    FRAME_CACHE_SIZE = 32
+    # Steps of a full turn of the thinking spinner, and the number of regions the frame diff is split into
+    SPINNER_STEPS = 8
+    DIFF_SEGMENTS = 16
     
     @classmethod
     def make_font(self, name, size):
@@ -50,11 +46,53 @@ class LCDServiceColor:
         config = cmdline.load_config(conf_path)
         args = parser.parse_args(config)
         self.device = cmdline.create_device(args)
+        # only the bounding boxes that changed since the last frame are sent over SPI
+        self.device.framebuffer = full_frame() if LCD_FULL_FRAME else self.make_diff_framebuffer()
         
         self.font_icon = LCDServiceColor.make_font("fa-solid-900.ttf", round(self.device.height / 5))
         self.font_icon_large = LCDServiceColor.make_font("fa-solid-900.ttf", self.device.height - 100)
         self.font_text = LCDServiceColor.make_font("code2000.ttf", round(self.device.height / 14))
         self.font_text_sm = LCDServiceColor.make_font("code2000.ttf", 8)       
+
+        # Decode the faces once, and keep the composited frames keyed by (face, icon, text, small text)
+        self.face_images = {}
+        for face in [LCDServiceColor.FACE_TALK, LCDServiceColor.FACE_THINK, LCDServiceColor.FACE_LISTEN, LCDServiceColor.FACE_SILENT]:
+            self.load_face(face)
+        self.frame_cache = OrderedDict()
+
+    def make_diff_framebuffer(self):
+        try:
+            return diff_to_previous(num_segments=LCDServiceColor.DIFF_SEGMENTS)
+        except TypeError:
+            # luma.core < 2.0 diffs the frame as one bounding box
+            return diff_to_previous()
+
+    def load_face(self, face):
+        face_path = str(Path(__file__).resolve().parent.joinpath('face_images', face))
+        face_image = Image.open(face_path).convert(self.device.mode)
+        if face_image.size != self.device.size:
+            face_image = face_image.resize(self.device.size)
+        self.face_images[face] = face_image
+        return face_image
+
+    def text_size(self, draw, text, font):
+        # ImageDraw.textsize was removed in Pillow 10
+        if hasattr(draw, 'textbbox'):
+            left, top, right, bottom = draw.textbbox((0, 0), text=text, font=font)
+            return right - left, bottom - top
+        return draw.textsize(text=text, font=font)
+
+    def display_cached(self, key, render):
+        """Send the frame for key to the device, rendering (and caching) it only on a cache miss."""
+        frame = self.frame_cache.get(key)
+        if frame is None:
+            frame = render()
+            self.frame_cache[key] = frame
+            while len(self.frame_cache) > LCDServiceColor.FRAME_CACHE_SIZE:
+                self.frame_cache.popitem(last=False)
+        else:
+            self.frame_cache.move_to_end(key)
+        self.device.display(frame)
     
     def clear_screen(self):
         if DISABLE_LCD:
@@ -62,41 +100,65 @@ class LCDServiceColor:
 
         self.device.clear()
 
-    def draw_face(self, face, icon="", additional_text = "", top_small_text = ""):
+    def draw_face(self, face, icon="", additional_text = "", top_small_text = "", spinner_step = None):
+        """
+        Draw a face with a status icon and texts. With spinner_step the icon is drawn rotated
+        by spinner_step / SPINNER_STEPS of a turn; as only the icon changes between the steps,
+        the frame diff sends just the icon region.
+        """
         if DISABLE_LCD:
             return
-        
-        face_path = str(Path(__file__).resolve().parent.joinpath('face_images', face))
-        face_image=Image.open(face_path)
 
-        with canvas(self.device, background=face_image) as draw:  
-            if icon != "": 
-                w, h = draw.textsize(text=icon, font=self.font_icon)
-                left = self.device.width - w - 10
-                top = self.device.height - h - 10
+        self.display_cached(("face", face, icon, additional_text, top_small_text, spinner_step),
+                            lambda: self.render_face(face, icon, additional_text, top_small_text, spinner_step))
+
+    def render_face(self, face, icon, additional_text, top_small_text, spinner_step=None):
+        face_image = self.face_images.get(face) or self.load_face(face)
+        frame = face_image.copy()
+        draw = ImageDraw.Draw(frame)
+        if icon != "": 
+            w, h = self.text_size(draw, icon, self.font_icon)
+            left = self.device.width - w - 10
+            top = self.device.height - h - 10
+            if spinner_step is None:
                 draw.text((left, top), text=icon, font=self.font_icon, fill="white")  
-            if additional_text != "": 
-                w2, h2 = draw.textsize(text=additional_text, font=self.font_text)
-                left2 = 10
-                top2 = self.device.height - h2 - 10
-                draw.text((left2, top2), text=additional_text, font=self.font_text, fill="white")    
-            if top_small_text != "": 
-                w3, h3 = draw.textsize(text=top_small_text, font=self.font_text_sm)
-                left3 = 5
-                top3 = 5
-                draw.text((left3, top3), text=top_small_text, font=self.font_text_sm, fill="black")                  
+            else:
+                self.paste_rotated_icon(frame, icon, left + w / 2, top + h / 2, spinner_step)
+        if additional_text != "": 
+            w2, h2 = self.text_size(draw, additional_text, self.font_text)
+            left2 = 10
+            top2 = self.device.height - h2 - 10
+            draw.text((left2, top2), text=additional_text, font=self.font_text, fill="white")    
+        if top_small_text != "": 
+            left3 = 5
+            top3 = 5
+            draw.text((left3, top3), text=top_small_text, font=self.font_text_sm, fill="black")                  
+        return frame
+
+    def paste_rotated_icon(self, frame, icon, center_x, center_y, spinner_step):
+        size = round(max(self.text_size(ImageDraw.Draw(frame), icon, self.font_icon)) * 1.5)
+        tile = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        ImageDraw.Draw(tile).text((size / 2, size / 2), text=icon, font=self.font_icon, fill="white", anchor="mm")
+        tile = tile.rotate(-360 / LCDServiceColor.SPINNER_STEPS * spinner_step, resample=Image.BICUBIC)
+        frame.paste(tile.convert(frame.mode), (round(center_x - size / 2), round(center_y - size / 2)), tile)
 
     def draw_large_icon(self, icon, additional_text = ""):
         if DISABLE_LCD:
             return
-        with canvas(self.device) as draw:
-            w, h = draw.textsize(text=icon, font=self.font_icon_large)
-            left = self.device.width / 2  - w / 2
-            top = self.device.height / 2  - h / 2
-            draw.text((left, top), text=icon, font=self.font_icon_large, fill="white")
-            
-            if additional_text != "": 
-                w2, h2 = draw.textsize(text=additional_text, font=self.font_text)
-                left2 = (self.device.width - w2) - 5
-                top2 = 5
-                draw.text((left2, top2), text=additional_text, font=self.font_text, fill="white")
\ No newline at end of file
+
+        self.display_cached(("icon", icon, additional_text), lambda: self.render_large_icon(icon, additional_text))
+
+    def render_large_icon(self, icon, additional_text):
+        frame = Image.new(self.device.mode, self.device.size)
+        draw = ImageDraw.Draw(frame)
+        w, h = self.text_size(draw, icon, self.font_icon_large)
+        left = self.device.width / 2  - w / 2
+        top = self.device.height / 2  - h / 2
+        draw.text((left, top), text=icon, font=self.font_icon_large, fill="white")
+        
+        if additional_text != "": 
+            w2, h2 = self.text_size(draw, additional_text, self.font_text)
+            left2 = (self.device.width - w2) - 5
+            top2 = 5
+            draw.text((left2, top2), text=additional_text, font=self.font_text, fill="white")
+        return frame
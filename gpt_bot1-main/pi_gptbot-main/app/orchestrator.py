@@ -0,0 +1,210 @@
+import enum
+import time
+import asyncio
+import logging
+import contextlib
+import speech_recognition as sr
+
+from textsplitter import split_text
+from turntrace import trace_span, trace_mark
+
+
+class BotState(enum.Enum):
+    IDLE = "idle"              # muted, the microphone is not listened to
+    LISTENING = "listening"
+    THINKING = "thinking"
+    SPEAKING = "speaking"
+
+
+class ConversationOrchestrator:
+    """
+    Runs the conversation on an asyncio event loop with an explicit state machine.
+    Other threads (speech listener, GPIO button) never touch the state: they post
+    events with post_event(), and only the loop changes the state.
+
+    A conversation turn is one task: speech recognition (worker thread) -> streamed
+    completion (AsyncOpenAI) -> sentence queue -> synthesis and playback. Muting and
+    barge-in cancel the task, which stops every stage of the turn.
+
+    on_state_change(state, text) is called on the loop for every state change, e.g.
+    to update the display and the microphone. prepare_question(text) gets the
+    recognized text and returns the question for the model, or None to ignore it.
+    With a tracer, every turn is traced from the end of the user's speech to the end of playback.
+    """
+
+    def __init__(self, stt_backend, tts_service, gpt_service=None, language="hu",
+                 stream_response=True, barge_in=False, auto_mute=False, tracer=None):
+        self.log = logging.getLogger("bot_log")
+        self.stt_backend = stt_backend
+        self.tts_service = tts_service
+        self.gpt_service = gpt_service
+        self.language = language
+        self.stream_response = stream_response
+        self.barge_in = barge_in
+        self.auto_mute = auto_mute
+        self.tracer = tracer
+        self.on_state_change = None
+        self.prepare_question = None
+
+        self.state = BotState.IDLE
+        self.loop = None
+        self.events = None
+        self.turn_task = None
+
+        # Statistics
+        self.total_turns = 0
+        self.interrupted_turns = 0
+        self.dropped_phrases = 0
+
+    def post_event(self, name, *args):
+        """Thread safe: queue an event for the loop ("phrase", "text", "speech_start", "button", "listener_error", "stop")."""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            self.log.debug(f"Event {name} before the orchestrator started, dropped")
+            return
+        loop.call_soon_threadsafe(self.events.put_nowait, (name, args))
+
+    def set_state(self, state, text=""):
+        if state != self.state:
+            self.log.debug(f"State {self.state.value} -> {state.value}")
+        self.state = state
+        if self.on_state_change is not None:
+            try:
+                self.on_state_change(state, text)
+            except Exception as e:
+                self.log.error(f"State change handler error: {e}")
+
+    async def run(self, start_muted=False):
+        self.loop = asyncio.get_running_loop()
+        self.events = asyncio.Queue()
+        self.set_state(BotState.IDLE if start_muted else BotState.LISTENING)
+        try:
+            while True:
+                name, args = await self.events.get()
+                if name == "stop":
+                    break
+                elif name == "phrase":
+                    await self.on_phrase(*args)
+                elif name == "text":
+                    # a typed question, e.g. from a botserver.py client, skips speech recognition
+                    await self.on_phrase(None, text=args[0])
+                elif name == "speech_start":
+                    if self.barge_in and self.state in (BotState.THINKING, BotState.SPEAKING):
+                        self.log.info("Barge-in: response interrupted")
+                        print("Barge-in: response interrupted", flush=True)
+                        await self.cancel_turn()
+                        self.set_state(BotState.LISTENING)
+                elif name == "button":
+                    await self.toggle_mute()
+                elif name == "listener_error":
+                    # the speech listener gave up: mute, the button starts listening again
+                    self.log.error(f"Speech listener failed: {args[0]}")
+                    await self.cancel_turn()
+                    self.set_state(BotState.IDLE)
+        finally:
+            await self.cancel_turn()
+
+    def stop(self):
+        self.post_event("stop")
+
+    async def on_phrase(self, audio, stream_result=None, timing=None, text=None):
+        if self.state == BotState.IDLE:
+            return
+        if self.turn_task is not None and not self.turn_task.done():
+            if not self.barge_in:
+                # the bot is busy with the previous question
+                self.dropped_phrases += 1
+                return
+            await self.cancel_turn()
+        self.turn_task = asyncio.create_task(self.run_turn(audio, stream_result, timing, text))
+
+    async def cancel_turn(self):
+        task = self.turn_task
+        self.turn_task = None
+        if task is None or task.done():
+            return
+        task.cancel()
+        self.interrupted_turns += 1
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    async def toggle_mute(self):
+        if self.state == BotState.IDLE:
+            self.set_state(BotState.LISTENING)
+        else:
+            # stop talking right away, including the sentences still waiting for synthesis
+            await self.cancel_turn()
+            self.set_state(BotState.IDLE)
+
+    async def recognize(self, audio, stream_result):
+        try:
+            with trace_span("stt", streamed=stream_result is not None) as span:
+                text, confidence = await asyncio.to_thread(self.stt_backend.recognize, audio, self.language, stream_result)
+                span["confidence"] = round(confidence, 2)
+            self.log.debug(f"STT confidence: {confidence:.2f}")
+            return text
+        except sr.UnknownValueError:
+            # speech was unintelligible
+            return None
+        except sr.RequestError as e:
+            # API was unreachable or unresponsive
+            self.log.error(f"Could not request results from the speech recognition service; {e}")
+            return None
+
+    async def run_turn(self, audio, stream_result, timing=None, text=None):
+        trace = None
+        if self.tracer is not None:
+            # the user waits for the answer from the end of the speech
+            trace = self.tracer.start_turn(timing["speech_end"] if timing else None)
+            if timing:
+                trace.add_span("endpointing", timing["speech_end"], timing["endpoint"])
+        status = "ok"
+        try:
+            if text is None:
+                text = await self.recognize(audio, stream_result)
+            if text is None:
+                status = "unrecognized"
+                return
+            question = self.prepare_question(text) if self.prepare_question is not None else text
+            if question is None:
+                status = "ignored"
+                return
+
+            self.total_turns += 1
+            self.set_state(BotState.THINKING, text)
+            start = time.time()
+
+            def on_first_sentence(sentence):
+                first_sentence_duration = f'OpenAI API first sentence: {time.time() - start} s'
+                print(first_sentence_duration, flush=True)
+                self.log.debug(first_sentence_duration)
+                trace_mark("first_sentence")
+                self.set_state(BotState.SPEAKING, sentence)
+
+            lang = self.language
+            if self.stream_response:
+                await self.tts_service.speak_stream_async(self.gpt_service.ask_stream(question), lang, on_first_chunk=on_first_sentence)
+            else:
+                response_text = await self.gpt_service.ask_complete(question)
+                await self.tts_service.speak_stream_async(self.sentences_of(response_text), lang, on_first_chunk=lambda sentence: self.set_state(BotState.SPEAKING, response_text))
+            print(f'OpenAI API call ended: {time.time() - start} s', flush=True)
+
+            self.set_state(BotState.IDLE if self.auto_mute else BotState.LISTENING)
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as e:
+            status = "error"
+            self.log.error(f"Conversation turn failed: {e}")
+            print(e, flush=True)
+            self.set_state(BotState.LISTENING)
+        finally:
+            if trace is not None:
+                self.tracer.finish_turn(trace, status)
+
+    async def sentences_of(self, text):
+        for sentence in split_text(text):
+            yield sentence
+
+    def get_stats(self):
+        return f"{self.total_turns} turns, {self.interrupted_turns} interrupted, {self.dropped_phrases} phrases dropped while busy"
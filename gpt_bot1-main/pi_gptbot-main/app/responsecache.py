@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+# Words that refer back to the conversation, per answer language: a question containing them
+# depends on the earlier turns, so its answer is only cached when it is the first question.
+# Per language, since e.g. the Hungarian "is" (also) is in most English questions.
+CONTEXT_WORDS = {
+    "English": {"it", "that", "this", "those", "these", "he", "she", "they", "him", "her", "them", "his", "its", "their",
+                "again", "more", "else", "then", "also", "too", "why", "previous", "last", "before"},
+    "Hungarian": {"ez", "az", "ezt", "azt", "ezek", "azok", "erről", "arról", "ő", "őt", "ők", "még", "is", "akkor", "miért", "előbb"},
+    "German": {"es", "das", "dies", "davon", "dazu", "er", "sie", "ihn", "ihm", "ihr", "noch", "wieder", "dann", "warum", "vorher"},
+}
+# Languages without their own list are checked against all of them
+ALL_CONTEXT_WORDS = set().union(*CONTEXT_WORDS.values())
+# Longer questions are rarely repeated word for word
+MAX_STATELESS_WORDS = 12
+
+
+class ResponseCache:
+    """
+    Answers to repeated questions, kept in a JSON file across restarts. Entries are keyed
+    by the hash of the personality (initial prompt), the language and the normalized
+    question; they expire after ttl seconds, and the least recently used ones are
+    evicted when there are more than max_entries. The file is written on a timer thread
+    at most every SAVE_DELAY seconds, close() writes what is still pending.
+    """
+
+    SAVE_DELAY = 5
+
+    def init_logging(self):
+        self.log = logging.getLogger("bot_log")
+        logging.basicConfig(filename='gpt_service.log', level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def __init__(self, cache_file=None, ttl=24 * 3600, max_entries=500):
+
+        self.init_logging()
+
+        if cache_file is None:
+            cache_file = str(Path(__file__).resolve().parent.joinpath('response_cache.json'))
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.save_timer = None
+
+        # key -> {"expires_at", "scope", "question", "answer"}, least recently used first
+        self.entries = OrderedDict()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError) as e:
+            self.log.warning(f"Response cache {self.cache_file} not loaded: {e}")
+            return
+        now = time.time()
+        for key, entry in entries.items():
+            if entry.get("expires_at", 0) > now:
+                self.entries[key] = entry
+        self.log.info(f"Response cache: {len(self.entries)} answers in {self.cache_file}")
+
+    def schedule_save(self):
+        """Save in SAVE_DELAY seconds, off the asyncio loop, with the changes made until then."""
+        with self.lock:
+            if self.save_timer is not None:
+                return
+            self.save_timer = threading.Timer(self.SAVE_DELAY, self.save)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def save(self):
+        """Write the cache file atomically, so a power cut never leaves half a file behind."""
+        with self.lock:
+            self.save_timer = None
+            entries = dict(self.entries)
+        tmp_path = f"{self.cache_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as cache_file:
+                json.dump(entries, cache_file, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            self.log.warning(f"Response cache not saved: {e}")
+
+    def normalize(self, question):
+        return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+    def scope(self, personality, language):
+        """The answers of one personality in one language."""
+        return f"{hashlib.sha1(personality.encode('utf-8')).hexdigest()}|{language}"
+
+    def key(self, scope, question):
+        return hashlib.sha1(f"{scope}|{self.normalize(question)}".encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, question, first_turn, language=None):
+        """
+        The first question of a conversation has no context, so its answer can be reused.
+        Later questions only if they look stateless: short, without words of the language
+        (e.g. "English") referring back.
+        """
+        if first_turn:
+            return True
+        words = self.normalize(question).split()
+        context_words = CONTEXT_WORDS.get(language, ALL_CONTEXT_WORDS)
+        return 0 < len(words) <= MAX_STATELESS_WORDS and not context_words.intersection(words)
+
+    def get(self, personality, language, question):
+        """Returns the cached answer, or None if it is missing or expired."""
+        answer = self.find(self.scope(personality, language), question)
+        with self.lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return answer
+
+    def find(self, scope, question):
+        return self.get_answer(self.key(scope, question))
+
+    def get_answer(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry["expires_at"] < time.time():
+                if entry is not None:
+                    del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry["answer"]
+
+    def put(self, personality, language, question, answer):
+        if not answer or answer.strip() == "":
+            return
+        scope = self.scope(personality, language)
+        key = self.key(scope, question)
+        with self.lock:
+            self.entries[key] = {"expires_at": time.time() + self.ttl, "scope": scope, "question": question, "answer": answer}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self.schedule_save()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        self.schedule_save()
+
+    def close(self):
+        """Write the pending changes now, e.g. before the program exits."""
+        with self.lock:
+            save_timer = self.save_timer
+        if save_timer is not None:
+            save_timer.cancel()
+            self.save()
+
+    def get_stats(self):
+        return f"{self.hits} hits, {self.misses} misses, {len(self.entries)} answers"
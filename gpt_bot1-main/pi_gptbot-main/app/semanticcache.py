@@ -0,0 +1,247 @@
+import math
+import time
+import zlib
+import threading
+
+# Try importing NumPy safely, the index falls back to sparse vectors in pure Python
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from responsecache import ResponseCache
+
+# Function words that carry no meaning of the question, left out of the vectors.
+# Pronouns stay: "your name" and "my name" are different questions.
+STOP_WORDS = {
+    "a", "an", "the", "is", "s", "are", "am", "do", "does", "did", "please", "tell", "me", "can", "could",
+    "egy", "van", "vagy", "kérlek", "mondd", "meg",
+    "ein", "eine", "der", "die", "den", "ist", "bist", "sind", "bitte", "sag", "mir",
+}
+
+
+class HashingVectorizer:
+    """
+    Embeds a question without a model: its words and the character trigrams of its
+    words are hashed into a fixed number of dimensions and the vector is L2 normalized.
+    Leaving out the STOP_WORDS and adding the trigrams make "what's your name"
+    close to "what is your name, bunny".
+    """
+
+    def __init__(self, dimensions=2048, word_weight=1.0, trigram_weight=0.5):
+        self.dimensions = dimensions
+        self.word_weight = word_weight
+        self.trigram_weight = trigram_weight
+
+    def features(self, normalized_question):
+        """(feature, weight) pairs of an already normalized question."""
+        for word in normalized_question.split():
+            if word in STOP_WORDS:
+                continue
+            yield "w:" + word, self.word_weight
+            padded = f"<{word}>"
+            for index in range(len(padded) - 2):
+                yield "t:" + padded[index:index + 3], self.trigram_weight
+
+    def sparse_vector(self, normalized_question):
+        """{dimension: value}, L2 normalized; empty for an empty question."""
+        vector = {}
+        for feature, weight in self.features(normalized_question):
+            # crc32 is stable across restarts, unlike hash()
+            feature_hash = zlib.crc32(feature.encode("utf-8"))
+            dimension = feature_hash % self.dimensions
+            # the sign bit keeps colliding features from adding up
+            sign = 1.0 if feature_hash & 0x80000000 else -1.0
+            vector[dimension] = vector.get(dimension, 0.0) + sign * weight
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if norm == 0:
+            return {}
+        return {dimension: value / norm for dimension, value in vector.items()}
+
+    def dense_vector(self, normalized_question):
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for dimension, value in self.sparse_vector(normalized_question).items():
+            vector[dimension] = value
+        return vector
+
+
+class SimilarityIndex:
+    """
+    Brute force nearest neighbour search over the question vectors of one scope
+    (personality and language): a NumPy matrix product, or sparse dot products
+    without NumPy. A few hundred questions take well under a millisecond.
+    """
+
+    def __init__(self, vectorizer):
+        self.vectorizer = vectorizer
+        self.keys = []
+        # key -> normalized question
+        self.questions = {}
+        self.vectors = [] if not NUMPY_AVAILABLE else np.zeros((0, vectorizer.dimensions), dtype=np.float32)
+
+    def add(self, key, normalized_question):
+        if key in self.keys:
+            return
+        self.keys.append(key)
+        self.questions[key] = normalized_question
+        if NUMPY_AVAILABLE:
+            self.vectors = np.vstack([self.vectors, self.vectorizer.dense_vector(normalized_question)])
+        else:
+            self.vectors.append(self.vectorizer.sparse_vector(normalized_question))
+
+    def remove(self, key):
+        """No-op if the key is not in the index (any more)."""
+        if key not in self.questions:
+            return
+        index = self.keys.index(key)
+        del self.keys[index]
+        del self.questions[key]
+        if NUMPY_AVAILABLE:
+            self.vectors = np.delete(self.vectors, index, axis=0)
+        else:
+            del self.vectors[index]
+
+    def nearest(self, normalized_question):
+        """(key, cosine similarity) of the most similar question, (None, 0) if the index is empty."""
+        if not self.keys:
+            return None, 0.0
+        if NUMPY_AVAILABLE:
+            # the vectors are normalized, so the dot product is the cosine similarity
+            similarities = self.vectors @ self.vectorizer.dense_vector(normalized_question)
+            index = int(np.argmax(similarities))
+            return self.keys[index], float(similarities[index])
+        query = self.vectorizer.sparse_vector(normalized_question)
+        best_index, best_similarity = 0, -1.0
+        for index, vector in enumerate(self.vectors):
+            similarity = sum(value * vector.get(dimension, 0.0) for dimension, value in query.items())
+            if similarity > best_similarity:
+                best_index, best_similarity = index, similarity
+        return self.keys[best_index], best_similarity
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class SemanticResponseCache(ResponseCache):
+    """
+    ResponseCache that also answers near-duplicate questions: on an exact miss, the
+    answer of the most similar cached question of the same personality and language
+    is used if their cosine similarity is at least similarity_threshold and they ask
+    about the same things (see is_same_question).
+    """
+
+    def __init__(self, cache_file=None, ttl=24 * 3600, max_entries=500, similarity_threshold=0.85, vectorizer=None):
+        self.similarity_threshold = similarity_threshold
+        self.vectorizer = vectorizer if vectorizer is not None else HashingVectorizer()
+        # scope -> SimilarityIndex
+        self.indexes = {}
+        self.index_lock = threading.Lock()
+
+        # Statistics
+        self.similar_hits = 0
+        self.total_lookup_duration = 0
+        self.lookups = 0
+
+        super().__init__(cache_file, ttl, max_entries)
+
+    def load(self):
+        super().load()
+        self.load_indexes()
+
+    def index(self, scope, key, question):
+        with self.index_lock:
+            if scope not in self.indexes:
+                self.indexes[scope] = SimilarityIndex(self.vectorizer)
+            self.indexes[scope].add(key, self.normalize(question))
+
+    def find(self, scope, question):
+        answer = super().find(scope, question)
+        if answer is not None:
+            return answer
+
+        lookup_start = time.time()
+        normalized_question = self.normalize(question)
+        with self.index_lock:
+            index = self.indexes.get(scope)
+            key, similarity = index.nearest(normalized_question) if index is not None else (None, 0.0)
+            similar_question = index.questions.get(key) if key is not None else None
+        self.total_lookup_duration += time.time() - lookup_start
+        self.lookups += 1
+        if similar_question is None or similarity < self.similarity_threshold:
+            return None
+        if not self.is_same_question(normalized_question, similar_question):
+            self.log.debug(f"Response cache: '{question}' is similar ({similarity:.2f}) to '{similar_question}', but asks something else")
+            return None
+
+        answer = self.get_answer(key)
+        if answer is None:
+            # expired or evicted since it was indexed
+            with self.index_lock:
+                index.remove(key)
+            return None
+        self.similar_hits += 1
+        self.log.info(f"Response cache: similar question ({similarity:.2f}) for '{question}'")
+        return answer
+
+    def is_same_question(self, normalized_question, similar_question):
+        """
+        The vectors hardly tell "2 plus 3" from "2 plus 5", so a similar question only counts
+        if it has the same numbers, and all of the content words (not STOP_WORDS) of one
+        question are in the other: "what is your name, bunny" may reuse "what's your name".
+        """
+        words = {word for word in normalized_question.split() if word not in STOP_WORDS}
+        similar_words = {word for word in similar_question.split() if word not in STOP_WORDS}
+        numbers = {word for word in words if any(character.isdigit() for character in word)}
+        similar_numbers = {word for word in similar_words if any(character.isdigit() for character in word)}
+        if numbers != similar_numbers:
+            return False
+        return words <= similar_words or similar_words <= words
+
+    def put(self, personality, language, question, answer):
+        super().put(personality, language, question, answer)
+        if not answer or answer.strip() == "":
+            return
+        scope = self.scope(personality, language)
+        self.index(scope, self.key(scope, question), question)
+        with self.lock:
+            entry_count = len(self.entries)
+        with self.index_lock:
+            indexed_count = sum(len(index) for index in self.indexes.values())
+        if indexed_count > entry_count + 100:
+            # drop the questions evicted from the cache in the meantime
+            self.rebuild_indexes()
+
+    def rebuild_indexes(self):
+        with self.index_lock:
+            self.indexes = {}
+        self.load_indexes()
+
+    def load_indexes(self):
+        with self.lock:
+            entries = list(self.entries.items())
+        for key, entry in entries:
+            # entries written before the scope was stored can only be found exactly
+            if "scope" in entry:
+                self.index(entry["scope"], key, entry["question"])
+
+    def clear(self):
+        with self.index_lock:
+            self.indexes = {}
+        super().clear()
+
+    def get_stats(self):
+        average_lookup = self.total_lookup_duration / self.lookups * 1000 if self.lookups > 0 else 0
+        return f"{super().get_stats()}, {self.similar_hits} similar question hits, avg similarity lookup {average_lookup:.2f} ms"
+
+
+def create_response_cache(cache_hours, similarity_threshold=0.85):
+    """
+    Response cache by the bot_config.yaml settings: None when cache_hours is 0, exact
+    matches only when similarity_threshold is 0, similar questions too otherwise.
+    """
+    if cache_hours <= 0:
+        return None
+    if similarity_threshold <= 0:
+        return ResponseCache(ttl=cache_hours * 3600)
+    return SemanticResponseCache(ttl=cache_hours * 3600, similarity_threshold=similarity_threshold)
@@ -0,0 +1,210 @@
+import math
+import time
+import logging
+import threading
+import collections
+import speech_recognition as sr
+
+from vad import VoiceActivityDetector
+
+
+class SpeechListener:
+    """
+    Background listener replacing Recognizer.listen_in_background: reads the microphone
+    chunk by chunk, finds the phrases with voice activity detection (a phrase starts after
+    recognizer.phrase_threshold seconds of speech, so clicks and pops are ignored, and ends
+    after trailing_silence seconds without speech, or after max_utterance seconds), and calls
+    on_phrase(audio_data, stream_result, timing) for each of them; timing holds the
+    time.time() of speech_start, speech_end (last speech chunk) and endpoint.
+    With a streaming STT backend the chunks are also fed to a recognition stream while
+    the user is speaking, and on_partial(text) gets the partial transcript.
+    With a wake word spotter, nothing is recorded until the spotter hears the keyword.
+    For barge-in, on_speech_start() is called as soon as speech starts, and
+    playback_state() tells the VAD what the bot is playing, so its own voice coming
+    back from the speaker is not taken for the user.
+    When the microphone keeps failing, the listener waits longer after every error and
+    stops after MAX_ERRORS errors in a row, calling on_error(exception).
+    """
+
+    # consecutive speech chunks needed to accept speech while the bot is talking
+    SPEECH_CHUNKS_DURING_PLAYBACK = 3
+    # wait after an error, doubled for every further error in a row up to MAX_ERROR_DELAY seconds
+    ERROR_DELAY = 0.1
+    MAX_ERROR_DELAY = 5
+    MAX_ERRORS = 10
+
+    def __init__(self, recognizer, microphone, on_phrase, stt_backend=None, language="hu", on_partial=None,
+                 wake_word_spotter=None, on_wake=None, vad_aggressiveness=2, trailing_silence=0.5, max_utterance=15,
+                 on_speech_start=None, playback_state=None, on_error=None):
+        self.log = logging.getLogger("bot_log")
+        self.recognizer = recognizer
+        self.microphone = microphone
+        self.on_phrase = on_phrase
+        self.on_partial = on_partial
+        self.stt_backend = stt_backend
+        self.language = language
+        self.wake_word_spotter = wake_word_spotter
+        self.on_wake = on_wake
+        self.vad_aggressiveness = vad_aggressiveness
+        self.trailing_silence = trailing_silence
+        self.max_utterance = max_utterance
+        self.on_speech_start = on_speech_start
+        self.playback_state = playback_state
+        self.on_error = on_error
+        self.vad = None
+        self.running = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Statistics
+        self.total_errors = 0
+
+    def start(self):
+        self.running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.listen_loop, name="speech_listener", daemon=True)
+        self.thread.start()
+        return self.stop
+
+    def stop(self, wait_for_stop=True):
+        self.running = False
+        self.stop_event.set()
+        if wait_for_stop and self.thread is not None:
+            self.thread.join()
+
+    def listen_loop(self):
+        with self.microphone as source:
+            # the ambient noise calibration of the recognizer is the first noise floor estimate
+            self.vad = VoiceActivityDetector(source.SAMPLE_RATE, source.SAMPLE_WIDTH, self.vad_aggressiveness,
+                                             initial_noise_floor=self.recognizer.energy_threshold / VoiceActivityDetector.SPEECH_RATIO)
+            if self.wake_word_spotter is not None:
+                try:
+                    self.wake_word_spotter.start(source.SAMPLE_RATE)
+                except Exception as e:
+                    # e.g. no Vosk model for the language: listen to everything rather than to nothing
+                    print(f"⚠️  Wake word not available ({e}) — listening to everything")
+                    self.log.error(f"Wake word spotter not started: {e}")
+                    self.wake_word_spotter = None
+            errors = 0
+            while self.running:
+                try:
+                    if self.wake_word_spotter is not None and not self.wake_word_spotter.is_awake():
+                        if not self.wait_for_wake_word(source):
+                            continue
+                    audio_data, stream_result, timing = self.listen_phrase(source)
+                    errors = 0
+                except Exception as e:
+                    errors += 1
+                    self.total_errors += 1
+                    self.log.error(f"Speech listener error ({errors} in a row): {e}")
+                    if errors >= self.MAX_ERRORS:
+                        self.log.error(f"Speech listener stopped after {errors} errors in a row")
+                        self.running = False
+                        if self.on_error is not None:
+                            self.on_error(e)
+                        break
+                    # e.g. the microphone was unplugged: don't spin on the failing read
+                    self.stop_event.wait(min(self.ERROR_DELAY * 2 ** (errors - 1), self.MAX_ERROR_DELAY))
+                    continue
+                if audio_data is not None and self.running:
+                    if self.wake_word_spotter is not None:
+                        self.wake_word_spotter.keep_awake()
+                    self.on_phrase(audio_data, stream_result, timing)
+                    if self.wake_word_spotter is not None:
+                        # the follow-up question may come right after the answer
+                        self.wake_word_spotter.keep_awake()
+
+    def wait_for_wake_word(self, source):
+        """Feed the microphone to the spotter until it hears the keyword. Only the audio after it is recorded."""
+        while self.running:
+            buffer = source.stream.read(source.CHUNK)
+            if len(buffer) == 0:
+                return False
+            if self.wake_word_spotter.accept(buffer):
+                if self.on_wake is not None:
+                    self.on_wake()
+                return True
+        return False
+
+    def start_stream(self, source):
+        if self.stt_backend is None or not self.stt_backend.streaming:
+            return None
+        try:
+            return self.stt_backend.start_stream(self.language, source.SAMPLE_RATE)
+        except Exception as e:
+            self.log.error(f"Could not start STT stream: {e}")
+            return None
+
+    def feed_stream(self, stream, buffer):
+        partial = stream.accept(buffer)
+        if partial and self.on_partial is not None:
+            self.on_partial(partial)
+
+    def is_speech(self, buffer):
+        """(speech, during playback) for one microphone chunk."""
+        playing, level = self.playback_state() if self.playback_state is not None else (False, 0)
+        return self.vad.is_speech(buffer, playing, level), playing
+
+    def listen_phrase(self, source):
+        """Returns (audio data, stream result, timing) of the next phrase, (None, None, None) when stopped."""
+        seconds_per_buffer = float(source.CHUNK) / source.SAMPLE_RATE
+        trailing_silence_count = int(math.ceil(self.trailing_silence / seconds_per_buffer))
+        max_utterance_count = int(math.ceil(self.max_utterance / seconds_per_buffer))
+        # audio kept from before the start of the speech, so the first syllable is not cut
+        pre_speech_count = int(math.ceil(self.recognizer.non_speaking_duration / seconds_per_buffer))
+        # speech shorter than the phrase threshold is a click or a pop, not a phrase
+        min_speech_count = max(1, int(math.ceil(self.recognizer.phrase_threshold / seconds_per_buffer)))
+
+        # wait for speech
+        frames = collections.deque(maxlen=pre_speech_count + min_speech_count)
+        speech_chunks = 0
+        while True:
+            if not self.running:
+                return None, None, None
+            if self.wake_word_spotter is not None and not self.wake_word_spotter.is_awake():
+                # nothing was said after the wake word, back to sleep
+                return None, None, None
+            buffer = source.stream.read(source.CHUNK)
+            if len(buffer) == 0:
+                return None, None, None
+            frames.append(buffer)
+            speech, playing = self.is_speech(buffer)
+            speech_chunks = speech_chunks + 1 if speech else 0
+            # while the bot is talking, a few loud chunks may still be echo
+            if speech_chunks >= (max(min_speech_count, self.SPEECH_CHUNKS_DURING_PLAYBACK) if playing else min_speech_count):
+                break
+
+        last_speech = time.time()
+        speech_start = last_speech - speech_chunks * seconds_per_buffer
+        if self.on_speech_start is not None:
+            self.on_speech_start()
+        stream = self.start_stream(source)
+        frames = list(frames)
+        if stream is not None:
+            self.feed_stream(stream, b"".join(frames))
+
+        # record until trailing_silence without speech, or cut it at max_utterance
+        silence_count = 0
+        speech_start_frame = len(frames)
+        while self.running:
+            buffer = source.stream.read(source.CHUNK)
+            if len(buffer) == 0:
+                break
+            frames.append(buffer)
+            if stream is not None:
+                self.feed_stream(stream, buffer)
+            if self.is_speech(buffer)[0]:
+                silence_count = 0
+                last_speech = time.time()
+            else:
+                silence_count += 1
+            if silence_count >= trailing_silence_count:
+                break
+            if len(frames) - speech_start_frame >= max_utterance_count:
+                self.log.info(f"Utterance cut at {self.max_utterance}s")
+                break
+
+        audio_data = sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+        stream_result = stream.result() if stream is not None else None
+        timing = {"speech_start": speech_start, "speech_end": last_speech, "endpoint": time.time()}
+        return audio_data, stream_result, timing
@@ -0,0 +1,161 @@
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+import speech_recognition as sr
+
+# Try importing the offline recognizer safely
+try:
+    from vosk import Model, KaldiRecognizer, SetLogLevel
+    SetLogLevel(-1)
+    VOSK_AVAILABLE = True
+except ImportError:
+    VOSK_AVAILABLE = False
+
+
+class GoogleSTT:
+    """Google Web Speech API (online), the original recognizer of the bot."""
+
+    streaming = False
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def recognize(self, audio_data, language, stream_result=None):
+        """Returns (text, confidence), raises sr.UnknownValueError / sr.RequestError like recognize_google."""
+        result = self.recognizer.recognize_google(audio_data, language=language, show_all=True)
+        if not result or not result.get('alternative'):
+            raise sr.UnknownValueError()
+        best = result['alternative'][0]
+        return best['transcript'], best.get('confidence', 1.0)
+
+
+class VoskStream:
+    """Incremental recognition of one utterance, fed chunk by chunk while the user is speaking."""
+
+    def __init__(self, model, sample_rate):
+        self.recognizer = KaldiRecognizer(model, sample_rate)
+        self.recognizer.SetWords(True)
+        self.finished_text = []
+        self.finished_confidences = []
+
+    def accept(self, chunk):
+        """Feed raw 16 bit mono audio, returns the partial transcript so far."""
+        if self.recognizer.AcceptWaveform(chunk):
+            # vosk found the end of a sentence inside the utterance
+            self.add_result(json.loads(self.recognizer.Result()))
+            return " ".join(self.finished_text)
+        partial = json.loads(self.recognizer.PartialResult()).get('partial', '')
+        return " ".join(self.finished_text + [partial]).strip()
+
+    def add_result(self, result):
+        if result.get('text'):
+            self.finished_text.append(result['text'])
+            self.finished_confidences.extend(word['conf'] for word in result.get('result', []))
+
+    def result(self):
+        """Finish the utterance, returns (text, confidence)."""
+        self.add_result(json.loads(self.recognizer.FinalResult()))
+        text = " ".join(self.finished_text)
+        if not self.finished_confidences:
+            return text, 0.0
+        return text, sum(self.finished_confidences) / len(self.finished_confidences)
+
+
+class VoskSTT:
+    """
+    Offline recognizer (Vosk / Kaldi). Models are looked up in model_dir/<language>,
+    e.g. models/vosk/hu, and loaded once per language.
+    """
+
+    streaming = True
+
+    def __init__(self, model_dir=None):
+        if not VOSK_AVAILABLE:
+            raise RuntimeError("vosk is not installed")
+        self.log = logging.getLogger("bot_log")
+        if model_dir is None:
+            model_dir = str(Path(__file__).resolve().parent.joinpath('models', 'vosk'))
+        self.model_dir = model_dir
+        self.models = {}
+        self.models_lock = threading.Lock()
+
+    def get_model(self, language):
+        language = language[0:2].lower()
+        with self.models_lock:
+            if language not in self.models:
+                model_path = os.path.join(self.model_dir, language)
+                if not os.path.isdir(model_path):
+                    raise sr.RequestError(f"no Vosk model for '{language}' in {self.model_dir}")
+                self.models[language] = Model(model_path)
+                self.log.info(f"Vosk model loaded: {model_path}")
+            return self.models[language]
+
+    def start_stream(self, language, sample_rate):
+        return VoskStream(self.get_model(language), sample_rate)
+
+    def recognize(self, audio_data, language, stream_result=None):
+        if stream_result is None:
+            stream = self.start_stream(language, audio_data.sample_rate)
+            stream.accept(audio_data.get_raw_data(convert_width=2))
+            stream_result = stream.result()
+        text, confidence = stream_result
+        if text.strip() == "":
+            raise sr.UnknownValueError()
+        return text, confidence
+
+
+class HybridSTT:
+    """
+    Local first, cloud fallback: the local result is used when its confidence is at
+    least min_confidence, otherwise the phrase is sent to the cloud backend. When the
+    cloud is not reachable the local result is used anyway.
+    """
+
+    streaming = True
+
+    def __init__(self, local_backend, cloud_backend, min_confidence=0.6):
+        self.log = logging.getLogger("bot_log")
+        self.local_backend = local_backend
+        self.cloud_backend = cloud_backend
+        self.min_confidence = min_confidence
+
+    def start_stream(self, language, sample_rate):
+        return self.local_backend.start_stream(language, sample_rate)
+
+    def recognize(self, audio_data, language, stream_result=None):
+        local_text, local_confidence = None, 0.0
+        try:
+            local_text, local_confidence = self.local_backend.recognize(audio_data, language, stream_result)
+            if local_confidence >= self.min_confidence:
+                return local_text, local_confidence
+        except (sr.UnknownValueError, sr.RequestError):
+            pass
+
+        self.log.info(f"Local STT confidence {local_confidence:.2f}, asking the cloud")
+        try:
+            return self.cloud_backend.recognize(audio_data, language)
+        except sr.RequestError as e:
+            if local_text is None:
+                raise
+            self.log.warning(f"Cloud STT not reachable ({e}), using the local result")
+            return local_text, local_confidence
+
+
+def create_stt_backend(name, model_dir=None, min_confidence=0.6):
+    """
+    Backend by its bot_config.yaml name: google, vosk or hybrid.
+    Falls back to google when the local engine is not available.
+    """
+    log = logging.getLogger("bot_log")
+    if name in ("vosk", "hybrid"):
+        try:
+            local_backend = VoskSTT(model_dir)
+            if name == "vosk":
+                return local_backend
+            return HybridSTT(local_backend, GoogleSTT(), min_confidence)
+        except RuntimeError as e:
+            print(f"⚠️  Offline STT not available ({e}) — using Google STT")
+            log.warning(f"Offline STT not available ({e}), using Google STT")
+    return GoogleSTT()
@@ -0,0 +1,32 @@
+import re
+
+# End of a sentence: terminal punctuation (optionally followed by closing quotes/brackets) and whitespace, or a line break
+SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s+|\n+')
+
+
+def split_sentences(text, min_length=20):
+    """
+    Split complete sentences off the start of text. Returns (sentences, remainder).
+    Very short fragments are kept together with the next sentence, and numbers followed by
+    a dot (ordinals like "3." in Hungarian) do not end a sentence.
+    """
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        end = match.end()
+        if match.group().startswith('.') and re.search(r'\b\d+$', text[start:match.start()]):
+            continue
+        candidate = text[start:end].strip()
+        if len(candidate) < min_length:
+            continue
+        sentences.append(candidate)
+        start = end
+    return sentences, text[start:]
+
+
+def split_text(text, min_length=20):
+    """Split a complete text into sentences."""
+    sentences, remainder = split_sentences(text, min_length)
+    if remainder.strip() != '':
+        sentences.append(remainder.strip())
+    return sentences
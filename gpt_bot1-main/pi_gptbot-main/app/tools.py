@@ -10,17 +10,40 @@ except ImportError:
     YFINANCE_AVAILABLE = False
 
 from visionservice import VisionService
+from ttlcache import TTLCache
+from httpclient import HTTPClient
 
 load_dotenv()
 
+# Service endpoints, overridable e.g. to run against local stand-ins (benchmarks/turn_benchmark.py)
+BING_SEARCH_ENDPOINT = os.getenv('BING_SEARCH_ENDPOINT', "https://api.bing.microsoft.com/v7.0/search")
+OPENWEATHERMAP_ENDPOINT = os.getenv('OPENWEATHERMAP_ENDPOINT', "http://api.openweathermap.org/data/2.5/weather")
+
+# Seconds a tool result is reused for the same arguments, tools not listed here are not cached
+TOOL_CACHE_TTLS = {
+    "get_current_weather": 10 * 60,
+    "get_stock_price": 60,
+    "search_internet": 30 * 60,
+}
+
 
 class AITools:
-    def __init__(self, default_language="English", default_internet_market="hu-HU"):
+    def __init__(self, default_language="English", default_internet_market="hu-HU", http_client=None, tool_cache=None):
         self.default_language = default_language
         self.default_internet_market = default_internet_market
+        self.http_client = http_client if http_client is not None else HTTPClient()
         self.vision_service = VisionService(default_language=default_language)
+        self.tool_cache = tool_cache if tool_cache is not None else TTLCache(max_size=128)
 
     def call_tool(self, tool_name, function_args):
+        cache_ttl = TOOL_CACHE_TTLS.get(tool_name)
+        if cache_ttl is not None:
+            cache_key = self.get_cache_key(tool_name, function_args)
+            func_result = self.tool_cache.get(cache_key)
+            if func_result is not None:
+                print(f"FUNCTION CALL RESULTS (cache hit): {tool_name}({function_args}) -> {func_result}")
+                return func_result
+
         print("CALLING FUNCTION:", tool_name)
 
         if tool_name == "get_current_weather":
@@ -38,9 +61,30 @@ class AITools:
         else:
             return "Unknown tool"
 
-        print(f"FUNCTION CALL RESULTS: {tool_name}({func_arg}) -> {func_result}")
+        cache_status = "disabled"
+        if cache_ttl is not None:
+            cache_status = "miss"
+            if self.is_cacheable_result(func_result):
+                self.tool_cache.put(cache_key, func_result, cache_ttl)
+
+        print(f"FUNCTION CALL RESULTS (cache {cache_status}): {tool_name}({func_arg}) -> {func_result}")
         return func_result
 
+    def get_cache_key(self, tool_name, function_args):
+        normalized_args = {}
+        for arg_name, arg_value in function_args.items():
+            if isinstance(arg_value, str):
+                arg_value = " ".join(arg_value.lower().split())
+            normalized_args[arg_name] = arg_value
+        return tool_name + json.dumps(normalized_args, sort_keys=True)
+
+    def is_cacheable_result(self, func_result):
+        # errors and "not available" answers are retried the next time
+        return not func_result.startswith(("Error", "❌", "Could not", "Stock price lookup not available"))
+
+    def get_cache_stats(self):
+        return self.tool_cache.get_stats()
+
     def get_tools_list(self):
         enable_stock_tool = True
         tools = []
@@ -122,11 +166,14 @@ class AITools:
         if not subscription_key:
             return "❌ Bing Search API key not found."
 
-        response = requests.get(
-            "https://api.bing.microsoft.com/v7.0/search",
-            headers={'Ocp-Apim-Subscription-Key': subscription_key},
-            params={'q': query, 'mkt': self.default_internet_market, "count": 3}
-        )
+        try:
+            response = self.http_client.get(
+                BING_SEARCH_ENDPOINT,
+                headers={'Ocp-Apim-Subscription-Key': subscription_key},
+                params={'q': query, 'mkt': self.default_internet_market, "count": 3}
+            )
+        except requests.RequestException as e:
+            return f"Error: Bing API not reachable ({e.__class__.__name__})"
 
         if response.status_code != 200:
             return f"Error: Bing API returned {response.status_code}"
@@ -142,10 +189,15 @@ class AITools:
             print("⚠️  yfinance not installed — skipping stock price lookup")
             return "Stock price lookup not available on this device."
 
-        stock_info = yf.Ticker(symbol)
-        price = stock_info.info.get('currentPrice')
-        if price:
-            return f"{symbol} current price: {price}"
+        try:
+            # the shared session and timeouts, yfinance would otherwise open its own connections without a timeout
+            history = yf.Ticker(symbol, session=self.http_client.session).history(period="1d", timeout=self.http_client.timeout)
+        except Exception as e:
+            # yfinance raises its own exceptions besides the requests ones
+            return f"Error: stock price service not reachable ({e.__class__.__name__})"
+
+        if not history.empty:
+            return f"{symbol} current price: {round(float(history['Close'].iloc[-1]), 2)}"
         else:
             return f"Could not fetch stock price for {symbol}"
 
@@ -154,11 +206,13 @@ class AITools:
         if not open_weather_api_key:
             return "❌ OpenWeatherMap API key not found."
 
-        complete_url = (
-            "http://api.openweathermap.org/data/2.5/weather?"
-            f"appid={open_weather_api_key}&units=metric&q={city_name}"
-        )
-        response = requests.get(complete_url).json()
+        try:
+            response = self.http_client.get(
+                OPENWEATHERMAP_ENDPOINT,
+                params={'appid': open_weather_api_key, 'units': 'metric', 'q': city_name}
+            ).json()
+        except (requests.RequestException, ValueError) as e:
+            return f"Error: OpenWeatherMap API not reachable ({e.__class__.__name__})"
 
         if response.get("cod") != 200:
             return f"Error: {response.get('message', 'Unable to fetch weather')}"
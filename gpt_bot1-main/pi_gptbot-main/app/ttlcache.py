@@ -0,0 +1,52 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread safe in-memory cache with a time to live per entry and a bounded size;
+    the least recently used entries are evicted when the cache is full.
+    """
+
+    def __init__(self, max_size=256, default_ttl=600):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached value, or None if it is missing or expired."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.default_ttl
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        return f"{self.hits} hits, {self.misses} misses, {len(self.entries)} entries"
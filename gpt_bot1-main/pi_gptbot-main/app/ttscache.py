@@ -0,0 +1,115 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+
+class TTSCache:
+    """
+    On-disk, content addressed cache of synthesized speech. Files are named after the
+    hash of the normalized text and the gTTS language, the least recently used files
+    are evicted when the cache grows over max_size_bytes.
+    """
+
+    def init_logging(self):
+        self.log = logging.getLogger("bot_log")
+        logging.basicConfig(filename='gpt_service.log', level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def __init__(self, cache_dir=None, max_size_bytes=50 * 1024 * 1024):
+
+        self.init_logging()
+
+        if cache_dir is None:
+            cache_dir = str(Path(__file__).resolve().parent.joinpath('tts_cache'))
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.lock = threading.Lock()
+
+        # file name -> size, least recently used first
+        self.entries = OrderedDict()
+        self.total_size = 0
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.load_index()
+
+    def load_index(self):
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.mp3'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for mtime, name, size in sorted(files):
+            self.entries[name] = size
+            self.total_size += size
+        self.log.info(f"TTS cache: {len(self.entries)} phrases, {self.total_size} bytes in {self.cache_dir}")
+
+    def normalize(self, text):
+        return re.sub(r'\s+', ' ', text).strip().lower()
+
+    def key(self, text, lang):
+        digest = hashlib.sha1(f"{lang}|{self.normalize(text)}".encode('utf-8')).hexdigest()
+        return f"{digest}.mp3"
+
+    def get(self, text, lang):
+        """Returns the path of the cached audio, or None on a miss."""
+        name = self.key(text, lang)
+        path = os.path.join(self.cache_dir, name)
+        with self.lock:
+            if name not in self.entries or not os.path.exists(path):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(name)
+        try:
+            # mtime is the LRU order after a restart
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, text, lang, audio):
+        """
+        Stores synthesized mp3 bytes in the cache and returns the path of the audio file,
+        or the bytes themselves if they could not be written (e.g. the SD card is full).
+        """
+        name = self.key(text, lang)
+        path = os.path.join(self.cache_dir, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as audio_file:
+                audio_file.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.log.warning(f"TTS cache: could not write {name}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return audio
+        size = len(audio)
+        with self.lock:
+            self.total_size += size - self.entries.get(name, 0)
+            self.entries[name] = size
+            self.entries.move_to_end(name)
+            self.evict()
+        return path
+
+    def evict(self):
+        # keep the newest entry, even if it alone is over the limit
+        while self.total_size > self.max_size_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total_size -= size
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def get_stats(self):
+        return f"{self.hits} hits, {self.misses} misses, {len(self.entries)} phrases ({self.total_size / 1024:.0f} kB)"
@@ -0,0 +1,203 @@
+import io
+import time
+import asyncio
+import logging
+import contextlib
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from gtts import gTTS
+
+from audioplayer import MPG123Player
+from turntrace import trace_span, trace_mark
+
+
+class TTSService:
+    """
+    Pipelined text to speech: a small thread pool synthesizes upcoming chunks
+    while a single playback thread plays the already synthesized ones in order.
+    """
+
+    def init_logging(self):
+        self.log = logging.getLogger("bot_log")
+        logging.basicConfig(filename='gpt_service.log', level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def __init__(self, synth_workers=2, tts_cache=None, player=None, synth_pool=None):
+
+        self.init_logging()
+
+        self.tts_cache = tts_cache
+        self.player = player if player is not None else MPG123Player()
+
+        # a pool shared with other TTSServices (botserver.py) is not shut down with this one
+        self.owns_synth_pool = synth_pool is None
+        self.synth_pool = synth_pool if synth_pool is not None else ThreadPoolExecutor(max_workers=synth_workers, thread_name_prefix="tts_synth")
+        self.cancel_event = threading.Event()
+
+        # Statistics
+        self.total_tts_duration = 0
+        self.total_chunks = 0
+        self.total_synthesis_duration = 0
+        self.total_playback_wait = 0
+
+    def set_player(self, player):
+        """Replace the playback backend (e.g. once the output device is known)."""
+        old_player = self.player
+        self.player = player
+        old_player.close()
+
+    def synthesize(self, text, lang):
+        """
+        Use gTTS to synthesize speech and return the mp3 audio: the cached file path
+        on a phrase cache hit, otherwise the mp3 bytes synthesized in memory.
+        """
+        if self.tts_cache is not None:
+            cached_path = self.tts_cache.get(text, lang)
+            if cached_path is not None:
+                return cached_path
+
+        # gTTS may not support every language variant; fallback if needed
+        try:
+            tts = gTTS(text=text, lang=lang)
+        except Exception as e:
+            self.log.warning(f"gTTS init failed for lang {lang}: {e}. Falling back to 'en'.")
+            tts = gTTS(text=text, lang='en')
+
+        audio_fp = io.BytesIO()
+        tts.write_to_fp(audio_fp)
+        audio = audio_fp.getvalue()
+
+        if self.tts_cache is not None:
+            self.tts_cache.put(text, lang, audio)
+        return audio
+
+    def timed_synthesize(self, text, lang):
+        """Runs on the synthesis pool, returns (audio, synthesis duration)."""
+        if self.cancel_event.is_set():
+            return None, 0
+        synth_start = time.time()
+        with trace_span("tts_synthesis", chars=len(text)) as span:
+            audio = self.synthesize(text, lang)
+            span["cached"] = isinstance(audio, str)
+        return audio, time.time() - synth_start
+
+    def prewarm(self, phrases, lang):
+        """Synthesize a list of phrases into the phrase cache, so they are spoken without a network round trip."""
+        if self.tts_cache is None:
+            return
+        for phrase in phrases:
+            try:
+                self.synthesize(phrase, lang)
+            except Exception as e:
+                self.log.warning(f"TTS prewarm failed for '{phrase}': {e}")
+        self.log.info(f"TTS cache prewarmed with {len(phrases)} {lang} phrases")
+
+    def play(self, audio):
+        """
+        Play mp3 audio (bytes or file path) on the playback backend and return the playback duration.
+        """
+        play_start = time.time()
+        if not self.cancel_event.is_set():
+            self.player.play(audio)
+        duration = time.time() - play_start
+        self.total_tts_duration += duration
+        return duration
+
+    async def speak_stream_async(self, text_chunks, lang, on_first_chunk=None):
+        """
+        Speak text chunks (e.g. sentences) as they are produced by the async iterator text_chunks.
+        Each chunk is submitted to the synthesis pool right away and played in order on a worker
+        thread, while the loop keeps reading text_chunks. Cancelling the calling task stops the
+        playback. Returns the spoken text.
+        """
+        loop = asyncio.get_running_loop()
+        self.cancel_event.clear()
+        self.player.reset()
+        playback_queue = asyncio.Queue()
+        spoken_chunks = []
+
+        async def produce():
+            try:
+                async for chunk in text_chunks:
+                    if chunk is None or chunk.strip() == "":
+                        continue
+                    if not spoken_chunks and on_first_chunk is not None:
+                        on_first_chunk(chunk)
+                    spoken_chunks.append(chunk)
+                    # copy_context: the synthesis spans go to the trace of the current turn
+                    synth_future = loop.run_in_executor(self.synth_pool, contextvars.copy_context().run, self.timed_synthesize, chunk, lang)
+                    playback_queue.put_nowait((chunk, time.time(), synth_future))
+            finally:
+                playback_queue.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await playback_queue.get()
+                if item is None:
+                    break
+                chunk, queued_at, synth_future = item
+                try:
+                    audio, synth_duration = await synth_future
+                    if audio is None:
+                        continue
+                    wait_duration = time.time() - queued_at
+                    trace_mark("first_audio")
+                    with trace_span("playback", chars=len(chunk)):
+                        play_duration = await asyncio.to_thread(self.play, audio)
+                    self.record_chunk_stats(chunk, synth_duration, wait_duration, play_duration)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.log.error(f"TTS error: {e}")
+            # errors of the text producer surface here
+            await producer
+            trace_mark("playback_end")
+        except asyncio.CancelledError:
+            # the playback thread can not be cancelled, stopping the player ends it
+            self.cancel()
+            raise
+        finally:
+            if not producer.done():
+                producer.cancel()
+                # wait for the text stream to be closed, e.g. the HTTP response of the chat completion
+                with contextlib.suppress(asyncio.CancelledError):
+                    await producer
+
+        return " ".join(spoken_chunks)
+
+    def record_chunk_stats(self, chunk, synth_duration, wait_duration, play_duration):
+        self.total_chunks += 1
+        self.total_synthesis_duration += synth_duration
+        self.total_playback_wait += wait_duration
+        chunk_stats = f"TTS chunk {self.total_chunks}: synthesis {synth_duration:.2f}s, ready after {wait_duration:.2f}s, played {play_duration:.2f}s ({len(chunk)} chars)"
+        print(f"AI response (played ~{play_duration:.2f}s): {chunk}")
+        self.log.info(chunk_stats)
+
+    def cancel(self):
+        """
+        Stop the current playback and drop all chunks that are still waiting for synthesis or playback.
+        """
+        self.cancel_event.set()
+        self.player.stop()
+
+    def playback_state(self):
+        """(playing, level) of the playback backend, used for echo suppression while listening."""
+        return self.player.playback_state()
+
+    def get_stats(self):
+        if self.total_chunks == 0:
+            return "no chunks spoken"
+        return (f"{self.total_chunks} chunks, avg synthesis {self.total_synthesis_duration / self.total_chunks:.2f}s, "
+                f"avg ready after {self.total_playback_wait / self.total_chunks:.2f}s")
+
+    def get_cache_stats(self):
+        if self.tts_cache is None:
+            return "disabled"
+        return self.tts_cache.get_stats()
+
+    def shutdown(self):
+        self.cancel()
+        if self.owns_synth_pool:
+            self.synth_pool.shutdown(wait=False, cancel_futures=True)
+        self.player.close()
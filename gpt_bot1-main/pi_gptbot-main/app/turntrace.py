@@ -0,0 +1,147 @@
+import os
+import math
+import json
+import time
+import uuid
+import logging
+import threading
+import contextlib
+import contextvars
+import collections
+from logging.handlers import RotatingFileHandler
+
+# Per-turn latency traces, one JSON object per line
+TURN_TRACE_FILE = os.getenv('TURN_TRACE_FILE', 'turn_traces.jsonl')
+TURN_TRACE_MAX_BYTES = int(os.getenv('TURN_TRACE_MAX_BYTES', 5 * 1024 * 1024))
+TURN_TRACE_BACKUPS = 3
+
+# The trace of the turn being processed. asyncio tasks inherit it, threads get it
+# through contextvars.copy_context().run (asyncio.to_thread does that by itself).
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class TurnTrace:
+    """
+    Timing of one conversation turn: spans (stage name, start, end) and marks (points
+    in time, e.g. the first audio byte), all relative to the start of the turn, which
+    is the moment the user stopped speaking.
+    """
+
+    def __init__(self, start=None):
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.start = start if start is not None else time.time()
+        self.spans = []
+        self.marks = {}
+        self.status = "ok"
+        self.lock = threading.Lock()
+
+    def add_span(self, name, start, end, **attributes):
+        span = {"name": name, "start": round(start - self.start, 4), "duration": round(end - start, 4)}
+        span.update(attributes)
+        with self.lock:
+            self.spans.append(span)
+
+    def mark(self, name, timestamp=None):
+        """Record the first time name happened in this turn."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self.lock:
+            self.marks.setdefault(name, round(timestamp - self.start, 4))
+
+    def to_dict(self):
+        with self.lock:
+            return {"turn_id": self.turn_id, "start": self.start, "status": self.status,
+                    "spans": list(self.spans), "marks": dict(self.marks)}
+
+
+@contextlib.contextmanager
+def trace_span(name, **attributes):
+    """Time the block as a span of the current turn; does nothing outside of a turn."""
+    trace = current_trace.get()
+    if trace is None:
+        yield attributes
+        return
+    start = time.time()
+    try:
+        # the block may add attributes, e.g. whether the result came from a cache
+        yield attributes
+    finally:
+        trace.add_span(name, start, time.time(), **attributes)
+
+
+def trace_mark(name):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+def percentile(sorted_values, share):
+    """Nearest-rank percentile of a sorted list."""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(share * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class TurnTracer:
+    """
+    Writes the finished turn traces to a rotating JSONL file and keeps the latest
+    durations of every stage (span name, or mark offset from the turn start) for
+    the p50 / p95 statistics.
+    """
+
+    def __init__(self, trace_file=TURN_TRACE_FILE, max_bytes=TURN_TRACE_MAX_BYTES, backup_count=TURN_TRACE_BACKUPS, window=200):
+        self.log = logging.getLogger("bot_log")
+        self.window = window
+        self.stage_durations = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        self.lock = threading.Lock()
+
+        # a separate logger, so the traces do not end up in gpt_service.log
+        self.trace_log = logging.getLogger("turn_trace")
+        self.trace_log.propagate = False
+        self.trace_log.setLevel(logging.INFO)
+        if trace_file and not self.trace_log.handlers:
+            try:
+                handler = RotatingFileHandler(trace_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self.trace_log.addHandler(handler)
+            except OSError as e:
+                self.log.warning(f"Turn traces are not written to {trace_file}: {e}")
+
+        # Statistics
+        self.total_turns = 0
+        self.complete_turns = 0
+
+    def start_turn(self, start=None):
+        """New trace, made the current one of the calling task / thread."""
+        trace = TurnTrace(start)
+        current_trace.set(trace)
+        return trace
+
+    def finish_turn(self, trace, status=None):
+        if status is not None:
+            trace.status = status
+        trace_dict = trace.to_dict()
+        with self.lock:
+            self.total_turns += 1
+            # interrupted or failed turns would skew the stage latencies
+            if trace.status == "ok":
+                self.complete_turns += 1
+                for span in trace_dict["spans"]:
+                    self.stage_durations[span["name"]].append(span["duration"])
+                for name, offset in trace_dict["marks"].items():
+                    self.stage_durations[name].append(offset)
+        if self.trace_log.handlers:
+            self.trace_log.info(json.dumps(trace_dict, ensure_ascii=False))
+        self.log.info(f"Turn {trace.turn_id} {trace.status}: " +
+                      ", ".join(f"{name} at {offset:.2f}s" for name, offset in trace_dict["marks"].items()))
+
+    def get_stage_percentiles(self):
+        """{stage: (count, p50, p95)} in seconds."""
+        with self.lock:
+            stages = {name: sorted(durations) for name, durations in self.stage_durations.items() if durations}
+        return {name: (len(values), percentile(values, 0.5), percentile(values, 0.95)) for name, values in stages.items()}
+
+    def get_stats(self):
+        if self.complete_turns == 0:
+            return f"{self.total_turns} turns traced, none complete"
+        stages = self.get_stage_percentiles()
+        return f"{self.total_turns} turns ({self.complete_turns} complete); " + "; ".join(
+            f"{name} p50 {p50:.2f}s p95 {p95:.2f}s (n={count})" for name, (count, p50, p95) in sorted(stages.items()))
@@ -0,0 +1,103 @@
+import logging
+
+from audioutils import rms, to_16bit, resample
+
+# Try importing the WebRTC voice activity detector safely
+try:
+    import webrtcvad
+    WEBRTCVAD_AVAILABLE = True
+except ImportError:
+    WEBRTCVAD_AVAILABLE = False
+
+
+class VoiceActivityDetector:
+    """
+    Classifies microphone chunks as speech or silence. Every 30 ms frame is checked by
+    WebRTC VAD (when installed) and against an adaptive noise floor: the floor follows
+    the energy of the non-speech frames, so a noisy room raises the bar for speech.
+    While the bot is talking, simple echo suppression is applied: the coupling between
+    the played level and the microphone level is learned, and only energy clearly above
+    the expected echo counts as speech. The first frames of every playback only calibrate
+    the coupling, so even an echo much louder than the played level is learned.
+    """
+
+    FRAME_MS = 30
+    # webrtcvad only accepts 16 bit mono audio at these rates
+    VAD_SAMPLE_RATE = 16000
+    # a frame is speech if its energy is this many times over the noise floor
+    SPEECH_RATIO = 3.0
+    SPEECH_RATIO_WITH_VAD = 1.5
+    # how fast the noise floor follows the silence (share of the new frame per frame)
+    NOISE_ADAPT_RATE = 0.05
+    MIN_NOISE_FLOOR = 50
+    # speech during playback must be this many times louder than the expected echo
+    ECHO_MARGIN = 2.0
+    ECHO_ADAPT_RATE = 0.1
+    # frames at the start of each playback that are taken as echo, and how fast they calibrate
+    ECHO_CALIBRATION_FRAMES = 10
+    ECHO_CALIBRATION_RATE = 0.3
+    # extra factor on the noise floor during playback when the played level is unknown (mpg123)
+    UNKNOWN_ECHO_RATIO = 3.0
+
+    def __init__(self, sample_rate, sample_width=2, aggressiveness=2, initial_noise_floor=300):
+        self.log = logging.getLogger("bot_log")
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.noise_floor = max(initial_noise_floor, self.MIN_NOISE_FLOOR)
+        # microphone level / played level while only our own voice is heard
+        self.echo_coupling = 1.0
+        # frames since the playback started, 0 while nothing is played
+        self.playback_frames = 0
+        self.vad = webrtcvad.Vad(aggressiveness) if WEBRTCVAD_AVAILABLE else None
+        self.resample_state = None
+        self.pending = b""
+        if self.vad is None:
+            self.log.info("webrtcvad not installed, using energy based voice activity detection")
+
+    def frame_bytes(self):
+        return self.VAD_SAMPLE_RATE * self.FRAME_MS // 1000 * 2
+
+    def to_vad_format(self, chunk):
+        chunk = to_16bit(chunk, self.sample_width)
+        if self.sample_rate != self.VAD_SAMPLE_RATE:
+            chunk, self.resample_state = resample(chunk, self.sample_rate, self.VAD_SAMPLE_RATE, self.resample_state)
+        return chunk
+
+    def is_speech_frame(self, frame, playback_active=False, playback_level=None):
+        energy = rms(frame)
+        self.playback_frames = self.playback_frames + 1 if playback_active else 0
+        if playback_level and self.playback_frames <= self.ECHO_CALIBRATION_FRAMES:
+            # the user hardly talks over the first few hundred milliseconds of the answer
+            self.echo_coupling = self.echo_coupling * (1 - self.ECHO_CALIBRATION_RATE) + energy / playback_level * self.ECHO_CALIBRATION_RATE
+            return False
+        if self.vad is not None:
+            speech = self.vad.is_speech(frame, self.VAD_SAMPLE_RATE) and energy > self.noise_floor * self.SPEECH_RATIO_WITH_VAD
+        else:
+            speech = energy > self.noise_floor * self.SPEECH_RATIO
+        if speech and playback_active:
+            if playback_level:
+                expected_echo = self.echo_coupling * playback_level
+                speech = energy > expected_echo * self.ECHO_MARGIN
+                if not speech:
+                    self.echo_coupling = self.echo_coupling * (1 - self.ECHO_ADAPT_RATE) + energy / playback_level * self.ECHO_ADAPT_RATE
+            elif playback_level is None:
+                speech = energy > self.noise_floor * self.SPEECH_RATIO * self.UNKNOWN_ECHO_RATIO
+        if not speech and not playback_active:
+            self.noise_floor = max(self.MIN_NOISE_FLOOR, self.noise_floor * (1 - self.NOISE_ADAPT_RATE) + energy * self.NOISE_ADAPT_RATE)
+        return speech
+
+    def is_speech(self, chunk, playback_active=False, playback_level=None):
+        """
+        True if at least half of the complete 30 ms frames in chunk are speech.
+        playback_active / playback_level describe what the bot is playing at the moment
+        (level is the RMS of the played audio, None if the player can not tell).
+        """
+        data = self.pending + self.to_vad_format(chunk)
+        frame_bytes = self.frame_bytes()
+        frame_count = len(data) // frame_bytes
+        self.pending = data[frame_count * frame_bytes:]
+        if frame_count == 0:
+            return False
+        speech_frames = sum(1 for index in range(frame_count)
+                            if self.is_speech_frame(data[index * frame_bytes:(index + 1) * frame_bytes], playback_active, playback_level))
+        return speech_frames * 2 >= frame_count
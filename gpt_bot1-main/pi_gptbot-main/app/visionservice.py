@@ -3,10 +3,105 @@ import os
 import time
 import openai
 import base64
+import logging
+import threading
+from collections import deque
 
 from dotenv import load_dotenv
 load_dotenv()
 
+# Keep the camera open this many seconds after the last picture, 0 opens it for every picture
+CAMERA_KEEPALIVE_SECONDS = float(os.getenv("CAMERA_KEEPALIVE_SECONDS", '120'))
+
+# Image sent to the vision model: longest side in pixels, JPEG quality and detail level (low / high / auto)
+VISION_MAX_DIMENSION = int(os.getenv("VISION_MAX_DIMENSION", '768'))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", '80'))
+VISION_DETAIL = os.getenv("VISION_DETAIL", 'low')
+
+
+class CameraCapture:
+    """
+    Long-lived capture thread: keeps the camera open (and its auto exposure settled),
+    grabs frames at a low frame rate into a small ring buffer, and releases the camera
+    after idle_timeout seconds without a get_frame() call.
+    """
+
+    WIDTH = 1024
+    HEIGHT = 768
+    # frames skipped after opening the camera while auto exposure settles
+    WARMUP_FRAMES = 5
+
+    def __init__(self, device_index=0, idle_timeout=CAMERA_KEEPALIVE_SECONDS, frame_interval=0.5):
+        self.log = logging.getLogger("bot_log")
+        self.device_index = device_index
+        self.idle_timeout = idle_timeout
+        self.frame_interval = frame_interval
+        self.frames = deque(maxlen=3)
+        self.lock = threading.Lock()
+        self.frame_ready = threading.Condition(self.lock)
+        self.thread = None
+        self.last_used = 0
+
+    def open_camera(self):
+        cam = cv2.VideoCapture(self.device_index)
+        cam.set(cv2.CAP_PROP_FRAME_WIDTH, self.WIDTH)
+        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, self.HEIGHT)
+        # the driver queues frames, between the slow reads they would be seconds old
+        cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        for _ in range(self.WARMUP_FRAMES):
+            cam.grab()
+        return cam
+
+    def get_frame(self, timeout=5):
+        """Returns the newest frame, starting the capture thread if the camera is closed."""
+        with self.lock:
+            self.last_used = time.time()
+            if self.thread is None:
+                self.frames.clear()
+                self.thread = threading.Thread(target=self.capture_loop, daemon=True)
+                self.thread.start()
+            if not self.frames:
+                self.frame_ready.wait(timeout)
+            if not self.frames:
+                return None
+            return self.frames[-1][1]
+
+    def capture_loop(self):
+        cam = None
+        try:
+            cam = self.open_camera()
+            self.log.info("Camera opened")
+            while True:
+                with self.lock:
+                    if time.time() - self.last_used >= self.idle_timeout:
+                        cam.release()
+                        cam = None
+                        self.thread = None
+                        self.log.info("Camera released after idle timeout")
+                        return
+                result, image = cam.read()
+                if result:
+                    with self.lock:
+                        self.frames.append((time.time(), image))
+                        self.frame_ready.notify_all()
+                time.sleep(self.frame_interval)
+        except Exception as e:
+            self.log.error(f"Camera capture error: {e}")
+        finally:
+            if cam is not None:
+                cam.release()
+            with self.lock:
+                # the next get_frame() starts a new capture thread
+                if self.thread is threading.current_thread():
+                    self.thread = None
+
+    def capture_once(self):
+        """Open the camera, take one picture and release it."""
+        cam = self.open_camera()
+        result, image = cam.read()
+        cam.release()
+        return image if result else None
+
 
 class VisionService:
     def __init__(self, default_language="Hungarian"):
@@ -22,28 +117,33 @@ class VisionService:
                 api_key=os.environ.get("OPENAI_API_KEY"),
             )   
         self.default_language = default_language
+        self.camera = CameraCapture()
 
-    def encode_image(self, image_path):
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+    def encode_image(self, image, max_dimension=VISION_MAX_DIMENSION, jpeg_quality=VISION_JPEG_QUALITY):
+        """Downscale the image and encode it to base64 JPEG in memory."""
+        height, width = image.shape[:2]
+        scale = max_dimension / max(height, width)
+        if scale < 1:
+            image = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        success, jpeg = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+        if not success:
+            return None
+        return base64.b64encode(jpeg.tobytes()).decode('utf-8')
 
         
     def get_whats_visible_on_camera(self):
-        file_path = os.path.abspath(os.path.dirname(__file__)) + "/"
-        file_name = 'capture.png'      
-        local_file = os.path.join(file_path, file_name)
-        cam = cv2.VideoCapture(0)
-        cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1024)
-        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 768)        
-        result, image = cam.read()
+        if CAMERA_KEEPALIVE_SECONDS > 0:
+            image = self.camera.get_frame()
+        else:
+            image = self.camera.capture_once()
+        if image is None:
+            print("Error capturing image")
+            return 'Nothing'
         rotated=cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        if result:
-            success = cv2.imwrite(local_file, rotated)
-            if success == False:
-                print("Error saving image")
-                return 'Nothing'
-        cam.release()
-        base64_image = self.encode_image(local_file)     
+        base64_image = self.encode_image(rotated)
+        if base64_image is None:
+            print("Error encoding image")
+            return 'Nothing'
 
         response = self.client.chat.completions.create(
             model=os.getenv('AZURE_OPENAI_GPT4V_DEPLOYMENT'), 
@@ -56,7 +156,8 @@ class VisionService:
                         {
                             "type": "image_url",
                             "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
+                            "url": f"data:image/jpeg;base64,{base64_image}",
+                            "detail": VISION_DETAIL
                             }
                         }                              
                     ],
@@ -0,0 +1,75 @@
+import json
+import time
+import logging
+
+from sttservice import VOSK_AVAILABLE, VoskSTT
+
+if VOSK_AVAILABLE:
+    from vosk import KaldiRecognizer
+
+
+class WakeWordSpotter:
+    """
+    Local keyword spotter in front of the speech recognition: a Vosk recognizer restricted
+    to a grammar of just the keyword, fed with the microphone audio while the bot is asleep.
+    After the keyword the bot stays awake for awake_seconds, extended by every phrase.
+    """
+
+    def __init__(self, keyword, language, vosk_stt=None, awake_seconds=10):
+        if not VOSK_AVAILABLE:
+            raise RuntimeError("vosk is not installed")
+        self.log = logging.getLogger("bot_log")
+        self.keyword = keyword.lower().strip()
+        self.language = language
+        self.vosk_stt = vosk_stt if vosk_stt is not None else VoskSTT()
+        self.awake_seconds = awake_seconds
+        self.awake_until = 0
+        self.recognizer = None
+        self.sample_rate = None
+
+        # Statistics
+        self.detections = 0
+
+    def start(self, sample_rate):
+        model = self.vosk_stt.get_model(self.language)
+        # "[unk]" absorbs everything that is not the keyword
+        self.recognizer = KaldiRecognizer(model, sample_rate, json.dumps([self.keyword, "[unk]"]))
+        self.sample_rate = sample_rate
+
+    def is_awake(self):
+        return time.time() < self.awake_until
+
+    def keep_awake(self):
+        self.awake_until = time.time() + self.awake_seconds
+
+    def sleep(self):
+        self.awake_until = 0
+
+    def accept(self, chunk):
+        """Feed raw 16 bit mono audio, returns True when the keyword was heard."""
+        if self.recognizer.AcceptWaveform(chunk):
+            text = json.loads(self.recognizer.Result()).get('text', '')
+        else:
+            text = json.loads(self.recognizer.PartialResult()).get('partial', '')
+        if self.keyword in text:
+            self.recognizer.Reset()
+            self.detections += 1
+            self.keep_awake()
+            self.log.info(f"Wake word '{self.keyword}' detected")
+            return True
+        return False
+
+
+def create_wake_word_spotter(keyword, language, stt_backend=None, awake_seconds=10):
+    """Spotter sharing the Vosk models of the STT backend if it has them, None if Vosk is not available."""
+    vosk_stt = None
+    if isinstance(stt_backend, VoskSTT):
+        vosk_stt = stt_backend
+    elif hasattr(stt_backend, 'local_backend'):
+        vosk_stt = stt_backend.local_backend
+    try:
+        return WakeWordSpotter(keyword, language, vosk_stt, awake_seconds)
+    except RuntimeError as e:
+        print(f"⚠️  Wake word not available ({e}) — listening to everything")
+        logging.getLogger("bot_log").warning(f"Wake word not available ({e})")
+        return None
@@ -0,0 +1,204 @@
+import json
+import time
+import uuid
+import threading
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockConfig:
+    """Latency and streaming behaviour of the local service stand-ins, in seconds."""
+
+    def __init__(self, llm_first_token=0.4, llm_token_interval=0.02, response_sentences=3,
+                 tool_latency=0.3, stream_chunk_words=1):
+        self.llm_first_token = llm_first_token
+        self.llm_token_interval = llm_token_interval
+        self.response_sentences = response_sentences
+        self.tool_latency = tool_latency
+        self.stream_chunk_words = stream_chunk_words
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+# Questions containing these words get a tool call first, like a real model would do
+TOOL_KEYWORDS = {
+    "weather": ("get_current_weather", {"city_name": "Budapest"}),
+    "időjárás": ("get_current_weather", {"city_name": "Budapest"}),
+    "news": ("search_internet", {"query": "Raspberry Pi news"}),
+    "search": ("search_internet", {"query": "Raspberry Pi news"}),
+}
+
+RESPONSE_SENTENCES = [
+    "Here is a short answer from the benchmark stand-in.",
+    "It is long enough to be split into a few sentences for speaking.",
+    "Every sentence is streamed word by word, like the real API does.",
+    "The latency of the first token and of every word can be configured.",
+    "That lets us measure the whole pipeline without any live service.",
+]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    One handler for all stand-ins: the OpenAI chat completions API (streamed and not),
+    Bing web search and OpenWeatherMap current weather.
+    """
+
+    server_version = "MockServices/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.mock_config
+
+    def count(self, name):
+        with self.server.stats_lock:
+            self.server.request_counts[name] = self.server.request_counts.get(name, 0) + 1
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path.endswith("/v7.0/search"):
+            self.count("bing")
+            time.sleep(self.config.tool_latency)
+            self.send_json({"webPages": {"value": [
+                {"name": "Raspberry Pi news", "snippet": "A new Raspberry Pi board was announced today."},
+                {"name": "Pi projects", "snippet": "Voice assistants are a popular Raspberry Pi project."},
+            ]}})
+        elif path.endswith("/data/2.5/weather"):
+            self.count("openweathermap")
+            time.sleep(self.config.tool_latency)
+            self.send_json({"cod": 200, "main": {"temp": 21.5}, "weather": [{"description": "clear sky"}]})
+        else:
+            self.send_json({"error": {"message": f"unknown path {path}"}}, status=404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if not path.endswith("/chat/completions"):
+            self.send_json({"error": {"message": f"unknown path {path}"}}, status=404)
+            return
+        self.count("openai")
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        tool_call = self.pick_tool_call(request)
+        if request.get("stream"):
+            self.stream_completion(request, tool_call)
+        else:
+            self.complete(request, tool_call)
+
+    def pick_tool_call(self, request):
+        messages = request.get("messages", [])
+        if not request.get("tools") or not messages or messages[-1].get("role") != "user":
+            return None
+        tool_names = {tool["function"]["name"] for tool in request["tools"]}
+        question = (messages[-1].get("content") or "").lower()
+        for keyword, (name, arguments) in TOOL_KEYWORDS.items():
+            if keyword in question and name in tool_names:
+                return {"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                        "function": {"name": name, "arguments": json.dumps(arguments)}}
+        return None
+
+    def response_text(self):
+        count = max(1, self.config.response_sentences)
+        return " ".join(RESPONSE_SENTENCES[index % len(RESPONSE_SENTENCES)] for index in range(count))
+
+    def complete(self, request, tool_call):
+        time.sleep(self.config.llm_first_token)
+        message = {"role": "assistant", "content": None if tool_call else self.response_text()}
+        if tool_call:
+            message["tool_calls"] = [tool_call]
+        self.send_json({
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def stream_completion(self, request, tool_call):
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = request.get("model", "mock")
+
+        def chunk(delta, finish_reason=None):
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        # no Content-Length: the stream ends when the connection is closed
+        self.close_connection = True
+
+        try:
+            time.sleep(self.config.llm_first_token)
+            if tool_call:
+                chunk({"role": "assistant", "content": None, "tool_calls": [dict(tool_call, index=0)]})
+                chunk({}, "tool_calls")
+            else:
+                words = self.response_text().split(" ")
+                step = max(1, self.config.stream_chunk_words)
+                for index in range(0, len(words), step):
+                    if index > 0:
+                        time.sleep(self.config.llm_token_interval)
+                    text = " ".join(words[index:index + step])
+                    chunk({"role": "assistant", "content": text if index == 0 else " " + text})
+                chunk({}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # the client cancelled the stream, e.g. barge-in
+            self.count("openai_cancelled")
+
+
+class MockServices:
+    """The stand-in HTTP server on a free local port, serving on a background thread."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.server = ThreadingHTTPServer((host, port), MockHandler)
+        self.server.daemon_threads = True
+        self.server.mock_config = config if config is not None else MockConfig()
+        self.server.request_counts = {}
+        self.server.stats_lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self):
+        """Environment variables pointing the bot's clients to the stand-ins."""
+        return {
+            "OPENAI_API_TYPE": "openai",
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "BING_SEARCH_API_KEY": "benchmark",
+            "BING_SEARCH_ENDPOINT": f"{self.base_url}/v7.0/search",
+            "OPENWEATHERMAP_API_KEY": "benchmark",
+            "OPENWEATHERMAP_ENDPOINT": f"{self.base_url}/data/2.5/weather",
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock_services", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_stats(self):
+        with self.server.stats_lock:
+            return dict(self.server.request_counts)
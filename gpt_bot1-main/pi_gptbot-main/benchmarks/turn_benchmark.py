@@ -0,0 +1,364 @@
+"""
+End-to-end conversation turn benchmark, runnable on a plain Linux box without a Pi.
+
+Recorded WAV utterances are played into the real SpeechListener (VAD endpointing) in
+real time, and the turns run through the real orchestrator, GPTChatService, AITools and
+TTSService. OpenAI, Bing and OpenWeatherMap are replaced by local stand-ins with
+configurable latency (mock_services.py); STT and TTS can be stand-ins or the real backends.
+
+    python3 benchmarks/turn_benchmark.py --wav-dir benchmarks/utterances --iterations 5
+    python3 benchmarks/turn_benchmark.py --stt vosk --json result.json --baseline last.json
+
+An utterance is a 16 bit WAV file; the text the stand-in STT "recognizes" is read from a
+.txt file of the same name. Without WAV files synthetic utterances are used.
+"""
+import os
+import sys
+import json
+import time
+import wave
+import math
+import asyncio
+import argparse
+import resource
+import threading
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCHMARK_DIR.parent.joinpath('app')
+sys.path.insert(0, str(BENCHMARK_DIR))
+sys.path.insert(0, str(APP_DIR))
+
+from mock_services import MockConfig, MockServices
+from audioutils import to_16bit, to_mono
+from hardware import SimulatedMicrophone, SimulatedPlayer
+
+SYNTHETIC_QUESTIONS = [
+    "Tell me a short story about a rabbit.",
+    "What's the weather like in Budapest?",
+    "Search the news about the Raspberry Pi.",
+]
+
+# Stages compared against the baseline for the regression check
+REGRESSION_STAGES = ["first_audio", "playback_end"]
+
+
+class Utterance:
+
+    def __init__(self, name, pcm, sample_rate, transcript):
+        self.name = name
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.transcript = transcript
+
+    @property
+    def duration(self):
+        return len(self.pcm) / 2 / self.sample_rate
+
+
+def load_wav(path):
+    """16 bit mono PCM of a WAV file, stereo and other sample widths are converted."""
+    with wave.open(str(path), "rb") as wav_file:
+        sample_rate = wav_file.getframerate()
+        sample_width = wav_file.getsampwidth()
+        channels = wav_file.getnchannels()
+        pcm = wav_file.readframes(wav_file.getnframes())
+    pcm = to_16bit(pcm, sample_width)
+    if channels == 2:
+        pcm = to_mono(pcm)
+    transcript_path = Path(path).with_suffix(".txt")
+    transcript = transcript_path.read_text(encoding="utf-8").strip() if transcript_path.exists() else Path(path).stem.replace("_", " ")
+    return Utterance(Path(path).stem, pcm, sample_rate, transcript)
+
+
+def synthetic_utterance(name, transcript, sample_rate=16000, duration=1.6):
+    """
+    Voiced-sounding signal: a 120 Hz pulse train with harmonics, shaped into syllables.
+    The voice never drops to silence between the syllables, otherwise the listener would
+    take every syllable for a click shorter than the phrase threshold.
+    """
+    samples = []
+    for index in range(int(sample_rate * duration)):
+        t = index / sample_rate
+        syllables = 0.4 + 0.6 * max(0.0, math.sin(2 * math.pi * 3.5 * t)) ** 0.5
+        voice = sum(math.sin(2 * math.pi * 120 * harmonic * t) / harmonic for harmonic in range(1, 12))
+        samples.append(int(4000 * syllables * voice))
+    pcm = b"".join(max(-32768, min(32767, sample)).to_bytes(2, "little", signed=True) for sample in samples)
+    return Utterance(name, pcm, sample_rate, transcript)
+
+
+def load_utterances(wav_dir):
+    if wav_dir is not None:
+        paths = sorted(Path(wav_dir).glob("*.wav"))
+        if paths:
+            return [load_wav(path) for path in paths]
+        print(f"No WAV files in {wav_dir}, using synthetic utterances")
+    return [synthetic_utterance(f"synthetic_{index + 1}", question) for index, question in enumerate(SYNTHETIC_QUESTIONS)]
+
+
+class MockSTT:
+    """Speech recognition stand-in: returns the transcript of the utterance after a fixed latency."""
+
+    streaming = False
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.transcript = ""
+
+    def recognize(self, audio_data, language, stream_result=None):
+        time.sleep(self.latency)
+        return self.transcript, 1.0
+
+
+def create_tts_service(args):
+    from ttsservice import TTSService
+
+    if args.tts == "gtts":
+        tts_service = TTSService()
+    else:
+        class MockTTSService(TTSService):
+            """gTTS stand-in: fixed latency, 'mp3' sized like gTTS output (~70 ms of speech per character)."""
+
+            def synthesize(self, text, lang):
+                time.sleep(args.tts_latency)
+                return b"\x00" * int(len(text) * 0.07 * SimulatedPlayer.BYTES_PER_SECOND)
+
+        tts_service = MockTTSService()
+
+    if args.player == "device":
+        from audioplayer import create_player
+        tts_service.set_player(create_player(args.output_device))
+    else:
+        tts_service.set_player(SimulatedPlayer())
+    return tts_service
+
+
+def read_rss_kb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class ResourceMonitor:
+    """CPU time and RSS of the benchmark process, sampled on a background thread."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.rss_samples = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.sample_loop, name="resource_monitor", daemon=True)
+
+    def start(self):
+        self.start_time = time.time()
+        self.start_usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.thread.start()
+        return self
+
+    def sample_loop(self):
+        while not self.stop_event.wait(self.interval):
+            rss = read_rss_kb()
+            if rss is not None:
+                self.rss_samples.append(rss)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        wall = time.time() - self.start_time
+        cpu = (usage.ru_utime - self.start_usage.ru_utime) + (usage.ru_stime - self.start_usage.ru_stime)
+        return {
+            "wall_seconds": round(wall, 2),
+            "cpu_seconds": round(cpu, 2),
+            "cpu_percent": round(cpu / wall * 100, 1) if wall > 0 else 0,
+            "rss_avg_mb": round(sum(self.rss_samples) / len(self.rss_samples) / 1024, 1) if self.rss_samples else None,
+            "rss_peak_mb": round(usage.ru_maxrss / 1024, 1),
+        }
+
+
+def run_benchmark(args):
+    mock_config = MockConfig(llm_first_token=args.llm_first_token, llm_token_interval=args.llm_token_interval,
+                             response_sentences=args.response_sentences, tool_latency=args.tool_latency)
+    mock_services = MockServices(mock_config).start()
+    # before the app modules are imported: they read the endpoints at import time
+    os.environ.update(mock_services.environment())
+
+    import speech_recognition as sr
+    from gptchatservice import GPTChatService
+    from sttservice import create_stt_backend
+    from speechlistener import SpeechListener
+    from orchestrator import ConversationOrchestrator
+    from turntrace import TurnTracer
+
+    utterances = load_utterances(args.wav_dir)
+    sample_rate = utterances[0].sample_rate
+    for utterance in utterances:
+        if utterance.sample_rate != sample_rate:
+            raise SystemExit(f"{utterance.name}: all utterances need the same sample rate ({sample_rate})")
+
+    stt_backend = MockSTT(args.stt_latency) if args.stt == "mock" else create_stt_backend(args.stt)
+    tts_service = create_tts_service(args)
+    gpt_service = GPTChatService(args.language_name)
+
+    finished = []
+    failed = []
+    turn_done = threading.Event()
+    current = {}
+
+    class BenchmarkTracer(TurnTracer):
+        def finish_turn(self, trace, status=None):
+            super().finish_turn(trace, status)
+            trace_dict = trace.to_dict()
+            trace_dict.update(current)
+            # only an answer that was spoken ends the turn of the utterance; an unrecognized,
+            # ignored or failed turn (e.g. a noise taken for a phrase) is counted on its own
+            if trace_dict["status"] == "ok" and "first_audio" in trace_dict["marks"]:
+                finished.append(trace_dict)
+                turn_done.set()
+            else:
+                failed.append(trace_dict)
+
+    tracer = BenchmarkTracer(trace_file=args.trace_file)
+    orchestrator = ConversationOrchestrator(stt_backend, tts_service, gpt_service, language=args.language,
+                                            stream_response=not args.no_stream, tracer=tracer)
+    loop_thread = threading.Thread(target=asyncio.run, args=(orchestrator.run(),), name="orchestrator", daemon=True)
+    loop_thread.start()
+    while orchestrator.loop is None:
+        time.sleep(0.01)
+
+    microphone = SimulatedMicrophone(sample_rate)
+    recognizer = sr.Recognizer()
+    listener = SpeechListener(recognizer, microphone, lambda audio, stream_result, timing: orchestrator.post_event("phrase", audio, stream_result, timing),
+                              stt_backend=stt_backend, language=args.language, trailing_silence=args.trailing_silence,
+                              on_speech_start=lambda: orchestrator.post_event("speech_start"),
+                              playback_state=tts_service.playback_state)
+    listener.start()
+
+    monitor = ResourceMonitor().start()
+    turns = []
+    try:
+        # let the VAD settle on the silence before the first utterance
+        time.sleep(1)
+        for iteration in range(args.iterations):
+            for utterance in utterances:
+                if args.cold:
+                    gpt_service.openai_tools.tool_cache.clear()
+                if isinstance(stt_backend, MockSTT):
+                    stt_backend.transcript = utterance.transcript
+                current.update(utterance=utterance.name, iteration=iteration)
+                turn_done.clear()
+                microphone.play(utterance.pcm)
+                completed = turn_done.wait(utterance.duration + args.turn_timeout)
+                trace = finished[-1] if completed else {"status": "timeout", "spans": [], "marks": {}, **current}
+                turns.append(trace)
+                marks = trace["marks"]
+                print(f"[{iteration + 1}/{args.iterations}] {utterance.name}: {trace['status']}, "
+                      f"first audio {marks.get('first_audio', float('nan')):.2f}s, done {marks.get('playback_end', float('nan')):.2f}s", flush=True)
+                # a pause between the turns, like a real user
+                time.sleep(args.pause)
+    finally:
+        resources = monitor.stop()
+        listener.stop(wait_for_stop=False)
+        microphone.close()
+        orchestrator.stop()
+        loop_thread.join(timeout=5)
+        tts_service.shutdown()
+        mock_services.stop()
+
+    stages = {name: {"count": count, "p50": round(p50, 4), "p95": round(p95, 4)}
+              for name, (count, p50, p95) in tracer.get_stage_percentiles().items()}
+    return {
+        "config": {"stt": args.stt, "tts": args.tts, "stream": not args.no_stream, "iterations": args.iterations,
+                   "utterances": [utterance.name for utterance in utterances], "mock": mock_config.to_dict(),
+                   "stt_latency": args.stt_latency, "tts_latency": args.tts_latency, "cold": args.cold},
+        "turns": turns,
+        "failed_turns": failed,
+        "stages": stages,
+        "resources": resources,
+        "requests": mock_services.get_stats(),
+    }
+
+
+def print_report(result):
+    print()
+    print(f"{'stage':<36}{'n':>5}{'p50 (s)':>10}{'p95 (s)':>10}")
+    for name, stage in sorted(result["stages"].items(), key=lambda item: item[1]["p50"]):
+        print(f"{name:<36}{stage['count']:>5}{stage['p50']:>10.3f}{stage['p95']:>10.3f}")
+    statuses = {}
+    for turn in result["turns"]:
+        statuses[turn["status"]] = statuses.get(turn["status"], 0) + 1
+    failures = {}
+    for turn in result["failed_turns"]:
+        failures[turn["status"]] = failures.get(turn["status"], 0) + 1
+    resources = result["resources"]
+    print()
+    print(f"turns: {statuses}")
+    print(f"failed turns: {failures}")
+    print(f"CPU: {resources['cpu_seconds']}s in {resources['wall_seconds']}s ({resources['cpu_percent']}%), "
+          f"RSS avg {resources['rss_avg_mb']} MB, peak {resources['rss_peak_mb']} MB")
+    print(f"stand-in requests: {result['requests']}")
+
+
+def check_regression(result, baseline_path, max_regression):
+    """Names of the stages whose p50 or p95 got slower than the baseline by more than max_regression."""
+    with open(baseline_path, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = []
+    for name in REGRESSION_STAGES:
+        current, previous = result["stages"].get(name), baseline.get("stages", {}).get(name)
+        if current is None or previous is None:
+            continue
+        for key in ("p50", "p95"):
+            if previous[key] > 0 and current[key] > previous[key] * (1 + max_regression):
+                regressions.append(f"{name} {key}: {previous[key]:.3f}s -> {current[key]:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversation turn latency benchmark against local service stand-ins")
+    parser.add_argument("--wav-dir", default=str(BENCHMARK_DIR.joinpath("utterances")), help="Directory of recorded WAV utterances")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--language", default="en", help="STT / TTS language code")
+    parser.add_argument("--language-name", default="English", help="Response language told to the model")
+    parser.add_argument("--stt", choices=["mock", "google", "vosk", "hybrid"], default="mock")
+    parser.add_argument("--tts", choices=["mock", "gtts"], default="mock")
+    parser.add_argument("--player", choices=["null", "device"], default="null", help="Stand-in or real audio output")
+    parser.add_argument("--output-device", default="default")
+    parser.add_argument("--no-stream", action="store_true", help="Speak the response only when it is complete")
+    parser.add_argument("--cold", action="store_true", help="Clear the tool result cache before every turn")
+    parser.add_argument("--stt-latency", type=float, default=0.5)
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--llm-first-token", type=float, default=0.4)
+    parser.add_argument("--llm-token-interval", type=float, default=0.02)
+    parser.add_argument("--response-sentences", type=int, default=3)
+    parser.add_argument("--tool-latency", type=float, default=0.3)
+    parser.add_argument("--trailing-silence", type=float, default=0.5)
+    parser.add_argument("--turn-timeout", type=float, default=30)
+    parser.add_argument("--pause", type=float, default=0.5, help="Seconds between two turns")
+    parser.add_argument("--trace-file", default=None, help="Also write the turn traces as JSONL")
+    parser.add_argument("--json", help="Write the result as JSON")
+    parser.add_argument("--baseline", help="Result JSON of an earlier run to check for regressions")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    result = run_benchmark(args)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump(result, json_file, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        regressions = check_regression(result, args.baseline, args.max_regression)
+        if regressions:
+            print("REGRESSION: " + "; ".join(regressions))
+            sys.exit(1)
+        print("No regression against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import array
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import audioutils
+
+SAMPLES = [0, 1000, -1000, 32767, -32768, 12345, -2, 7]
+
+
+def pcm(samples):
+    return array.array("h", samples).tobytes()
+
+
+@mock.patch.object(audioutils, "AUDIOOP_AVAILABLE", False)
+class PythonFallbackTest(unittest.TestCase):
+    """The plain Python versions used without audioop (Python 3.13)."""
+
+    def test_rms(self):
+        self.assertEqual(audioutils.rms(pcm([3, -4, 3, -4])), 3)
+        self.assertEqual(audioutils.rms(b""), 0)
+
+    def test_to_16bit(self):
+        samples_32bit = array.array("i", [sample << 16 for sample in SAMPLES]).tobytes()
+        self.assertEqual(audioutils.to_16bit(samples_32bit, 4), pcm(SAMPLES))
+        self.assertEqual(audioutils.to_16bit(bytes([1, 255]), 1), pcm([256, -256]))
+
+    def test_to_mono(self):
+        self.assertEqual(audioutils.to_mono(pcm([100, 300, -100, -300])), pcm([200, -200]))
+
+    def test_resample(self):
+        fragment = pcm([1000] * 4800)
+        resampled, state = audioutils.resample(fragment, 48000, 16000)
+        self.assertEqual(len(resampled), 1600 * 2)
+        self.assertEqual(audioutils.rms(resampled), 1000)
+        # the next fragment continues where this one ended
+        resampled, state = audioutils.resample(fragment, 48000, 16000, state)
+        self.assertEqual(len(resampled), 1600 * 2)
+
+    def test_vad(self):
+        from vad import VoiceActivityDetector
+        detector = VoiceActivityDetector(48000, initial_noise_floor=100)
+        detector.vad = None
+        self.assertFalse(detector.is_speech(pcm([100, -100] * 2400)))
+        self.assertTrue(detector.is_speech(pcm([5000, -5000] * 2400)))
+
+
+@unittest.skipUnless(audioutils.AUDIOOP_AVAILABLE, "audioop not available")
+class AudioopCompatibilityTest(unittest.TestCase):
+
+    def test_same_results(self):
+        fragment = pcm(SAMPLES * 100)
+        results = {}
+        for available in (True, False):
+            with mock.patch.object(audioutils, "AUDIOOP_AVAILABLE", available):
+                results[available] = (audioutils.rms(fragment), audioutils.to_16bit(array.array("i", [sample << 16 for sample in SAMPLES]).tobytes(), 4))
+        self.assertEqual(results[True], results[False])
+
+
+if __name__ == "__main__":
+    unittest.main()
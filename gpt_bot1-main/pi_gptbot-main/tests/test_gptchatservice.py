@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+import asyncio
+import unittest
+import openai
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import gptchatservice
+
+
+class WordEncoding:
+    """Stand-in for the tiktoken encoding, which is downloaded on first use."""
+
+    def encode(self, text):
+        return text.split()
+
+
+class FakeStream:
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+def content_chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text, tool_calls=None))])
+
+
+def tool_call_chunk(call_id, name, arguments):
+    tool_call = SimpleNamespace(index=0, id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None, tool_calls=[tool_call]))])
+
+
+class FakeCompletions:
+    """Answers with a tool call when the question asks for the weather, checks the history like the API does."""
+
+    def __init__(self, rate_limited=0):
+        self.requests = []
+        self.rate_limited = rate_limited
+
+    async def create(self, messages, **kwargs):
+        self.requests.append(messages)
+        if self.rate_limited > 0:
+            self.rate_limited -= 1
+            response = SimpleNamespace(status_code=429, headers={}, request=None)
+            raise openai.RateLimitError("Rate limit reached", response=response, body=None)
+        for index, message in enumerate(messages):
+            if message.get("tool_calls"):
+                answered = {reply.get("tool_call_id") for reply in messages[index + 1:index + 1 + len(message["tool_calls"])]}
+                if answered != {tool_call["id"] for tool_call in message["tool_calls"]}:
+                    raise ValueError("assistant tool_calls not followed by tool messages")
+        if "weather" in messages[-1].get("content", "") and kwargs.get("tools"):
+            return FakeStream([content_chunk("Let me check. "),
+                               tool_call_chunk("call_1", "get_current_weather", '{"city_name": "Budapest"}')])
+        return FakeStream([content_chunk("I am two years old.")])
+
+
+class SlowTools:
+
+    def get_tools_list(self):
+        return [{"type": "function", "function": {"name": "get_current_weather", "parameters": {}}}]
+
+    def call_tool(self, tool_name, function_args):
+        time.sleep(0.5)
+        return "sunny"
+
+
+class AskStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.completions = FakeCompletions()
+        self.create_service()
+
+    def create_service(self):
+        async_client = SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+        with mock.patch("tiktoken.get_encoding", return_value=WordEncoding()):
+            self.gpt_service = gptchatservice.GPTChatService("English", openai_tools=SlowTools(), clients=(None, async_client))
+
+    def tearDown(self):
+        self.gpt_service.tool_pool.shutdown(wait=True)
+
+    async def ask(self, question):
+        return [sentence async for sentence in self.gpt_service.ask_stream(question)]
+
+    def test_cancel_while_tool_runs(self):
+        async def run():
+            turn = asyncio.create_task(self.ask("What's the weather like?"))
+            await asyncio.sleep(0.2)
+            turn.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await turn
+            return await self.ask("How old are you?")
+
+        self.assertEqual(asyncio.run(run()), ["I am two years old."])
+        for message in self.gpt_service.conversation.get_messages():
+            self.assertNotIn("tool_calls", message)
+
+    def test_tool_call(self):
+        answer = asyncio.run(self.ask("What's the weather like?"))
+        self.assertTrue(answer)
+        roles = [message["role"] for message in self.gpt_service.conversation.get_messages()]
+        self.assertEqual(roles[-3:], ["assistant", "tool", "assistant"])
+
+    @mock.patch.object(gptchatservice, "OPENAI_RETRY_DELAY", 0)
+    def test_rate_limit_retry(self):
+        self.completions.rate_limited = 1
+        self.assertEqual(asyncio.run(self.ask("How old are you?")), ["I am two years old."])
+        self.assertEqual(len(self.completions.requests), 2)
+
+    @mock.patch.object(gptchatservice, "OPENAI_RETRY_DELAY", 0)
+    def test_rate_limit_gives_up(self):
+        self.completions.rate_limited = gptchatservice.OPENAI_MAX_TRIES
+        self.assertEqual(asyncio.run(self.ask("How old are you?")), [])
+        self.assertEqual(len(self.completions.requests), gptchatservice.OPENAI_MAX_TRIES)
+
+
+if __name__ == "__main__":
+    unittest.main()
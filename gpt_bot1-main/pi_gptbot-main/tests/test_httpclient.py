@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import socket
+import threading
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from httpclient import HTTPClient
+from gptchatservice import DEFAULT_TOOL_TIMEOUT
+
+
+class SilentServer:
+    """Accepts connections and never answers, like an overloaded API."""
+
+    def __init__(self):
+        self.socket = socket.socket()
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen()
+        self.connections = []
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.socket.getsockname()[1]}/quote"
+
+    def accept_loop(self):
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:
+                return
+            self.connections.append(connection)
+
+    def close(self):
+        self.socket.close()
+        for connection in self.connections:
+            connection.close()
+
+
+class HTTPClientTest(unittest.TestCase):
+
+    def test_default_fits_tool_timeout(self):
+        self.assertLess(HTTPClient().max_duration(), DEFAULT_TOOL_TIMEOUT)
+
+    def test_gives_up_within_max_duration(self):
+        server = SilentServer()
+        http_client = HTTPClient(timeout=(0.2, 0.3))
+        try:
+            start = time.time()
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                http_client.get(server.url)
+            self.assertLess(time.time() - start, http_client.max_duration() + 0.5)
+            # retried once
+            self.assertEqual(len(server.connections), 2)
+        finally:
+            http_client.close()
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
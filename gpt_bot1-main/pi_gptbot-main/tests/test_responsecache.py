@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from responsecache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.cache_dir, "response_cache.json")
+        self.cache = ResponseCache(cache_file=self.cache_file, ttl=3600)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_get(self):
+        self.cache.put("personality", "en", "What's your name?", "Bunny.")
+        self.assertEqual(self.cache.get("personality", "en", "what's your name"), "Bunny.")
+        self.assertIsNone(self.cache.get("personality", "de", "What's your name?"))
+
+    def test_batched_save(self):
+        self.cache.put("personality", "en", "What's your name?", "Bunny.")
+        self.cache.put("personality", "en", "How old are you?", "Two.")
+        # written later on the timer thread, not by every put
+        self.assertFalse(os.path.exists(self.cache_file))
+        self.cache.close()
+        with open(self.cache_file, encoding="utf-8") as cache_file:
+            self.assertEqual(len(json.load(cache_file)), 2)
+        self.assertEqual(ResponseCache(cache_file=self.cache_file).get("personality", "en", "How old are you?"), "Two.")
+
+    def test_context_question(self):
+        self.assertTrue(self.cache.is_cacheable("Why is that?", first_turn=True, language="English"))
+        self.assertFalse(self.cache.is_cacheable("Why is that?", first_turn=False, language="English"))
+        self.assertTrue(self.cache.is_cacheable("What's the capital of France?", first_turn=False, language="English"))
+
+    def test_context_words_of_the_language(self):
+        # "is" refers back in Hungarian ("also"), not in English
+        self.assertTrue(self.cache.is_cacheable("What is your name?", first_turn=False, language="English"))
+        self.assertTrue(self.cache.is_cacheable("How old is your brother?", first_turn=False, language="English"))
+        self.assertFalse(self.cache.is_cacheable("Te is nyúl vagy?", first_turn=False, language="Hungarian"))
+        self.assertFalse(self.cache.is_cacheable("Warum ist das so?", first_turn=False, language="German"))
+
+
+if __name__ == "__main__":
+    unittest.main()
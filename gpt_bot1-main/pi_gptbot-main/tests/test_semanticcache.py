@@ -0,0 +1,79 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from semanticcache import SemanticResponseCache, SimilarityIndex, HashingVectorizer, create_response_cache
+
+
+class SemanticResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = SemanticResponseCache(cache_file=os.path.join(self.cache_dir, "response_cache.json"), ttl=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def put(self, question, answer):
+        self.cache.put("personality", "en", question, answer)
+
+    def get(self, question):
+        return self.cache.get("personality", "en", question)
+
+    def test_create(self):
+        self.assertIsNone(create_response_cache(0))
+        self.assertNotIsInstance(create_response_cache(1, similarity_threshold=0), SemanticResponseCache)
+        self.assertGreaterEqual(create_response_cache(1).similarity_threshold, 0.85)
+
+    def test_similar_question(self):
+        self.put("What's your name?", "Bunny.")
+        self.assertEqual(self.get("what is your name, bunny?"), "Bunny.")
+        self.assertEqual(self.cache.similar_hits, 1)
+
+    def test_different_numbers(self):
+        for question, answer, other_question in [("2 plus 3", "5", "2 plus 5"),
+                                                 ("12 times 7", "84", "12 times 8"),
+                                                 ("100 minus 1", "99", "100 minus 7"),
+                                                 ("What is 2 plus 3?", "5", "What is 2 plus 5?")]:
+            self.put(question, answer)
+            self.assertIsNone(self.get(other_question), other_question)
+            self.assertEqual(self.get(question), answer)
+        self.assertEqual(self.cache.similar_hits, 0)
+
+    def test_different_content_words(self):
+        self.put("What is your name?", "Bunny.")
+        self.assertIsNone(self.get("What is my name?"))
+        self.put("What is the weather in Paris?", "Sunny.")
+        self.assertIsNone(self.get("What is the weather in London?"))
+
+    def test_other_scope(self):
+        self.put("What's your name?", "Bunny.")
+        self.assertIsNone(self.cache.get("personality", "de", "What's your name?"))
+        self.assertIsNone(self.cache.get("other personality", "en", "What's your name?"))
+
+    def test_evicted_answer(self):
+        self.put("What's your name?", "Bunny.")
+        self.cache.entries.clear()
+        self.assertIsNone(self.get("what is your name, bunny?"))
+        # the stale key is gone from the index, a second lookup must not fail either
+        self.assertIsNone(self.get("what is your name, bunny?"))
+
+
+class SimilarityIndexTest(unittest.TestCase):
+
+    def test_remove_missing_key(self):
+        index = SimilarityIndex(HashingVectorizer())
+        index.add("key", "what is your name")
+        index.remove("key")
+        index.remove("key")
+        index.remove("other key")
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.nearest("what is your name"), (None, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import array
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from vad import VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+
+
+def chunk(amplitude, frames=1):
+    """16 bit square wave, its RMS is the amplitude."""
+    samples = SAMPLE_RATE * VoiceActivityDetector.FRAME_MS // 1000 * frames
+    return array.array("h", [amplitude if index % 2 else -amplitude for index in range(samples)]).tobytes()
+
+
+class VoiceActivityDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.detector = VoiceActivityDetector(SAMPLE_RATE, initial_noise_floor=100)
+        # the energy detection only, so the results do not depend on webrtcvad being installed
+        self.detector.vad = None
+
+    def test_speech_and_silence(self):
+        self.assertFalse(self.detector.is_speech(chunk(100)))
+        self.assertTrue(self.detector.is_speech(chunk(2000)))
+
+    def test_strong_echo(self):
+        # the microphone hears our own voice 5 times louder than the played level
+        played_level, echo = 1000, 5000
+        for _ in range(50):
+            self.assertFalse(self.detector.is_speech(chunk(echo), playback_active=True, playback_level=played_level))
+        self.assertGreater(self.detector.echo_coupling, 4)
+        # the user talking over the answer
+        self.assertTrue(self.detector.is_speech(chunk(echo * 4), playback_active=True, playback_level=played_level))
+
+    def test_calibrates_every_playback(self):
+        for _ in range(20):
+            self.detector.is_speech(chunk(1000), playback_active=True, playback_level=1000)
+        self.detector.is_speech(chunk(100))
+        # the volume was turned up between the answers
+        for _ in range(20):
+            self.assertFalse(self.detector.is_speech(chunk(4000), playback_active=True, playback_level=1000))
+
+    def test_unknown_playback_level(self):
+        self.assertFalse(self.detector.is_speech(chunk(500), playback_active=True, playback_level=None))
+        self.assertTrue(self.detector.is_speech(chunk(5000), playback_active=True, playback_level=None))
+
+
+if __name__ == "__main__":
+    unittest.main()